@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Host-side batch benchmark for the chest-detection TFLite models
+
+Runs the detectors that download_coco_model_updated.py leaves in the assets
+folder (yolov8s_coco.tflite, qr_yolov5_tiny.tflite, ...) over a directory of
+recorded frames, mirroring what YoloChestDetector does on the phone:
+resize to the model input, scale to [0, 1], decode person boxes, NMS, and
+cut the chest region using chest_region_ratio from person_detection_config.json.
+
+The script:
+1. Loads and preprocesses all frames into one batch array
+2. Runs each model in batches for every requested thread count
+3. Decodes detections and crops chest regions in vectorized form
+4. Reports per-frame latency, throughput and thread scaling on CPU
+
+Usage:
+    python benchmark_chest_detector.py recorded_frames/ --threads 1 2 4 --batch-size 8 --budget-ms 33
+"""
+
+import os
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+
+ASSETS_DIR = Path("app/src/main/assets")
+DEFAULT_MODELS = ["yolov8s_coco.tflite", "qr_yolov5_tiny.tflite"]
+FRAME_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def make_interpreter(model_path, num_threads):
+    """Create a TFLite interpreter from whichever runtime is installed."""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=str(model_path), num_threads=num_threads)
+
+
+def load_chest_config(config_path=ASSETS_DIR / "person_detection_config.json"):
+    """Load detection thresholds and chest_region_ratio, with the app's defaults."""
+    config = {
+        "confidence_threshold": 0.5,
+        "iou_threshold": 0.4,
+        "chest_region_ratio": {"top_offset": 0.15, "height_ratio": 0.4}
+    }
+    if Path(config_path).exists():
+        with open(config_path, 'r') as f:
+            config.update(json.load(f))
+    return config
+
+
+def load_frames(frames_dir, limit=None):
+    """Load recorded frames as a list of HxWx3 uint8 RGB arrays."""
+    from PIL import Image
+
+    paths = sorted(p for p in Path(frames_dir).iterdir() if p.suffix.lower() in FRAME_EXTENSIONS)
+    if limit:
+        paths = paths[:limit]
+    if not paths:
+        raise ValueError(f"No frames found in {frames_dir}")
+
+    frames = [np.asarray(Image.open(p).convert("RGB")) for p in paths]
+    print(f"📁 Loaded {len(frames)} frames from {frames_dir}")
+    return frames
+
+
+def preprocess_frames(frames, input_size):
+    """Resize every frame to the model input and scale to [0, 1] in one array.
+
+    Returns (batch, original_sizes) where batch is float32 NHWC.
+    """
+    from PIL import Image
+
+    resized = np.stack([
+        np.asarray(Image.fromarray(frame).resize((input_size, input_size), Image.BILINEAR))
+        for frame in frames
+    ])
+    sizes = np.array([(frame.shape[1], frame.shape[0]) for frame in frames], dtype=np.float32)
+    return resized.astype(np.float32) / 255.0, sizes
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy NMS over (K, 4) boxes in [left, top, right, bottom] form."""
+    order = np.argsort(-scores)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size > 0:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        left = np.maximum(boxes[best, 0], boxes[rest, 0])
+        top = np.maximum(boxes[best, 1], boxes[rest, 1])
+        right = np.minimum(boxes[best, 2], boxes[rest, 2])
+        bottom = np.minimum(boxes[best, 3], boxes[rest, 3])
+        intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+        union = areas[best] + areas[rest] - intersection
+        iou = np.where(union > 0, intersection / union, 0)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def decode_person_boxes(output, sizes, confidence_threshold, iou_threshold):
+    """Decode a batched YOLO output into person boxes in original-frame pixels.
+
+    Handles the three layouts YoloChestDetector supports: YOLOv8 [B, 84, N],
+    the custom QR model [B, N, 6] and YOLOv5 [B, N, 85].
+
+    Returns (frame_index, boxes, scores) for all kept detections.
+    """
+    if output.shape[1] == 84:
+        output = output.transpose(0, 2, 1)
+        scores = output[:, :, 4]
+    elif output.shape[2] == 6:
+        # The app uses a lower threshold for the custom model
+        objectness, class_conf = output[:, :, 4], output[:, :, 5]
+        scores = np.where((objectness > 0.1) & (class_conf > 0.1), objectness * class_conf, 0)
+        confidence_threshold = 0.0
+    else:
+        objectness, class_conf = output[:, :, 4], output[:, :, 5]
+        scores = np.where(
+            (objectness > confidence_threshold) & (class_conf > confidence_threshold),
+            objectness * class_conf, 0
+        )
+        confidence_threshold = 0.0
+
+    frame_idx, anchor_idx = np.nonzero(scores > confidence_threshold)
+    xywh = output[frame_idx, anchor_idx, :4]
+    scale = sizes[frame_idx]
+    centers = xywh[:, :2] * scale
+    half = xywh[:, 2:4] * scale / 2
+    boxes = np.concatenate([centers - half, centers + half], axis=1)
+    det_scores = scores[frame_idx, anchor_idx]
+
+    keep = [
+        np.nonzero(frame_idx == f)[0][nms(boxes[frame_idx == f], det_scores[frame_idx == f], iou_threshold)]
+        for f in np.unique(frame_idx)
+    ]
+    keep = np.concatenate(keep) if keep else np.array([], dtype=np.int64)
+    return frame_idx[keep], boxes[keep], det_scores[keep]
+
+
+def chest_regions(person_boxes, chest_region_ratio):
+    """Vectorized YoloChestDetector.calculateChestRegion over (K, 4) boxes."""
+    heights = person_boxes[:, 3] - person_boxes[:, 1]
+    top = person_boxes[:, 1] + heights * chest_region_ratio["top_offset"]
+    bottom = top + heights * chest_region_ratio["height_ratio"]
+    return np.stack([person_boxes[:, 0], top, person_boxes[:, 2], bottom], axis=1)
+
+
+def crop_chest_regions(frames_batch, frame_idx, chest_boxes, sizes, out_size=96):
+    """Crop every chest box to out_size x out_size with one gather.
+
+    frames_batch holds the resized model inputs, so boxes are mapped from
+    original-frame pixels into input coordinates before sampling.
+    """
+    if len(chest_boxes) == 0:
+        return np.empty((0, out_size, out_size, frames_batch.shape[-1]), dtype=frames_batch.dtype)
+
+    input_size = frames_batch.shape[1]
+    scale = input_size / sizes[frame_idx]
+    boxes = chest_boxes * np.concatenate([scale, scale], axis=1)
+    steps = (np.arange(out_size) + 0.5) / out_size
+
+    xs = boxes[:, [0]] + steps * (boxes[:, [2]] - boxes[:, [0]])
+    ys = boxes[:, [1]] + steps * (boxes[:, [3]] - boxes[:, [1]])
+    xs = np.clip(xs.astype(np.int64), 0, input_size - 1)
+    ys = np.clip(ys.astype(np.int64), 0, input_size - 1)
+
+    return frames_batch[frame_idx[:, None, None], ys[:, :, None], xs[:, None, :]]
+
+
+def _prepare_interpreter(interpreter, batch_size):
+    """Resize the input to batch_size; fall back to 1 if the model is fixed-batch."""
+    input_detail = interpreter.get_input_details()[0]
+    shape = list(input_detail['shape'])
+    if batch_size != shape[0]:
+        try:
+            interpreter.resize_tensor_input(input_detail['index'], [batch_size] + shape[1:])
+        except (ValueError, RuntimeError):
+            batch_size = shape[0]
+    interpreter.allocate_tensors()
+    return interpreter.get_input_details()[0], interpreter.get_output_details()[0], batch_size
+
+
+def benchmark_model(model_path, frames, config, num_threads, batch_size, warmup=2):
+    """Run one model over all frames and return timing and detection stats."""
+    interpreter = make_interpreter(model_path, num_threads)
+    input_detail, output_detail, batch_size = _prepare_interpreter(interpreter, batch_size)
+
+    shape = input_detail['shape']
+    is_nchw = shape[1] == 3
+    input_size = shape[2] if is_nchw else shape[1]
+
+    start = time.perf_counter()
+    batch_input, sizes = preprocess_frames(frames, input_size)
+    preprocess_s = time.perf_counter() - start
+    model_input = batch_input.transpose(0, 3, 1, 2) if is_nchw else batch_input
+
+    n_frames = len(frames)
+    batch_latencies = []
+    total_detections = 0
+    postprocess_s = 0.0
+
+    for i in range(warmup):
+        chunk = model_input[:batch_size]
+        if len(chunk) == batch_size:
+            interpreter.set_tensor(input_detail['index'], np.ascontiguousarray(chunk))
+            interpreter.invoke()
+
+    wall_start = time.perf_counter()
+    for offset in range(0, n_frames, batch_size):
+        chunk = model_input[offset:offset + batch_size]
+        real = len(chunk)
+        if real < batch_size:
+            # Pad the tail so the tensor shape never changes mid-run
+            pad = np.zeros((batch_size - real,) + chunk.shape[1:], dtype=chunk.dtype)
+            chunk = np.concatenate([chunk, pad])
+
+        t0 = time.perf_counter()
+        interpreter.set_tensor(input_detail['index'], np.ascontiguousarray(chunk))
+        interpreter.invoke()
+        output = interpreter.get_tensor(output_detail['index'])[:real]
+        t1 = time.perf_counter()
+
+        frame_idx, boxes, _ = decode_person_boxes(
+            output, sizes[offset:offset + real],
+            config["confidence_threshold"], config["iou_threshold"]
+        )
+        chest = chest_regions(boxes, config["chest_region_ratio"])
+        crops = crop_chest_regions(batch_input[offset:offset + real], frame_idx, chest, sizes[offset:offset + real])
+        postprocess_s += time.perf_counter() - t1
+
+        total_detections += len(crops)
+        batch_latencies.append((t1 - t0) / real)
+    wall_s = time.perf_counter() - wall_start
+
+    per_frame_ms = np.repeat(np.array(batch_latencies) * 1000, batch_size)[:n_frames]
+    return {
+        'model': Path(model_path).name,
+        'threads': num_threads,
+        'batch_size': batch_size,
+        'frames': n_frames,
+        'p50_ms': float(np.percentile(per_frame_ms, 50)),
+        'p95_ms': float(np.percentile(per_frame_ms, 95)),
+        'preprocess_ms_per_frame': preprocess_s * 1000 / n_frames,
+        'postprocess_ms_per_frame': postprocess_s * 1000 / n_frames,
+        'end_to_end_ms_per_frame': (preprocess_s + wall_s) * 1000 / n_frames,
+        'throughput_fps': n_frames / (preprocess_s + wall_s),
+        'chest_regions': total_detections
+    }
+
+
+def print_report(results, budget_ms=None):
+    """Print a results table plus thread-scaling speedups per model."""
+    print("\n" + "=" * 100)
+    print(f"{'model':<28}{'thr':>4}{'batch':>6}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'pre ms':>8}{'post ms':>9}{'e2e ms':>9}{'fps':>8}{'chests':>8}")
+    print("-" * 100)
+    for r in results:
+        print(f"{r['model']:<28}{r['threads']:>4}{r['batch_size']:>6}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+              f"{r['preprocess_ms_per_frame']:>8.2f}{r['postprocess_ms_per_frame']:>9.2f}"
+              f"{r['end_to_end_ms_per_frame']:>9.2f}{r['throughput_fps']:>8.1f}{r['chest_regions']:>8}")
+
+    print("\nThread scaling (throughput relative to the fewest threads):")
+    for model in dict.fromkeys(r['model'] for r in results):
+        rows = sorted((r for r in results if r['model'] == model), key=lambda r: r['threads'])
+        base = rows[0]['throughput_fps']
+        scaling = ", ".join(f"{r['threads']}t: {r['throughput_fps'] / base:.2f}x" for r in rows)
+        print(f"  {model}: {scaling}")
+
+    if budget_ms:
+        print(f"\nFrame budget {budget_ms:.1f} ms (p95 model latency + pre/post-processing):")
+        for r in results:
+            cost = r['p95_ms'] + r['preprocess_ms_per_frame'] + r['postprocess_ms_per_frame']
+            verdict = "✅ fits" if cost <= budget_ms else "❌ over budget"
+            print(f"  {r['model']} @ {r['threads']} threads: {cost:.2f} ms {verdict}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chest-detection TFLite models on recorded frames")
+    parser.add_argument("frames_dir", help="Directory of recorded frames (jpg/png)")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS,
+                        help="Model files, relative to the assets folder unless absolute")
+    parser.add_argument("--assets-dir", default=str(ASSETS_DIR))
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--limit", type=int, help="Only use the first N frames")
+    parser.add_argument("--budget-ms", type=float, help="Per-frame budget to check against")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    assets_dir = Path(args.assets_dir)
+    config = load_chest_config(assets_dir / "person_detection_config.json")
+    frames = load_frames(args.frames_dir, args.limit)
+
+    print("🚀 Chest Detector Benchmark")
+    print("=" * 50)
+    print(f"Chest region ratio: {config['chest_region_ratio']}")
+    print(f"CPU cores available: {os.cpu_count()}")
+
+    results = []
+    for model in args.models:
+        model_path = Path(model) if os.path.isabs(model) else assets_dir / model
+        if not model_path.exists():
+            print(f"⚠️  Skipping {model_path}: not found")
+            continue
+        for threads in args.threads:
+            print(f"\n📊 {model_path.name} with {threads} thread(s)...")
+            try:
+                results.append(benchmark_model(model_path, frames, config, threads, args.batch_size))
+            except Exception as e:
+                print(f"❌ Failed to benchmark {model_path.name}: {e}")
+
+    if not results:
+        print("\n❌ No models could be benchmarked")
+        return
+
+    print_report(results, args.budget_ms)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
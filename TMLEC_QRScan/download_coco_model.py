@@ -7,6 +7,8 @@ import os
 import requests
 from pathlib import Path
 
+from model_cache import fetch_asset, store_file
+
 def download_file(url, filename):
     """Download a file from URL with progress bar"""
     print(f"Downloading {filename}...")
@@ -27,13 +29,14 @@ def download_file(url, filename):
                     print(f"\rProgress: {percent:.1f}% ({downloaded}/{total_size} bytes)", end='')
     
     print(f"\n✅ Downloaded {filename} successfully!")
+    return True
 
 def main():
     # Define paths
     assets_dir = Path("app/src/main/assets")
     assets_dir.mkdir(parents=True, exist_ok=True)
     
-    # Model URLs and filenames
+    # Model URLs and filenames (an optional "sha256" entry pins the expected hash)
     models = [
         {
             "url": "https://github.com/ultralytics/yolov5/releases/download/v7.0/yolov5s.tflite",
@@ -50,19 +53,17 @@ def main():
     print("🚀 YOLOv5 COCO Model Downloader")
     print("=" * 50)
     
-    # Backup existing QR model
+    # Back up the existing QR model into the model cache (pinned, so never evicted), leaving it in place
     qr_model = assets_dir / "qr_yolov5_tiny.tflite"
     if qr_model.exists():
-        backup_path = assets_dir / "qr_yolov5_tiny.tflite.backup"
-        if not backup_path.exists():
-            qr_model.rename(backup_path)
-            print(f"📦 Backed up QR model to {backup_path}")
+        digest = store_file(qr_model, pin=True)
+        print(f"📦 Backed up QR model to the model cache ({digest[:12]})")
     
-    # Download models
+    # Provision models from the local cache, downloading only on a miss
     for model in models:
         print(f"\n📥 {model['description']}")
         try:
-            download_file(model["url"], model["filename"])
+            fetch_asset(model["url"], model["filename"], download_file, model.get("sha256"))
         except Exception as e:
             print(f"❌ Failed to download {model['filename']}: {e}")
             continue
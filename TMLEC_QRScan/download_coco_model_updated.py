@@ -9,6 +9,8 @@ import requests
 from pathlib import Path
 import urllib.request
 
+from model_cache import fetch_asset, store_file
+
 def download_file_urllib(url, filename):
     """Download a file using urllib with progress"""
     print(f"Downloading {filename} from {url}...")
@@ -61,15 +63,13 @@ def main():
     print("🚀 YOLO COCO Model Downloader (Updated)")
     print("=" * 50)
     
-    # Backup existing QR model
+    # Back up the existing QR model into the model cache (pinned, so never evicted), leaving it in place
     qr_model = assets_dir / "qr_yolov5_tiny.tflite"
     if qr_model.exists():
-        backup_path = assets_dir / "qr_yolov5_tiny.tflite.backup"
-        if not backup_path.exists():
-            qr_model.rename(backup_path)
-            print(f"📦 Backed up QR model to {backup_path}")
+        digest = store_file(qr_model, pin=True)
+        print(f"📦 Backed up QR model to the model cache ({digest[:12]})")
     
-    # Model options with working links
+    # Model options with working links (an optional "sha256" entry pins the expected hash)
     models = [
         {
             "name": "YOLOv8s TFLite",
@@ -116,14 +116,14 @@ def main():
         print(f"\n📥 {model['description']}")
         print(f"   Size: {model['size']}")
         
-        # Try requests first, then urllib
-        if download_file_requests(model["url"], model["filename"]):
+        # Serve from the local model cache; on a miss try requests first, then urllib
+        if fetch_asset(model["url"], model["filename"], download_file_requests, model.get("sha256")):
             success_count += 1
-        elif download_file_urllib(model["url"], model["filename"]):
+        elif fetch_asset(model["url"], model["filename"], download_file_urllib, model.get("sha256")):
             success_count += 1
     
     print("\n" + "=" * 50)
-    print(f"✅ Download complete! ({success_count}/{len(models)} successful)")
+    print(f"✅ Download complete! ({success_count}/{len(models)} available)")
     
     if success_count == 0:
         print("\n⚠️  No models downloaded successfully.")
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Content-addressed local cache for downloaded model assets
+
+Model files (yolov8s_coco.tflite, yolov5s.pt, ...) are stored once per user
+under their SHA-256 and linked or copied into app/src/main/assets on demand.
+The cache remembers which URL produced which object, so provisioning another
+checkout on the same machine does no network I/O at all.
+
+The cache:
+1. Stores every asset as objects/<sha256> with an index of URL -> hash
+2. Hard-links (or copies, across filesystems) objects into the assets folder
+3. Keeps the total size under a configurable cap with LRU eviction;
+   pinned objects (backups of local assets) are never evicted
+4. Adopts a copy already at the destination on a URL miss instead of
+   downloading it again, and rejects HTML error pages or hash mismatches
+   before anything is cached
+
+Environment:
+    TMLEC_MODEL_CACHE         cache directory (default ~/.cache/tmlec_models)
+    TMLEC_MODEL_CACHE_MAX_MB  size cap in megabytes (default 2048)
+
+Usage:
+    python model_cache.py              # list cached assets
+    python model_cache.py --prune 500  # evict down to 500 MB
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to unlocked index updates
+    fcntl = None
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "tmlec_models"
+DEFAULT_MAX_MB = 2048
+
+
+def cache_dir():
+    """Return the cache directory, honouring TMLEC_MODEL_CACHE."""
+    return Path(os.environ.get("TMLEC_MODEL_CACHE", DEFAULT_CACHE_DIR))
+
+
+def max_cache_bytes():
+    """Return the size cap in bytes, honouring TMLEC_MODEL_CACHE_MAX_MB."""
+    return int(float(os.environ.get("TMLEC_MODEL_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    """Hash a file in chunks so large models never sit in memory."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _IndexLock:
+    """Exclusive lock on the cache index so parallel CI jobs don't clobber it."""
+
+    def __init__(self, root):
+        self.path = root / "index.lock"
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, 'w')
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+
+
+def _load_index(root):
+    index_path = root / "index.json"
+    if index_path.exists():
+        with open(index_path, 'r') as f:
+            return json.load(f)
+    return {"urls": {}, "objects": {}}
+
+
+def _save_index(root, index):
+    # Write to a temp file and rename so a crash never leaves a torn index
+    fd, tmp_path = tempfile.mkstemp(dir=root, prefix="index.", suffix=".tmp")
+    with os.fdopen(fd, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, root / "index.json")
+
+
+def _object_path(root, digest):
+    return root / "objects" / digest
+
+
+def _link_or_copy(src, dest):
+    """Place src at dest, preferring a hard link over a full copy."""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dest = dest.with_name(dest.name + ".tmp")
+    if tmp_dest.exists():
+        tmp_dest.unlink()
+    try:
+        os.link(src, tmp_dest)
+        method = "linked"
+    except OSError:
+        shutil.copy2(src, tmp_dest)
+        method = "copied"
+    os.replace(tmp_dest, dest)
+    return method
+
+
+def looks_like_html(path):
+    """True if a downloaded file starts like an HTML page (an error or login page, not a model)."""
+    with open(path, 'rb') as f:
+        head = f.read(512).lstrip().lower()
+    return head.startswith((b'<!doctype html', b'<html', b'<?xml', b'<head', b'<body'))
+
+
+def _evict(root, index, max_bytes, keep=()):
+    """Drop least-recently-used unpinned objects until the cache fits under max_bytes."""
+    objects = index["objects"]
+    total = sum(entry["size"] for entry in objects.values())
+    evicted = []
+
+    for digest, entry in sorted(objects.items(), key=lambda item: item[1]["last_used"]):
+        if total <= max_bytes:
+            break
+        if digest in keep or entry.get("pinned"):
+            continue
+        path = _object_path(root, digest)
+        if path.exists():
+            path.unlink()
+        total -= entry["size"]
+        evicted.append(digest)
+
+    for digest in evicted:
+        del objects[digest]
+    index["urls"] = {url: d for url, d in index["urls"].items() if d not in evicted}
+    return evicted
+
+
+def _add_object(root, index, src_path, digest, pinned=False):
+    """Move a hashed file into the object store and record it."""
+    object_path = _object_path(root, digest)
+    object_path.parent.mkdir(parents=True, exist_ok=True)
+    if object_path.exists():
+        os.remove(src_path)
+    else:
+        os.replace(src_path, object_path)
+        # Objects are shared between checkouts through hard links
+        os.chmod(object_path, 0o444)
+    entry = index["objects"].get(digest, {})
+    index["objects"][digest] = {
+        "size": object_path.stat().st_size,
+        "last_used": time.time(),
+        "pinned": pinned or entry.get("pinned", False)
+    }
+
+
+def store_file(path, url=None, root=None, pin=False):
+    """Copy an existing file into the cache and return its hash.
+
+    Used to keep a safe copy of a local asset (e.g. the QR model) without
+    moving it out of the assets folder; with pin=True the copy is never
+    evicted.
+    """
+    root = Path(root) if root else cache_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    digest = sha256_file(path)
+
+    with _IndexLock(root):
+        index = _load_index(root)
+        if digest not in index["objects"] or not _object_path(root, digest).exists():
+            fd, tmp_path = tempfile.mkstemp(dir=root, prefix="incoming.")
+            os.close(fd)
+            shutil.copy2(path, tmp_path)
+            _add_object(root, index, tmp_path, digest, pinned=pin)
+        else:
+            index["objects"][digest]["last_used"] = time.time()
+            if pin:
+                index["objects"][digest]["pinned"] = True
+        if url:
+            index["urls"][url] = digest
+        _evict(root, index, max_cache_bytes(), keep={digest})
+        _save_index(root, index)
+
+    return digest
+
+
+def fetch_asset(url, dest, download_fn, expected_sha256=None, root=None, max_bytes=None):
+    """Provision dest from the cache, downloading url only on a cache miss.
+
+    Args:
+        url: Source URL, used as the cache lookup key
+        dest: Target path inside the assets folder
+        download_fn: Callable (url, filename) -> bool that writes the file;
+            the existing downloaders in download_coco_model*.py fit as-is
+        expected_sha256: Optional known hash; downloads and existing files
+            that do not match it are rejected
+        root: Cache directory (defaults to cache_dir())
+        max_bytes: Size cap (defaults to max_cache_bytes())
+
+    Returns:
+        True if dest holds the asset afterwards, False if the download failed
+    """
+    root = Path(root) if root else cache_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    max_bytes = max_bytes if max_bytes is not None else max_cache_bytes()
+    dest = Path(dest)
+
+    with _IndexLock(root):
+        index = _load_index(root)
+        digest = index["urls"].get(url) or expected_sha256
+        object_path = _object_path(root, digest) if digest else None
+
+        if object_path is not None and object_path.exists():
+            index["urls"][url] = digest
+            entry = index["objects"].setdefault(digest, {"size": object_path.stat().st_size})
+            entry["last_used"] = time.time()
+            _save_index(root, index)
+            if dest.exists() and os.path.samefile(dest, object_path):
+                print(f"✅ {dest.name} is up to date (cache {digest[:12]})")
+            else:
+                method = _link_or_copy(object_path, dest)
+                print(f"✅ {dest.name} {method} from cache ({digest[:12]}), no download needed")
+            return True
+
+    # A copy from an earlier run without the cache is adopted rather than downloaded again
+    if dest.exists() and dest.stat().st_size > 0 and not looks_like_html(dest):
+        if expected_sha256 is None or sha256_file(dest) == expected_sha256:
+            digest = store_file(dest, url=url, root=root)
+            print(f"📦 Adopted existing {dest.name} into the model cache ({digest[:12]})")
+            return True
+
+    # Cache miss: download next to the object store, then hash and move into place
+    fd, tmp_path = tempfile.mkstemp(dir=root, prefix="incoming.", suffix=dest.suffix)
+    os.close(fd)
+    try:
+        if not download_fn(url, tmp_path):
+            return False
+        if os.path.getsize(tmp_path) == 0 or looks_like_html(tmp_path):
+            print(f"❌ {url} returned an empty file or an HTML page, not a model; nothing cached")
+            return False
+        digest = sha256_file(tmp_path)
+        if expected_sha256 and digest != expected_sha256:
+            print(f"❌ Hash mismatch for {url}: expected {expected_sha256[:12]}, got {digest[:12]}")
+            return False
+
+        with _IndexLock(root):
+            index = _load_index(root)
+            _add_object(root, index, tmp_path, digest)
+            index["urls"][url] = digest
+            evicted = _evict(root, index, max_bytes, keep={digest})
+            _save_index(root, index)
+            # Link while still holding the lock, so a concurrent eviction cannot remove the object first
+            method = _link_or_copy(_object_path(root, digest), dest)
+
+        if evicted:
+            print(f"🧹 Evicted {len(evicted)} least-recently-used object(s) from the model cache")
+        print(f"📦 Cached {dest.name} as {digest[:12]} and {method} it into place")
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def list_cache(root=None):
+    """Print cached objects, most recently used first."""
+    root = Path(root) if root else cache_dir()
+    index = _load_index(root) if root.exists() else {"urls": {}, "objects": {}}
+    urls_by_digest = {}
+    for url, digest in index["urls"].items():
+        urls_by_digest.setdefault(digest, []).append(url)
+
+    total = 0
+    print(f"📁 Model cache: {root}")
+    for digest, entry in sorted(index["objects"].items(), key=lambda item: -item[1]["last_used"]):
+        total += entry["size"]
+        last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"]))
+        pinned = "  (pinned)" if entry.get("pinned") else ""
+        print(f"  - {digest[:12]}  {entry['size'] / (1024 * 1024):7.1f} MB  last used {last_used}{pinned}")
+        for url in urls_by_digest.get(digest, []):
+            print(f"      {url}")
+    print(f"Total: {total / (1024 * 1024):.1f} MB (cap {max_cache_bytes() / (1024 * 1024):.0f} MB)")
+
+
+def prune(max_mb, root=None):
+    """Evict least-recently-used objects until the cache fits in max_mb."""
+    root = Path(root) if root else cache_dir()
+    if not root.exists():
+        return []
+    with _IndexLock(root):
+        index = _load_index(root)
+        evicted = _evict(root, index, int(max_mb * 1024 * 1024))
+        _save_index(root, index)
+    print(f"🧹 Evicted {len(evicted)} object(s)")
+    return evicted
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--prune":
+        prune(float(sys.argv[2]))
+    list_cache()
+
+
+if __name__ == "__main__":
+    main()
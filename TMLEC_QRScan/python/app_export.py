@@ -0,0 +1,133 @@
+"""
+Reader for respiratory_data_<id>_<date>.csv exports from the Android app
+
+Each export starts with a "# Patient Information" and a
+"# Breathing Analysis Summary" block, followed by the per-frame table.
+Two header styles exist in the archive: the current "ID,123" rows with a
+"Relative Time (ms),QR ID,X,Y,..." table, and the older "ID: 123" rows
+with a "timestamp,...,breathing_phase,amplitude,velocity" table. Both are
+parsed into the same metadata keys and the same snake_case frame columns.
+"""
+
+import os
+import re
+import pandas as pd
+
+# Export column header -> frame column used by the Python pipeline
+COLUMN_MAP = {
+    'Relative Time (ms)': 'timestamp',
+    'QR ID': 'qr_id',
+    'X': 'x',
+    'Y': 'y',
+    'Movement Direction': 'movement',
+    'Breathing Phase': 'breathing_phase',
+    'Amplitude': 'amplitude',
+    'Velocity': 'velocity',
+    'Patient ID': 'row_patient_id',
+    'Age': 'row_age',
+    'Gender': 'row_gender',
+    'Health Status': 'row_health_status'
+}
+
+# Header label (units stripped) -> metadata key, with the parser for its value
+HEADER_FIELDS = {
+    'ID': ('patient_id', str),
+    'Age': ('age', int),
+    'Gender': ('gender', str),
+    'Health Status': ('health_status', str),
+    'Notes': ('notes', str),
+    'Total Duration': ('total_duration', float),
+    'Breathing Rate': ('breathing_rate', float),
+    'Average Amplitude': ('avg_amplitude', float),
+    'Maximum Amplitude': ('max_amplitude', float),
+    'Minimum Amplitude': ('min_amplitude', float),
+    'Total Breaths': ('total_breaths', int)
+}
+
+FILENAME_PATTERN = re.compile(r'respiratory_data_(?P<patient_id>.+)_(?P<date>\d{8})_(?P<time>\d{6})\.csv$')
+
+
+def _is_column_header(line):
+    return line.startswith('Relative Time') or line.startswith('timestamp')
+
+
+def _parse_header_line(line):
+    """Return (key, value) for a header row, or None if it isn't one."""
+    if ',' in line:
+        label, value = line.split(',', 1)
+    elif ':' in line:
+        label, value = line.split(':', 1)
+    else:
+        return None
+
+    # Drop units like "(seconds)" and legacy trailing units like "breaths/minute"
+    label = re.sub(r'\s*\(.*?\)', '', label).strip()
+    field = HEADER_FIELDS.get(label)
+    if field is None:
+        return None
+
+    key, parse = field
+    value = value.strip()
+    for unit in ('breaths/minute', 'seconds'):
+        value = value.replace(unit, '').strip()
+    try:
+        return key, parse(value)
+    except ValueError:
+        return key, None
+
+
+def read_export_header(file_path):
+    """Read only the metadata block of an export, stopping at the column header.
+
+    Returns (metadata, header_index) where header_index is the line number
+    of the column header row, or None if the file has no data table.
+    """
+    metadata = {}
+    with open(file_path, 'r') as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            if _is_column_header(line):
+                return metadata, i
+            if not line or line.startswith('#'):
+                continue
+            parsed = _parse_header_line(line)
+            if parsed is not None and parsed[0] not in metadata:
+                metadata[parsed[0]] = parsed[1]
+    return metadata, None
+
+
+def parse_filename(file_path):
+    """Extract patient ID and recording date/time from an export filename."""
+    match = FILENAME_PATTERN.search(os.path.basename(file_path))
+    if not match:
+        return {}
+    return {
+        'file_patient_id': match.group('patient_id'),
+        'recording_date': match.group('date'),
+        'recording_time': match.group('time')
+    }
+
+
+def read_app_export(file_path, usecols=None):
+    """Read one export into (metadata, frames).
+
+    Frames use the snake_case names from COLUMN_MAP; the per-row copies of the
+    patient fields are dropped since they repeat the metadata block.
+    """
+    metadata, header_index = read_export_header(file_path)
+    if header_index is None:
+        raise ValueError(f"No data table found in {file_path}")
+
+    frames = pd.read_csv(file_path, skiprows=header_index)
+    frames = frames.rename(columns=COLUMN_MAP)
+    frames = frames.drop(columns=[c for c in frames.columns if c.startswith('row_')])
+    if 'breathing_phase' in frames:
+        frames['breathing_phase'] = frames['breathing_phase'].astype(str).str.lower()
+    if usecols is not None:
+        frames = frames[[c for c in usecols if c in frames.columns]]
+
+    metadata.update(parse_filename(file_path))
+    metadata.setdefault('patient_id', metadata.get('file_patient_id', '0'))
+    metadata['file_path'] = os.path.basename(file_path)
+    return metadata, frames
+
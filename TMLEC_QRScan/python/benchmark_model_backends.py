@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Training and Inference Benchmark for Breathing Pattern Model Backends
+
+Trains every backend registered in model_backends.py on the same BIDMC
+feature table, split and scaler as train_abnormal_breathing_model, and
+compares them on:
+1. Grid search time and single-fit time at the best parameters
+2. Serialized artifact size and load time
+3. Per-row predict latency, both single-row and in large batches
+4. Cross-validated and held-out F1
+
+The cheapest backend whose CV F1 is within --f1-tolerance of the best is
+recommended.
+
+Usage:
+    python benchmark_model_backends.py --backends random_forest hist_gradient_boosting
+"""
+
+import io
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import f1_score
+
+from model_backends import BACKENDS, get_backend, median_time
+from respiratory_pattern_classification import PATTERN_FEATURES, load_bidmc_features
+
+
+def benchmark_backend(name, X_train, X_test, y_train, y_test, batch_rows=10000, repeats=5):
+    """Search, fit and time one backend on pre-scaled data."""
+    estimator, param_grid = get_backend(name)
+
+    start = time.perf_counter()
+    grid_search = GridSearchCV(estimator, param_grid, cv=5, scoring='f1', n_jobs=-1)
+    grid_search.fit(X_train, y_train)
+    search_s = time.perf_counter() - start
+    model = grid_search.best_estimator_
+
+    fit_s = median_time(lambda: clone(model).fit(X_train, y_train), repeats)
+
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    artifact_bytes = buffer.tell()
+    load_s = median_time(lambda: joblib.load(io.BytesIO(buffer.getvalue())), repeats)
+
+    single_row = X_test[:1]
+    single_s = median_time(lambda: model.predict(single_row), max(repeats * 20, 50))
+
+    reps = int(np.ceil(batch_rows / len(X_test)))
+    batch = np.tile(X_test, (reps, 1))[:batch_rows]
+    batch_s = median_time(lambda: model.predict(batch), repeats)
+
+    return {
+        'backend': name,
+        'best_params': grid_search.best_params_,
+        'cv_f1': grid_search.best_score_,
+        'test_f1': f1_score(y_test, model.predict(X_test), zero_division=0),
+        'search_s': search_s,
+        'fit_ms': fit_s * 1000,
+        'artifact_kb': artifact_bytes / 1024,
+        'load_ms': load_s * 1000,
+        'single_row_us': single_s * 1e6,
+        'batch_row_us': batch_s * 1e6 / len(batch)
+    }
+
+
+def recommend(results, f1_tolerance):
+    """Cheapest backend (batch latency, then size) that keeps CV F1 within tolerance."""
+    best_f1 = results['cv_f1'].max()
+    eligible = results[results['cv_f1'] >= best_f1 - f1_tolerance]
+    return eligible.sort_values(['batch_row_us', 'artifact_kb']).iloc[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark breathing pattern model backends")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument("--features-csv", default="model_output/bidmc_features.csv",
+                        help="Cached BIDMC feature table (built from the dataset if missing)")
+    parser.add_argument("--batch-rows", type=int, default=10000)
+    parser.add_argument("--f1-tolerance", type=float, default=0.0)
+    parser.add_argument("--output", default="model_output/backend_benchmark.csv")
+    args = parser.parse_args()
+
+    data = load_bidmc_features(args.features_csv)
+    X = data[PATTERN_FEATURES]
+    y = data['abnormal']
+
+    # Same split and scaling as train_abnormal_breathing_model
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+
+    rows = []
+    for name in args.backends:
+        print(f"Benchmarking {name}...")
+        rows.append(benchmark_backend(name, X_train_scaled, X_test_scaled, y_train, y_test, args.batch_rows))
+
+    results = pd.DataFrame(rows)
+    pd.set_option('display.width', 200)
+    print("\nBackend Benchmark Results:")
+    print("-" * 50)
+    print(results.drop(columns=['best_params']).round(3).to_string(index=False))
+    for _, row in results.iterrows():
+        print(f"{row['backend']} best parameters: {row['best_params']}")
+
+    choice = recommend(results, args.f1_tolerance)
+    print(f"\nRecommended backend: {choice['backend']} "
+          f"(CV F1 {choice['cv_f1']:.3f}, {choice['batch_row_us']:.2f} us/row, {choice['artifact_kb']:.1f} KB)")
+    print(f"Train it with: train_abnormal_breathing_model(bidmc_data, backend='{choice['backend']}')")
+
+    results.to_csv(args.output, index=False)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Thread-Count and Delegate Benchmark for the Respiratory TFLite Assets
+
+Measures how respiratory_abnormality.tflite and respiratory_disease.tflite
+from app/src/main/assets behave under different interpreter settings on a
+plain Linux CPU, before their architecture is changed.
+
+The script, for every model, thread count and XNNPACK on/off:
+1. Cold latency: create interpreter, allocate tensors and run the first invoke
+2. Warm single-row latency percentiles (p50/p95/p99)
+3. Throughput in rows/s at several batch sizes (the input batch is dynamic)
+4. Where the time goes, per operator:
+   - from the benchmark_model binary with --enable_op_profiling when it is
+     on PATH (or given with --benchmark-binary)
+   - otherwise an op inventory with weight shapes, weight dtype and
+     multiply-accumulates per row, read from the interpreter
+
+XNNPACK is switched off with OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES;
+with it on, the delegated ops collapse into a single DELEGATE node.
+
+Usage:
+    python benchmark_respiratory_tflite.py --threads 1 2 4 --batch-sizes 1 8 64 256
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import numpy as np
+from pathlib import Path
+
+ASSETS_DIR = Path("../app/src/main/assets")
+DEFAULT_MODELS = ["respiratory_abnormality.tflite", "respiratory_disease.tflite"]
+
+
+def _interpreter_module():
+    """Return (Interpreter, OpResolverType) from whichever runtime is installed."""
+    try:
+        from tflite_runtime.interpreter import Interpreter, OpResolverType
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter, OpResolverType
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+            OpResolverType = tf.lite.experimental.OpResolverType
+    return Interpreter, OpResolverType
+
+
+def make_interpreter(model_path, num_threads, use_xnnpack=True):
+    """Create an interpreter with or without the default XNNPACK CPU delegate."""
+    Interpreter, OpResolverType = _interpreter_module()
+    resolver = OpResolverType.AUTO if use_xnnpack else OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    return Interpreter(model_path=str(model_path), num_threads=num_threads,
+                       experimental_op_resolver_type=resolver)
+
+
+def _set_batch(interpreter, batch_size):
+    """Resize the input to batch_size and return (input_detail, output_detail)."""
+    input_detail = interpreter.get_input_details()[0]
+    shape = list(input_detail['shape'])
+    if shape[0] != batch_size:
+        interpreter.resize_tensor_input(input_detail['index'], [batch_size] + shape[1:])
+    interpreter.allocate_tensors()
+    return interpreter.get_input_details()[0], interpreter.get_output_details()[0]
+
+
+def _random_input(input_detail, batch_size, rng):
+    shape = [batch_size] + list(input_detail['shape'][1:])
+    return rng.standard_normal(shape).astype(input_detail['dtype'])
+
+
+def _percentiles_ms(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {f"p{p}_ms": float(np.percentile(ms, p)) for p in (50, 95, 99)}
+
+
+def cold_latency(model_path, num_threads, use_xnnpack, repeats=20):
+    """Create + allocate + first invoke, timed from scratch each time."""
+    rng = np.random.default_rng(0)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        interpreter = make_interpreter(model_path, num_threads, use_xnnpack)
+        input_detail, _ = _set_batch(interpreter, 1)
+        interpreter.set_tensor(input_detail['index'], _random_input(input_detail, 1, rng))
+        interpreter.invoke()
+        times.append(time.perf_counter() - start)
+    return _percentiles_ms(times)
+
+
+def warm_latency(interpreter, iterations=2000, warmup=50):
+    """Single-row invoke latency once the interpreter is warm."""
+    rng = np.random.default_rng(0)
+    input_detail, output_detail = _set_batch(interpreter, 1)
+    rows = _random_input(input_detail, 256, rng)
+
+    for i in range(warmup):
+        interpreter.set_tensor(input_detail['index'], rows[i % 256:i % 256 + 1])
+        interpreter.invoke()
+
+    times = np.empty(iterations)
+    for i in range(iterations):
+        row = rows[i % 256:i % 256 + 1]
+        start = time.perf_counter()
+        interpreter.set_tensor(input_detail['index'], row)
+        interpreter.invoke()
+        interpreter.get_tensor(output_detail['index'])
+        times[i] = time.perf_counter() - start
+    return _percentiles_ms(times)
+
+
+def batch_throughput(interpreter, batch_size, min_rows=20000, warmup=5):
+    """Rows per second when invoking on batches of batch_size rows."""
+    rng = np.random.default_rng(0)
+    input_detail, output_detail = _set_batch(interpreter, batch_size)
+    batch = _random_input(input_detail, batch_size, rng)
+    for _ in range(warmup):
+        interpreter.set_tensor(input_detail['index'], batch)
+        interpreter.invoke()
+
+    n_invokes = max(20, int(np.ceil(min_rows / batch_size)))
+    start = time.perf_counter()
+    for _ in range(n_invokes):
+        interpreter.set_tensor(input_detail['index'], batch)
+        interpreter.invoke()
+        interpreter.get_tensor(output_detail['index'])
+    elapsed = time.perf_counter() - start
+    return n_invokes * batch_size / elapsed
+
+
+def op_inventory(model_path):
+    """Operators of the undelegated graph with weight shapes and MACs per input row."""
+    interpreter = make_interpreter(model_path, 1, use_xnnpack=False)
+    interpreter.allocate_tensors()
+    tensors = {t['index']: t for t in interpreter.get_tensor_details()}
+
+    ops = []
+    for op in interpreter._get_ops_details():
+        inputs = [tensors[i] for i in op['inputs'] if i >= 0]
+        entry = {'index': op['index'], 'op': op['op_name'], 'macs_per_row': 0, 'weights': '', 'weight_dtype': ''}
+        if op['op_name'] in ('FULLY_CONNECTED', 'CONV_2D', 'DEPTHWISE_CONV_2D') and len(inputs) > 1:
+            weights = inputs[1]
+            entry['weights'] = 'x'.join(str(d) for d in weights['shape'])
+            entry['weight_dtype'] = np.dtype(weights['dtype']).name
+            if op['op_name'] == 'FULLY_CONNECTED':
+                entry['macs_per_row'] = int(np.prod(weights['shape']))
+        ops.append(entry)
+
+    total = sum(op['macs_per_row'] for op in ops) or 1
+    for op in ops:
+        op['macs_share'] = op['macs_per_row'] / total
+    return ops
+
+
+def profile_with_binary(binary, model_path, num_threads, use_xnnpack, runs=500):
+    """Per-op average time from benchmark_model --enable_op_profiling, or None if it fails."""
+    command = [binary, f"--graph={model_path}", f"--num_threads={num_threads}", f"--num_runs={runs}",
+               "--enable_op_profiling=true", f"--use_xnnpack={'true' if use_xnnpack else 'false'}"]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, timeout=300).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"benchmark_model failed: {e}")
+        return None
+
+    # The "Operator-wise Profiling Info for Regular Benchmark Runs" table, tab separated:
+    # node type, first, avg ms, %, cdf%, mem KB, times called, name
+    section = output.split("Operator-wise Profiling Info for Regular Benchmark Runs")
+    if len(section) < 2:
+        return None
+    rows = []
+    for line in section[1].split("Top by Computation Time")[0].splitlines():
+        fields = [f.strip() for f in line.split('\t') if f.strip()]
+        if len(fields) >= 5 and re.match(r'^[\d.]+$', fields[2]):
+            rows.append({'op': fields[0], 'avg_ms': float(fields[2]),
+                         'percent': float(fields[3].rstrip('%')), 'name': fields[-1]})
+    return rows or None
+
+
+def benchmark_model(model_path, num_threads, use_xnnpack, batch_sizes):
+    """Cold, warm and batched timings for one model and interpreter setting."""
+    result = {
+        'model': Path(model_path).name,
+        'threads': num_threads,
+        'xnnpack': use_xnnpack,
+        'cold': cold_latency(model_path, num_threads, use_xnnpack)
+    }
+    interpreter = make_interpreter(model_path, num_threads, use_xnnpack)
+    result['warm'] = warm_latency(interpreter)
+    result['throughput_rows_per_s'] = {
+        batch_size: batch_throughput(interpreter, batch_size) for batch_size in batch_sizes
+    }
+    interpreter = make_interpreter(model_path, num_threads, use_xnnpack)
+    interpreter.allocate_tensors()
+    result['delegated'] = any(op['op_name'] == 'DELEGATE' for op in interpreter._get_ops_details())
+    return result
+
+
+def print_report(results, batch_sizes):
+    print("\n" + "=" * 110)
+    header = f"{'model':<32}{'thr':>4}{'xnn':>5}{'cold p50':>10}{'warm p50':>10}{'p95':>8}{'p99':>8}"
+    header += "".join(f"{'b=' + str(b) + ' r/s':>13}" for b in batch_sizes)
+    print(header)
+    print("-" * 110)
+    for r in results:
+        line = (f"{r['model']:<32}{r['threads']:>4}{'on' if r['xnnpack'] else 'off':>5}"
+                f"{r['cold']['p50_ms']:>10.3f}{r['warm']['p50_ms']:>10.4f}"
+                f"{r['warm']['p95_ms']:>8.4f}{r['warm']['p99_ms']:>8.4f}")
+        line += "".join(f"{r['throughput_rows_per_s'][b]:>13.0f}" for b in batch_sizes)
+        print(line)
+
+    print("\nXNNPACK speedup (throughput at the largest batch, on / off):")
+    largest = batch_sizes[-1]
+    for r in results:
+        if not r['xnnpack']:
+            continue
+        off = next((o for o in results if o['model'] == r['model'] and o['threads'] == r['threads']
+                    and not o['xnnpack']), None)
+        if off:
+            speedup = r['throughput_rows_per_s'][largest] / off['throughput_rows_per_s'][largest]
+            print(f"  {r['model']} @ {r['threads']} threads: {speedup:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the respiratory TFLite assets on CPU")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS,
+                        help="Model files, relative to the assets folder unless absolute")
+    parser.add_argument("--assets-dir", default=str(ASSETS_DIR))
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 64, 256])
+    parser.add_argument("--benchmark-binary", default=shutil.which("benchmark_model"),
+                        help="Path to the TFLite benchmark_model binary for per-op profiling")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    assets_dir = Path(args.assets_dir)
+    batch_sizes = sorted(args.batch_sizes)
+    print("Respiratory TFLite Benchmark")
+    print("=" * 50)
+    print(f"CPU cores available: {os.cpu_count()}")
+
+    results, profiles = [], {}
+    for model in args.models:
+        model_path = Path(model) if os.path.isabs(model) else assets_dir / model
+        if not model_path.exists():
+            print(f"Skipping {model_path}: not found")
+            continue
+
+        print(f"\nOperators of {model_path.name} (without delegate):")
+        inventory = op_inventory(model_path)
+        for op in inventory:
+            weights = f"{op['weights']} {op['weight_dtype']}" if op['weights'] else ""
+            print(f"  {op['index']:>2} {op['op']:<18}{weights:<18}{op['macs_per_row']:>8} MACs/row "
+                  f"({op['macs_share']:.0%})")
+        profiles[model_path.name] = {'inventory': inventory}
+
+        for use_xnnpack in (True, False):
+            for threads in args.threads:
+                print(f"Benchmarking {model_path.name}: {threads} thread(s), XNNPACK {'on' if use_xnnpack else 'off'}...")
+                results.append(benchmark_model(model_path, threads, use_xnnpack, batch_sizes))
+
+        if args.benchmark_binary:
+            for use_xnnpack in (True, False):
+                op_times = profile_with_binary(args.benchmark_binary, model_path, 1, use_xnnpack)
+                if op_times:
+                    key = 'op_profile_xnnpack' if use_xnnpack else 'op_profile'
+                    profiles[model_path.name][key] = op_times
+                    print(f"\nPer-op time for {model_path.name}, XNNPACK {'on' if use_xnnpack else 'off'}:")
+                    for row in op_times:
+                        print(f"  {row['op']:<18}{row['avg_ms']:>9.4f} ms {row['percent']:>6.1f}%  {row['name']}")
+
+    if not results:
+        print("\nNo models could be benchmarked")
+        return
+
+    if not args.benchmark_binary:
+        print("\nbenchmark_model not found; per-op split above is by MACs, not measured time.")
+    print_report(results, batch_sizes)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'operators': profiles}, f, indent=2, default=str)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
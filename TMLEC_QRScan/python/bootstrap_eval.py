@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Bootstrap Confidence Intervals for Classification Metrics
+
+A single accuracy number from a 53-row split or one app-data evaluation says
+nothing about how much it would move on other data. This module resamples
+the (y_true, y_pred) pairs with replacement and reports percentile
+intervals for accuracy, F1 and per-class recall.
+
+Predictions are computed once and labels are encoded as one integer per
+confusion-matrix cell. Resampling rows with replacement only changes how
+many rows land in each cell, so the confusion matrix of a resample is a
+multinomial draw over the observed cell frequencies: every resample costs
+O(n_cells) time and memory whatever the number of rows, and all metrics
+are read off the stacked confusion matrices.
+
+Usage:
+    python bootstrap_eval.py predictions.csv --true breathing_phase --pred predicted_phase --resamples 5000
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+
+
+def confusion_counts(cell_codes, n_classes):
+    """Confusion matrix, shape (n_classes, n_classes), of cell codes true_code * n_classes + pred_code."""
+    return np.bincount(cell_codes, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+
+def bootstrap_confusion(cm, n_resamples, rng):
+    """Confusion matrices of n_resamples resamples of the rows behind cm, shape (n_resamples, k, k).
+
+    Drawing n rows with replacement and counting cells is exactly a
+    multinomial draw of n over the cell frequencies.
+    """
+    n_rows = int(cm.sum())
+    counts = rng.multinomial(n_rows, cm.ravel() / n_rows, size=n_resamples)
+    return counts.reshape(n_resamples, *cm.shape)
+
+
+def metrics_from_confusion(cm, positive_index=None):
+    """Accuracy, F1 and per-class recall from stacked confusion matrices.
+
+    F1 is for positive_index when given (binary), otherwise macro-averaged.
+    Undefined ratios count as 0, like zero_division=0 in scikit-learn.
+    """
+    cm = cm.astype(np.float64)
+    diag = np.diagonal(cm, axis1=1, axis2=2)
+    actual = cm.sum(axis=2)
+    predicted = cm.sum(axis=1)
+    total = cm.sum(axis=(1, 2))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recall = np.where(actual > 0, diag / actual, 0.0)
+        precision = np.where(predicted > 0, diag / predicted, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        # Recall of a class absent from a resample is undefined rather than 0
+        recall_or_nan = np.where(actual > 0, diag / actual, np.nan)
+
+    metrics = {'accuracy': diag.sum(axis=1) / total}
+    metrics['f1'] = f1[:, positive_index] if positive_index is not None else f1.mean(axis=1)
+    for k in range(cm.shape[1]):
+        metrics[f"recall_{k}"] = recall_or_nan[:, k]
+    return metrics
+
+
+def bootstrap_metrics(y_true, y_pred, n_resamples=2000, confidence=0.95, positive_label=1, seed=42):
+    """Point estimates and percentile bootstrap intervals for accuracy, F1 and per-class recall.
+
+    F1 is binary for positive_label when there are at most two classes and
+    positive_label is one of them, macro-averaged otherwise. Returns one row
+    per metric with estimate, lower, upper and std.
+    """
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    if len(y_true) == 0 or len(y_true) != len(y_pred):
+        raise ValueError(f"Need equally long, non-empty label arrays, got {len(y_true)} and {len(y_pred)}")
+    classes = np.unique(np.concatenate([y_true, y_pred]))
+    n_classes = len(classes)
+    # One integer per row encodes its confusion-matrix cell
+    cell_codes = np.searchsorted(classes, y_true) * n_classes + np.searchsorted(classes, y_pred)
+    positive_index = (int(np.searchsorted(classes, positive_label))
+                      if n_classes <= 2 and positive_label in classes else None)
+
+    cm = confusion_counts(cell_codes, n_classes)
+    point = metrics_from_confusion(cm[None], positive_index)
+    samples = metrics_from_confusion(bootstrap_confusion(cm, n_resamples, np.random.default_rng(seed)),
+                                     positive_index)
+
+    alpha = (1 - confidence) / 2
+    rows = []
+    for name in point:
+        metric = name if not name.startswith('recall_') else f"recall[{classes[int(name.split('_')[1])]}]"
+        rows.append({
+            'metric': metric,
+            'estimate': float(point[name][0]),
+            'lower': float(np.nanpercentile(samples[name], 100 * alpha)),
+            'upper': float(np.nanpercentile(samples[name], 100 * (1 - alpha))),
+            'std': float(np.nanstd(samples[name]))
+        })
+    return pd.DataFrame(rows)
+
+
+def print_intervals(intervals, confidence=0.95, title="Bootstrap confidence intervals"):
+    print(f"\n{title} ({confidence:.0%}):")
+    for _, row in intervals.iterrows():
+        print(f"  {row['metric']:<20} {row['estimate']:.4f}  [{row['lower']:.4f}, {row['upper']:.4f}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals for saved predictions")
+    parser.add_argument("predictions_csv")
+    parser.add_argument("--true", default="y_true", help="Column with the true labels")
+    parser.add_argument("--pred", default="y_pred", help="Column with the predicted labels")
+    parser.add_argument("--resamples", type=int, default=2000)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--positive-label", default=1)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.predictions_csv)
+    positive_label = args.positive_label
+    if df[args.true].dtype.kind in 'iuf':
+        positive_label = type(df[args.true].iloc[0].item())(positive_label)
+
+    intervals = bootstrap_metrics(df[args.true], df[args.pred], args.resamples, args.confidence,
+                                  positive_label)
+    print(f"{len(df)} predictions, {args.resamples} resamples")
+    print_intervals(intervals, args.confidence)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Checkpointed, Resumable Bulk Scoring of a Session Directory
+
+Scores every respiratory_data_*.csv export in a directory with the trained
+breathing pattern model, for nightly re-scoring of large archives:
+
+1. A thread pool parses exports and builds the per-session feature rows
+2. The main thread scores them in batches with one predict call per batch
+3. Each batch is appended to the results CSV, then recorded in a checkpoint
+4. A restart skips checkpointed files and resumes where the last run stopped
+5. Optionally upserts each batch into the SQLite results store as well
+
+The checkpoint records each file with its mtime, size and the model version
+that scored it, so an edited export or a retrained model gets the file
+re-scored on the next run (the newer row is appended; for a file_path the
+last row in the results CSV wins). It also stores the results file size
+after each batch, so a crash in the middle of a write is repaired by
+truncating the torn tail. --fresh discards both and starts over.
+
+Usage:
+    python bulk_score.py respiratory_data/ --results bulk_results.csv --workers 16 --batch-size 256
+    python bulk_score.py respiratory_data/ --db breathing_results.db
+    python bulk_score.py respiratory_data/ --fresh
+"""
+
+import os
+import json
+import time
+import argparse
+import pandas as pd
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+
+from app_export import read_app_export
+from fuse_scaler import load_scoring_model
+from respiratory_pattern_classification import summarize_session, score_sessions
+from results_store import connect, upsert_results, model_version
+
+RESULT_COLUMNS = ['patient_id', 'file_path', 'age', 'gender', 'health_status', 'breathing_rate',
+                  'avg_amplitude', 'max_amplitude', 'min_amplitude', 'avg_velocity',
+                  'amplitude_variability', 'duration_variability',
+                  'predicted_abnormal', 'abnormal_probability', 'scored_at']
+
+
+def parse_session(file_path):
+    """Read one export and return its feature row, or an error string."""
+    try:
+        metadata, frames = read_app_export(file_path)
+        return summarize_session(metadata, frames, file_path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def file_stamp(file_path, version):
+    """[mtime, size, model version] of a file, as stored in the checkpoint."""
+    stat = os.stat(file_path)
+    return [stat.st_mtime, stat.st_size, version]
+
+
+def load_checkpoint(checkpoint_path, results_path, fresh=False):
+    """Return {file name: stamp} of processed files and repair a torn results file.
+
+    Without a checkpoint, an existing non-empty results file is only
+    overwritten when fresh is set.
+    """
+    if fresh:
+        for path in (checkpoint_path, results_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return {}
+
+    if not os.path.exists(checkpoint_path):
+        if os.path.exists(results_path) and os.path.getsize(results_path) > 0:
+            raise ValueError(f"{results_path} exists but has no checkpoint ({checkpoint_path}); "
+                             "pass --fresh to overwrite it or choose another --results file")
+        return {}
+
+    processed = {}
+    results_bytes = 0
+    with open(checkpoint_path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # torn last line from an interrupted run
+            processed.update(entry['files'])
+            results_bytes = entry['results_bytes']
+
+    # Anything past the last checkpointed offset belongs to an unfinished batch
+    if os.path.exists(results_path) and os.path.getsize(results_path) > results_bytes:
+        with open(results_path, 'r+b') as f:
+            f.truncate(results_bytes)
+    return processed
+
+
+def append_batch(rows, results_path, checkpoint_path, failed_files, stamps):
+    """Append scored rows, fsync, then checkpoint the files they cover."""
+    write_header = not os.path.exists(results_path) or os.path.getsize(results_path) == 0
+    with open(results_path, 'a', newline='') as f:
+        if rows is not None and len(rows):
+            rows.to_csv(f, header=write_header, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+        results_bytes = f.tell()
+
+    names = (list(rows['file_path']) if rows is not None else []) + failed_files
+    files = {name: stamps[name] for name in names}
+    with open(checkpoint_path, 'a') as f:
+        f.write(json.dumps({'files': files, 'results_bytes': results_bytes}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def bulk_score(data_dir='respiratory_data', results_path='bulk_results.csv', checkpoint_path=None,
+               model_dir='model_output', workers=None, batch_size=256, db_path=None, fresh=False):
+    """Score all new or changed exports in data_dir, resuming from the checkpoint.
+
+    With db_path, every batch is also upserted into that results store.
+    """
+    checkpoint_path = checkpoint_path or results_path + '.checkpoint'
+    model, scaler, features = load_scoring_model(model_dir)
+    conn = connect(db_path) if db_path else None
+    version = model_version(model_dir)
+
+    processed = load_checkpoint(checkpoint_path, results_path, fresh)
+    stamps = {os.path.basename(f): file_stamp(f, version)
+              for f in sorted(glob(f"{data_dir}/respiratory_data_*.csv"))}
+    # New files, edited files and files scored by another model version
+    files = [os.path.join(data_dir, name) for name, stamp in stamps.items() if processed.get(name) != stamp]
+    print(f"{len(stamps) - len(files)} files up to date, {len(files)} to score")
+    if not files:
+        return 0
+
+    workers = workers or min(32, (os.cpu_count() or 1) * 2)
+    start = time.perf_counter()
+    scored = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Keep a bounded number of parses in flight so memory stays flat
+        window = batch_size * 2
+        pending = [(f, pool.submit(parse_session, f)) for f in files[:window]]
+        next_file = window
+        rows, failed = [], []
+
+        while pending:
+            file_path, future = pending.pop(0)
+            row, error = future.result()
+            if next_file < len(files):
+                pending.append((files[next_file], pool.submit(parse_session, files[next_file])))
+                next_file += 1
+
+            if row is None:
+                # Checkpoint unreadable files too, so a restart does not retry them forever
+                print(f"Error loading {file_path}: {error}")
+                failed.append(os.path.basename(file_path))
+            else:
+                rows.append(row)
+
+            if len(rows) + len(failed) >= batch_size or not pending:
+                batch = pd.DataFrame(rows) if rows else None
+                if batch is not None:
+                    batch['predicted_abnormal'], batch['abnormal_probability'] = score_sessions(
+                        model, scaler, features, batch
+                    )
+                    batch['scored_at'] = pd.Timestamp.now().isoformat()
+                    batch = batch[RESULT_COLUMNS]
+                    if conn is not None:
+                        # Upserts are idempotent, so a batch replayed after a crash does no harm
+                        upsert_results(conn, batch, version)
+                append_batch(batch, results_path, checkpoint_path, failed, stamps)
+                scored += len(rows)
+                rows, failed = [], []
+
+                elapsed = time.perf_counter() - start
+                print(f"Scored {scored}/{len(files)} sessions ({scored / elapsed:.1f} sessions/s)")
+
+    if conn is not None:
+        conn.close()
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpointed bulk scoring of app exports")
+    parser.add_argument("data_dir", nargs="?", default="respiratory_data")
+    parser.add_argument("--results", default="bulk_results.csv")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <results>.checkpoint)")
+    parser.add_argument("--model-dir", default="model_output")
+    parser.add_argument("--workers", type=int, help="Parser threads (default: 2 x cores)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--db", help="Also upsert results into this SQLite results store")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Discard the checkpoint and results file and score everything again")
+    args = parser.parse_args()
+
+    bulk_score(args.data_dir, args.results, args.checkpoint, args.model_dir, args.workers, args.batch_size,
+               args.db, args.fresh)
+    print(f"\nDone! Results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -56,12 +56,19 @@ def test_model():
     print("\n3. Testing the model...")
     
     try:
-        # Load model artifacts
-        model = joblib.load('model_output/breathing_pattern_model.joblib')
+        # Load model artifacts, preferring the fused model (raw features) for the
+        # scikit-learn predictions; the scaler is still needed for the TFLite model
         scaler = joblib.load('model_output/pattern_scaler.joblib')
-        
-        with open('model_output/pattern_features.json', 'r') as f:
-            features = json.load(f)
+        if os.path.exists('model_output/breathing_pattern_model_fused.joblib'):
+            model = joblib.load('model_output/breathing_pattern_model_fused.joblib')
+            features = list(model.feature_names_in_)
+            fused = True
+        else:
+            model = joblib.load('model_output/breathing_pattern_model.joblib')
+            fused = False
+            
+            with open('model_output/pattern_features.json', 'r') as f:
+                features = json.load(f)
             
         print(f"Model loaded successfully with features: {features}")
         
@@ -162,13 +169,14 @@ def test_model():
         test_df = pd.DataFrame(test_data)
         X_test = test_df[features].values
         
-        # Scale the features
+        # Scale the features (the TFLite model always takes scaled input)
         X_test_scaled = scaler.transform(X_test)
+        model_input = test_df[features] if fused else X_test_scaled
         
         # Make predictions with the scikit-learn model
         print("\nTesting original scikit-learn model:")
-        predictions = model.predict(X_test_scaled)
-        probabilities = model.predict_proba(X_test_scaled)
+        predictions = model.predict(model_input)
+        probabilities = model.predict_proba(model_input)
         
         for i, (prediction, proba) in enumerate(zip(predictions, probabilities)):
             result = "Abnormal" if prediction == 1 else "Normal"
@@ -0,0 +1,176 @@
+"""
+Persistent Cross-Validation Memo for Hyperparameter Search
+
+memoized_grid_search is a drop-in for the GridSearchCV(cv=5, scoring='f1')
+call in train_abnormal_breathing_model. Every per-fold test score is stored
+in a JSON memo keyed by:
+
+- a hash of the training data (X and y bytes and shapes)
+- a hash of the fold's test indices
+- the base estimator (class, fixed parameters, scikit-learn version)
+- the scoring name and the candidate's parameter values
+
+so a search only fits the (candidate, fold) pairs it has not seen before.
+Failed fits are not memoized, so they are retried on the next search. New
+scores are merged into the memo under a file lock and written through a
+temp file, so concurrent searches sharing a memo do not lose each other's
+entries.
+Candidates are ranked the way GridSearchCV ranks them (mean over folds,
+failed fits tied with the worst, first candidate in ParameterGrid order wins
+ties), so best_params_ is identical to a full search; the best candidate is
+then refit on all of the training data, as GridSearchCV does with refit=True.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import warnings
+import numpy as np
+import sklearn
+from dataclasses import dataclass, field
+from joblib import Parallel, delayed
+from sklearn.base import clone, is_classifier
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterGrid, check_cv
+
+try:
+    import fcntl
+except ImportError:  # Windows: merge without a lock
+    fcntl = None
+
+
+@dataclass
+class MemoSearchResult:
+    """The GridSearchCV attributes used by the training code, plus memo statistics."""
+    best_params_: dict
+    best_score_: float
+    best_estimator_: object
+    cv_results_: dict = field(default_factory=dict)
+    n_fitted: int = 0
+    n_memoized: int = 0
+
+
+def _hash_bytes(*arrays):
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.dtype.str, array.shape)).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def _json_key(value):
+    return json.dumps(value, sort_keys=True, default=repr)
+
+
+def data_fingerprint(X, y):
+    """Hash of the training features and labels."""
+    return _hash_bytes(np.asarray(X, dtype=np.float64), np.asarray(y))
+
+
+def estimator_fingerprint(estimator):
+    """Hash of the untuned estimator: its class, fixed parameters and the scikit-learn version."""
+    params = estimator.get_params(deep=False)
+    return hashlib.sha256(
+        _json_key([type(estimator).__module__, type(estimator).__name__, params, sklearn.__version__]).encode()
+    ).hexdigest()
+
+
+def load_memo(memo_path):
+    if memo_path and os.path.exists(memo_path):
+        with open(memo_path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def save_memo(memo, memo_path):
+    """Write the memo to a temp file and swap it in."""
+    directory = os.path.dirname(os.path.abspath(memo_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(memo_path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(memo, f)
+        os.replace(tmp_path, memo_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def merge_memo(new_scores, memo_path):
+    """Add new_scores to the memo on disk, holding a lock across the read and the write."""
+    os.makedirs(os.path.dirname(os.path.abspath(memo_path)), exist_ok=True)
+    with open(memo_path + '.lock', 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        memo = load_memo(memo_path)
+        memo.update(new_scores)
+        save_memo(memo, memo_path)
+
+
+def _fit_and_score(estimator, params, X, y, train, test, scorer):
+    model = clone(estimator).set_params(**clone(params, safe=False))
+    try:
+        model.fit(X[train], y[train])
+        return float(scorer(model, X[test], y[test]))
+    except Exception as e:
+        # GridSearchCV's default error_score is nan
+        warnings.warn(f"Fit failed for {params}: {e}")
+        return float('nan')
+
+
+def memoized_grid_search(estimator, param_grid, X, y, memo_path, cv=5, scoring='f1', n_jobs=-1):
+    """Grid search that reuses per-fold scores from memo_path and records new ones."""
+    X = np.asarray(X)
+    y = np.asarray(y)
+    candidates = list(ParameterGrid(param_grid))
+    splitter = check_cv(cv, y, classifier=is_classifier(estimator))
+    folds = list(splitter.split(X, y))
+    scorer = get_scorer(scoring)
+
+    base_key = _json_key([data_fingerprint(X, y), estimator_fingerprint(estimator), scoring])
+    fold_keys = [_hash_bytes(test) for _, test in folds]
+
+    def memo_key(params, fold_index):
+        return hashlib.sha256(_json_key([base_key, fold_keys[fold_index], params]).encode()).hexdigest()
+
+    memo = load_memo(memo_path)
+    missing = [(i, k) for i, params in enumerate(candidates) for k in range(len(folds))
+               if memo_key(params, k) not in memo]
+
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_score)(estimator, candidates[i], X, y, folds[k][0], folds[k][1], scorer)
+        for i, k in missing
+    )
+    new_scores = {memo_key(candidates[i], k): score for (i, k), score in zip(missing, scores)}
+    # Failed fits (nan) count for this search but are retried next time
+    succeeded = {key: score for key, score in new_scores.items() if not np.isnan(score)}
+    if succeeded:
+        merge_memo(succeeded, memo_path)
+    memo.update(new_scores)
+
+    split_scores = np.array([[memo[memo_key(params, k)] for k in range(len(folds))] for params in candidates],
+                            dtype=np.float64)
+    mean_scores = np.average(split_scores, axis=1)
+
+    # Same ranking as GridSearchCV: failed candidates tie with the worst, earliest candidate wins ties
+    if np.isnan(mean_scores).all():
+        best_index = 0
+    else:
+        best_index = int(np.argmax(np.nan_to_num(mean_scores, nan=np.nanmin(mean_scores) - 1)))
+
+    best_params = candidates[best_index]
+    best_estimator = clone(estimator).set_params(**clone(best_params, safe=False)).fit(X, y)
+    cv_results = {'params': candidates, 'mean_test_score': mean_scores}
+    for k in range(len(folds)):
+        cv_results[f"split{k}_test_score"] = split_scores[:, k]
+
+    return MemoSearchResult(
+        best_params_=best_params,
+        best_score_=float(mean_scores[best_index]),
+        best_estimator_=best_estimator,
+        cv_results_=cv_results,
+        n_fitted=len(missing),
+        n_memoized=split_scores.size - len(missing)
+    )
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Batch Port of the DiseaseClassifier Feature Vector
+
+Computes the features DiseaseClassifier.kt builds on the phone, for many
+app sessions at once, so training and parity datasets for
+respiratory_disease.tflite can be generated from the export archive:
+
+- the 10-feature vector of createFullFeatureVector, in DISEASE_FEATURES order
+- breath_cycle_duration (mean inhale-to-inhale time, ms)
+- irregularity_index (calculateIrregularityIndex, 0-100)
+
+All sessions are concatenated into flat arrays with a session index, and
+every per-session statistic is a bincount over that index, so there is no
+per-session Python loop. Rates and amplitudes come from the export's
+Breathing Analysis Summary, which is what the app passes in as
+BreathingMetrics; the per-frame statistics follow the Kotlin helpers,
+including their small-sample fallbacks. Values match the app to float32
+precision.
+
+The script:
+1. Reads every export in a directory (or frames from the Parquet session dataset)
+2. Computes the feature table for all sessions in one pass
+3. Saves it to a CSV with one row per session
+
+Usage:
+    python disease_features.py respiratory_data/ --output disease_features.csv
+    python disease_features.py --dataset-dir session_dataset --output disease_features.csv
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+
+from app_export import read_app_export
+
+# Input order of createFullFeatureVector / respiratory_disease.tflite
+DISEASE_FEATURES = ['breathing_rate', 'avg_amplitude', 'max_amplitude', 'min_amplitude', 'avg_velocity',
+                    'amplitude_variability', 'duration_variability', 'velocity_variability', 'age', 'gender']
+
+FRAME_COLUMNS = ['timestamp', 'breathing_phase', 'amplitude', 'velocity']
+
+
+def _segment_mean(values, seg, counts):
+    return np.bincount(seg, weights=values, minlength=len(counts)) / np.maximum(counts, 1)
+
+
+def _segment_std(values, seg, counts, mean):
+    """Population standard deviation per segment, as in the Kotlin helpers."""
+    squared = (values - mean[seg]) ** 2
+    return np.sqrt(_segment_mean(squared, seg, counts))
+
+
+def _event_intervals(positions, seg):
+    """Differences between consecutive events of the same session, with that session's index."""
+    same = seg[1:] == seg[:-1]
+    return (positions[1:] - positions[:-1])[same], seg[1:][same]
+
+
+def _interval_cv(intervals, seg, n_sessions):
+    """(count, coefficient of variation, mean) of per-session intervals."""
+    counts = np.bincount(seg, minlength=n_sessions).astype(np.float64)
+    mean = _segment_mean(intervals.astype(np.float64), seg, counts)
+    std = _segment_std(intervals.astype(np.float64), seg, counts, mean)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return counts, std / mean, mean
+
+
+def irregularity_index(breathing_rate, amplitude_variability, duration_variability, velocity_variability):
+    """calculateIrregularityIndex, vectorized."""
+    rate = np.asarray(breathing_rate, dtype=np.float64)
+    rate_score = np.select(
+        [(rate < 8) | (rate > 25), (rate < 12) | (rate > 20)],
+        [25.0, 15.0],
+        default=0.0
+    )
+    index = (rate_score
+             + np.clip(np.asarray(amplitude_variability) * 100, 0, 25)
+             + np.clip(np.asarray(duration_variability) * 100, 0, 25)
+             + np.clip(np.asarray(velocity_variability) * 100, 0, 25))
+    return np.clip(index, 0, 100)
+
+
+def compute_disease_features(sessions, frames):
+    """Feature table for many sessions.
+
+    sessions: one row per session with file_path, age, gender, breathing_rate,
+    avg_amplitude, max_amplitude and min_amplitude (the export header fields).
+    frames: all sessions' rows with file_path and FRAME_COLUMNS, each session's
+    rows contiguous and in recording order.
+    """
+    sessions = sessions.reset_index(drop=True)
+    n_sessions = len(sessions)
+    session_index = pd.Index(sessions['file_path'])
+    seg = session_index.get_indexer(frames['file_path'])
+    if np.any(seg < 0):
+        raise ValueError("frames contain sessions that are missing from the session table")
+    order = np.argsort(seg, kind='stable')
+    seg = seg[order]
+
+    t = frames['timestamp'].to_numpy(dtype=np.float64)[order]
+    amplitude = frames['amplitude'].to_numpy(dtype=np.float64)[order]
+    velocity = frames['velocity'].to_numpy(dtype=np.float64)[order]
+    phases = frames['breathing_phase'].astype(str).str.lower().to_numpy()[order]
+    phase_codes = pd.factorize(phases)[0]
+    inhaling = phases == 'inhaling'
+
+    counts = np.bincount(seg, minlength=n_sessions).astype(np.float64)
+    first_row = np.ones(len(seg), dtype=bool)
+    first_row[1:] = seg[1:] != seg[:-1]
+
+    # calculateAmplitudeVariability: std / mean, 0 for a zero mean or fewer than 2 rows
+    amp_mean = _segment_mean(amplitude, seg, counts)
+    amp_std = _segment_std(amplitude, seg, counts, amp_mean)
+    amplitude_variability = np.where((counts >= 2) & (amp_mean != 0), amp_std / np.where(amp_mean != 0, amp_mean, 1), 0.0)
+
+    # calculateAverageVelocity: mean |velocity|
+    avg_velocity = _segment_mean(np.abs(velocity), seg, counts)
+
+    # calculateVelocityVariability: std / |mean| when |mean| > 0.1, else std
+    vel_mean = _segment_mean(velocity, seg, counts)
+    vel_std = _segment_std(velocity, seg, counts, vel_mean)
+    velocity_variability = np.where(
+        counts < 2, 0.0,
+        np.where(np.abs(vel_mean) > 0.1, vel_std / np.where(np.abs(vel_mean) > 0.1, np.abs(vel_mean), 1), vel_std)
+    )
+
+    # Inhale starts: phase turns to inhaling from anything else within a session
+    prev_inhaling = np.zeros(len(seg), dtype=bool)
+    prev_inhaling[1:] = inhaling[:-1]
+    inhale_start = inhaling & ~prev_inhaling & ~first_row
+    starts = np.flatnonzero(inhale_start)
+
+    # calculateDurationVariability: CV of inhale-to-inhale cycle lengths in rows...
+    cycle_rows, cycle_seg = _event_intervals(starts, seg[starts])
+    n_cycles, cycle_cv, _ = _interval_cv(cycle_rows, cycle_seg, n_sessions)
+
+    # ...falling back to the CV of time between phase transitions when fewer than 2 cycles
+    transition = np.zeros(len(seg), dtype=bool)
+    transition[1:] = phase_codes[1:] != phase_codes[:-1]
+    transition &= ~first_row
+    transitions = np.flatnonzero(transition)
+    transition_intervals, transition_seg = _event_intervals(t[transitions], seg[transitions])
+    n_intervals, transition_cv, _ = _interval_cv(transition_intervals, transition_seg, n_sessions)
+
+    duration_variability = np.where(
+        counts < 4, 0.0,
+        np.where(n_cycles >= 2, cycle_cv, np.where(n_intervals >= 2, transition_cv, 0.0))
+    )
+
+    # calculateBreathCycleDuration: mean time between inhale starts, ms
+    cycle_times, cycle_time_seg = _event_intervals(t[starts], seg[starts])
+    n_cycle_times, _, cycle_time_mean = _interval_cv(cycle_times, cycle_time_seg, n_sessions)
+    breath_cycle_duration = np.where((counts >= 4) & (n_cycle_times >= 1), cycle_time_mean, 0.0)
+
+    # The Kotlin helpers treat an empty session the same way as a too-short one
+    avg_velocity = np.where(counts > 0, avg_velocity, 0.0)
+
+    table = pd.DataFrame({
+        'file_path': sessions['file_path'],
+        'patient_id': sessions['patient_id'] if 'patient_id' in sessions else '0',
+        'breathing_rate': sessions['breathing_rate'].fillna(0).astype(np.float64),
+        'avg_amplitude': sessions['avg_amplitude'].fillna(0).astype(np.float64),
+        'max_amplitude': sessions['max_amplitude'].fillna(0).astype(np.float64),
+        'min_amplitude': sessions['min_amplitude'].fillna(0).astype(np.float64),
+        'avg_velocity': avg_velocity,
+        'amplitude_variability': amplitude_variability,
+        'duration_variability': duration_variability,
+        'velocity_variability': velocity_variability,
+        'age': sessions['age'].fillna(0).astype(np.float64),
+        'gender': (sessions['gender'].fillna('').astype(str).str.lower() == 'male').astype(np.float64),
+        'breath_cycle_duration': breath_cycle_duration
+    })
+    table['irregularity_index'] = irregularity_index(
+        table['breathing_rate'], table['amplitude_variability'],
+        table['duration_variability'], table['velocity_variability']
+    )
+
+    # The app computes in Float
+    float_columns = DISEASE_FEATURES + ['breath_cycle_duration', 'irregularity_index']
+    table[float_columns] = table[float_columns].astype(np.float32)
+    return table
+
+
+def _read_export(file_path):
+    try:
+        return read_app_export(file_path, usecols=FRAME_COLUMNS), None
+    except Exception as e:
+        return None, f"Error loading {file_path}: {str(e)}"
+
+
+def load_exports(data_dir='respiratory_data', workers=None):
+    """Read every export in data_dir into (sessions, frames) tables."""
+    files = sorted(glob(f"{data_dir}/respiratory_data_*.csv"))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_read_export, files))
+
+    sessions, frames = [], []
+    for result, error in results:
+        if result is None:
+            print(error)
+            continue
+        metadata, session_frames = result
+        session_frames['file_path'] = metadata['file_path']
+        sessions.append(metadata)
+        frames.append(session_frames)
+    if not sessions:
+        raise ValueError(f"No exports could be loaded from {data_dir}")
+    return pd.DataFrame(sessions), pd.concat(frames, ignore_index=True)
+
+
+def load_dataset(dataset_dir):
+    """Read (sessions, frames) from the Parquet session dataset, keeping each file's row order."""
+    from session_dataset import read_frames, read_sessions
+
+    sessions = read_sessions(dataset_dir)
+    frames = read_frames(dataset_dir, columns=['file_path'] + FRAME_COLUMNS)
+    return sessions, frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute DiseaseClassifier features for many sessions")
+    parser.add_argument("data_dir", nargs="?", default="respiratory_data")
+    parser.add_argument("--dataset-dir", help="Read from the Parquet session dataset instead of CSV exports")
+    parser.add_argument("--workers", type=int, help="Threads for reading CSV exports")
+    parser.add_argument("--output", default="disease_features.csv")
+    args = parser.parse_args()
+
+    if args.dataset_dir:
+        sessions, frames = load_dataset(args.dataset_dir)
+    else:
+        sessions, frames = load_exports(args.data_dir, args.workers)
+    print(f"Loaded {len(sessions)} sessions ({len(frames)} frames)")
+
+    table = compute_disease_features(sessions, frames)
+    table.to_csv(args.output, index=False)
+
+    print("\nFeature summary:")
+    print(table[DISEASE_FEATURES + ['breath_cycle_duration', 'irregularity_index']].describe().T[['mean', 'min', 'max']])
+    print(f"\nFeature table saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
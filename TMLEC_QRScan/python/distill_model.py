@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Distill the Breathing Pattern Forest into a Compact Student Model
+
+The grid-searched forest is far larger than a 9-feature classifier needs.
+This script trains small students (single decision trees and shallow
+forests) to mimic the forest's probabilities over a dense synthetic sample
+of the feature space, and reports how faithfully and how cheaply they do it.
+
+Soft labels are used by fitting each synthetic row twice, once per class,
+weighted by the teacher's probability for that class, so the student learns
+the teacher's confidence rather than only its hard decision.
+
+The script:
+1. Loads the teacher (fused model, or scaler + model) and the BIDMC feature table
+2. Samples the feature space: jittered copies of real rows plus a uniform box
+3. Trains every student candidate on the teacher's probabilities
+4. Reports fidelity, artifact size, load time and latency against the teacher
+5. Saves the smallest student that meets --min-fidelity
+
+Students take raw (unscaled) features in the pattern_features.json order and
+carry feature_names_in_. A single-tree student is also written as JSON node
+arrays so it can be evaluated on the phone or watch without TFLite.
+
+Usage:
+    python distill_model.py --samples 200000 --min-fidelity 0.98
+"""
+
+import io
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import f1_score
+
+from fuse_scaler import load_scoring_model, MODEL_DIR
+from model_backends import median_time
+from respiratory_pattern_classification import load_bidmc_features
+
+STUDENT_MODEL_NAME = 'breathing_pattern_model_student.joblib'
+STUDENT_TREE_NAME = 'breathing_pattern_student_tree.json'
+
+STUDENTS = {
+    'tree_depth_4': lambda: DecisionTreeClassifier(max_depth=4, random_state=42),
+    'tree_depth_6': lambda: DecisionTreeClassifier(max_depth=6, random_state=42),
+    'tree_depth_8': lambda: DecisionTreeClassifier(max_depth=8, min_samples_leaf=20, random_state=42),
+    'tree_depth_12': lambda: DecisionTreeClassifier(max_depth=12, min_samples_leaf=10, random_state=42),
+    'tree_depth_16': lambda: DecisionTreeClassifier(max_depth=16, min_samples_leaf=5, random_state=42),
+    'forest_10x6': lambda: RandomForestClassifier(n_estimators=10, max_depth=6, random_state=42, n_jobs=-1),
+    'forest_20x8': lambda: RandomForestClassifier(n_estimators=20, max_depth=8, random_state=42, n_jobs=-1),
+    'forest_20x12': lambda: RandomForestClassifier(n_estimators=20, max_depth=12, min_samples_leaf=5,
+                                                   random_state=42, n_jobs=-1)
+}
+
+
+def teacher_proba(model, scaler, features, X):
+    """Teacher probability of the abnormal class for raw feature rows."""
+    X = pd.DataFrame(X, columns=features)
+    X_in = scaler.transform(X) if scaler is not None else X
+    probs = model.predict_proba(X_in)
+    return probs[:, 1] if probs.shape[1] > 1 else np.zeros(len(X))
+
+
+def synthetic_sample(real, n_samples, jitter=0.25, uniform_fraction=0.2, seed=42):
+    """Dense raw-feature sample: jittered real rows plus a uniform box around the data."""
+    rng = np.random.default_rng(seed)
+    real = real.astype(np.float64)
+    lo, hi = real.min(axis=0), real.max(axis=0)
+    scale = real.std(axis=0)
+    scale[scale == 0] = 1
+
+    n_uniform = int(n_samples * uniform_fraction)
+    n_jitter = n_samples - n_uniform
+    base = real[rng.integers(0, len(real), n_jitter)]
+    jittered = base + rng.normal(0, jitter, size=base.shape) * scale
+    span = hi - lo
+    uniform = rng.uniform(lo - 0.1 * span, hi + 0.1 * span, size=(n_uniform, real.shape[1]))
+
+    # Round-trip through float32, which is what the trees compare in
+    return np.vstack([jittered, uniform]).astype(np.float32).astype(np.float64)
+
+
+def fit_student(student, X, p_abnormal, features):
+    """Fit on soft labels: every row once per class, weighted by the teacher's probability."""
+    X_twice = pd.DataFrame(np.vstack([X, X]), columns=features)
+    y_twice = np.concatenate([np.zeros(len(X), dtype=int), np.ones(len(X), dtype=int)])
+    weights = np.concatenate([1 - p_abnormal, p_abnormal])
+    keep = weights > 0
+    student.fit(X_twice[keep], y_twice[keep], sample_weight=weights[keep])
+    return student
+
+
+def cost_report(model, X_frame, repeats=5):
+    """Artifact size, load time, single-row and batch per-row latency."""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    artifact = buffer.getvalue()
+    single_row = X_frame[:1]
+    return {
+        'artifact_kb': len(artifact) / 1024,
+        'load_ms': median_time(lambda: joblib.load(io.BytesIO(artifact)), repeats) * 1000,
+        'single_row_us': median_time(lambda: model.predict(single_row), 50) * 1e6,
+        'batch_row_us': median_time(lambda: model.predict(X_frame), repeats) * 1e6 / len(X_frame)
+    }
+
+
+def fidelity_report(student, X_frame, p_teacher, y_true=None):
+    """Agreement with the teacher's class and probability, plus F1 against labels if given."""
+    p_student = student.predict_proba(X_frame)[:, 1] if len(student.classes_) > 1 else np.zeros(len(X_frame))
+    report = {
+        'agreement': float(np.mean((p_student >= 0.5) == (p_teacher >= 0.5))),
+        'mean_abs_prob_diff': float(np.mean(np.abs(p_student - p_teacher)))
+    }
+    if y_true is not None:
+        report['f1'] = f1_score(y_true, (p_student >= 0.5).astype(int), zero_division=0)
+    return report
+
+
+def export_tree_json(tree_model, features, path):
+    """Write a single decision tree as flat node arrays (left/right -1 at leaves)."""
+    tree = tree_model.tree_
+    value = tree.value[:, 0, :]
+    value = value / value.sum(axis=1, keepdims=True)
+    payload = {
+        'features': list(features),
+        'feature': tree.feature.tolist(),
+        'threshold': tree.threshold.tolist(),
+        'left': tree.children_left.tolist(),
+        'right': tree.children_right.tolist(),
+        'abnormal_probability': value[:, -1].tolist()
+    }
+    with open(path, 'w') as f:
+        json.dump(payload, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the breathing pattern forest into a compact student")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--features-csv", default="model_output/bidmc_features.csv")
+    parser.add_argument("--samples", type=int, default=200000)
+    parser.add_argument("--min-fidelity", type=float, default=0.98,
+                        help="Minimum class agreement with the teacher on held-out synthetic rows")
+    args = parser.parse_args()
+
+    teacher, scaler, features = load_scoring_model(args.model_dir)
+    data = load_bidmc_features(args.features_csv)
+    real = data[features].values
+
+    print(f"Sampling {args.samples} synthetic rows around {len(real)} BIDMC rows...")
+    X = synthetic_sample(real, args.samples)
+    p_teacher = teacher_proba(teacher, scaler, features, X)
+    X_train, X_test, p_train, p_test = train_test_split(X, p_teacher, test_size=0.2, random_state=42)
+    X_test_frame = pd.DataFrame(X_test, columns=features)
+    real_frame = pd.DataFrame(real, columns=features)
+    p_real = teacher_proba(teacher, scaler, features, real)
+
+    rows = [{
+        'model': 'teacher',
+        'agreement': 1.0,
+        'mean_abs_prob_diff': 0.0,
+        'real_agreement': 1.0,
+        'real_f1': f1_score(data['abnormal'], (p_real >= 0.5).astype(int), zero_division=0),
+        **cost_report(teacher, scaler.transform(X_test_frame) if scaler is not None else X_test_frame)
+    }]
+    students = {}
+    for name, make_student in STUDENTS.items():
+        print(f"Training student {name}...")
+        student = fit_student(make_student(), X_train, p_train, features)
+        students[name] = student
+        synthetic = fidelity_report(student, X_test_frame, p_test)
+        real_check = fidelity_report(student, real_frame, p_real, data['abnormal'])
+        rows.append({
+            'model': name,
+            'agreement': synthetic['agreement'],
+            'mean_abs_prob_diff': synthetic['mean_abs_prob_diff'],
+            'real_agreement': real_check['agreement'],
+            'real_f1': real_check['f1'],
+            **cost_report(student, X_test_frame)
+        })
+
+    results = pd.DataFrame(rows)
+    pd.set_option('display.width', 200)
+    print("\nDistillation Results (agreement on held-out synthetic rows):")
+    print("-" * 50)
+    print(results.round(4).to_string(index=False))
+    results.to_csv(f"{args.model_dir}/distillation_report.csv", index=False)
+
+    teacher_kb = results.iloc[0]['artifact_kb']
+    eligible = results[(results['model'] != 'teacher') & (results['agreement'] >= args.min_fidelity) &
+                       (results['artifact_kb'] < teacher_kb)]
+    if eligible.empty:
+        print(f"\nNo student smaller than the teacher reached {args.min_fidelity:.1%} agreement; nothing saved.")
+        return
+
+    choice = eligible.sort_values(['artifact_kb', 'batch_row_us']).iloc[0]
+    student = students[choice['model']]
+    joblib.dump(student, f"{args.model_dir}/{STUDENT_MODEL_NAME}")
+    print(f"\nSaved {choice['model']} to {args.model_dir}/{STUDENT_MODEL_NAME} "
+          f"({choice['agreement']:.2%} agreement, {choice['artifact_kb']:.1f} KB "
+          f"vs {teacher_kb:.1f} KB)")
+    if isinstance(student, DecisionTreeClassifier):
+        export_tree_json(student, features, f"{args.model_dir}/{STUDENT_TREE_NAME}")
+        print(f"Tree node arrays written to {args.model_dir}/{STUDENT_TREE_NAME}")
+    print("The student takes raw features in pattern_features.json order: student.predict(df[features])")
+
+
+if __name__ == "__main__":
+    main()
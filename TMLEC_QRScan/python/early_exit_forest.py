@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Early-Exit Inference for the Random Forest Breathing Pattern Model
+
+A random forest predicts the class with the largest summed tree probability.
+Each tree adds at most 1 to any class, so once the leader is ahead of the
+runner-up by more than the number of trees still to run, no remaining tree
+can change the outcome. This script evaluates trees in a fixed order, in
+chunks, and drops every row from the active set as soon as its vote is
+decided, so clearly normal or clearly abnormal sessions only pay for a
+handful of trees.
+
+The predicted class is identical to model.predict: rows whose margin is
+within float rounding of a tie at the end are re-scored with the full
+forest.
+
+The script:
+1. Loads the scoring model (fused or scaler + model) and the BIDMC feature table
+2. Predicts every row with early exit and with the full forest
+3. Checks the predictions match and reports trees used per row and timings
+
+Usage:
+    python early_exit_forest.py --chunk-size 16 --rows 100000
+"""
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from fuse_scaler import load_scoring_model, MODEL_DIR
+from respiratory_pattern_classification import load_bidmc_features
+
+# Summed probabilities from different accumulation orders can differ by a few ulps
+TIE_EPS = 1e-9
+
+
+def _tree_proba(tree, X, normalized):
+    """Class probabilities of one fitted sklearn Tree for float32 rows."""
+    value = tree.predict(X)
+    if normalized:
+        return value
+    # Older scikit-learn stores class counts at the leaves rather than fractions
+    totals = value.sum(axis=1, keepdims=True)
+    return value / np.where(totals == 0, 1, totals)
+
+
+def _vote_margin(votes):
+    """Lead of the top class over the runner-up for each row."""
+    if votes.shape[1] == 2:
+        return np.abs(votes[:, 1] - votes[:, 0])
+    top_two = np.partition(votes, -2, axis=1)[:, -2:]
+    return top_two[:, 1] - top_two[:, 0]
+
+
+def predict_early_exit(model, X, chunk_size=16):
+    """Predict with vote-margin stopping.
+
+    Returns (predictions, trees_used), where trees_used[i] is how many trees
+    were evaluated before row i was decided.
+    """
+    if not hasattr(model, 'estimators_') or not hasattr(model.estimators_[0], 'tree_'):
+        raise ValueError(f"Early exit needs a random forest, got {type(model).__name__}")
+
+    X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    normalized = [np.allclose(tree.value.sum(axis=-1), 1) for tree in trees]
+    n_trees, n_rows = len(trees), len(X)
+    n_classes = len(model.classes_)
+
+    votes = np.zeros((n_rows, n_classes))
+    trees_used = np.full(n_rows, n_trees)
+    decided = np.zeros(n_rows, dtype=bool)
+    active = np.arange(n_rows)
+
+    for chunk_start in range(0, n_trees, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, n_trees)
+        X_active = X[active]
+        # Accumulate the chunk densely, then scatter once into the full vote table
+        chunk_votes = votes[active]
+        for tree, is_normalized in zip(trees[chunk_start:chunk_end], normalized[chunk_start:chunk_end]):
+            chunk_votes += _tree_proba(tree, X_active, is_normalized)
+        votes[active] = chunk_votes
+
+        remaining = n_trees - chunk_end
+        if remaining == 0:
+            break
+        done = _vote_margin(chunk_votes) > remaining + TIE_EPS
+        trees_used[active[done]] = chunk_end
+        decided[active[done]] = True
+        active = active[~done]
+        if len(active) == 0:
+            break
+
+    predictions = model.classes_.take(np.argmax(votes, axis=1))
+
+    # Rows that ran every tree and ended in a near-tie follow the forest's own arithmetic
+    near_tie = ~decided & (_vote_margin(votes) <= TIE_EPS)
+    if np.any(near_tie):
+        predictions[near_tie] = model.predict(X[near_tie])
+    return predictions, trees_used
+
+
+def benchmark(model, X, chunk_size=16, repeats=3):
+    """Time early exit against full evaluation and check they agree."""
+    def best_time(fn):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    full_s, expected = best_time(lambda: model.predict(X))
+    early_s, (predictions, trees_used) = best_time(lambda: predict_early_exit(model, X, chunk_size))
+    return {
+        'rows': len(X),
+        'trees': len(model.estimators_),
+        'mismatches': int(np.sum(predictions != expected)),
+        'mean_trees_used': float(trees_used.mean()),
+        'p95_trees_used': float(np.percentile(trees_used, 95)),
+        'full_ms': full_s * 1000,
+        'early_exit_ms': early_s * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark early-exit forest inference")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--features-csv", default="model_output/bidmc_features.csv")
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=100000, help="Rows to score (BIDMC rows are tiled)")
+    args = parser.parse_args()
+
+    model, scaler, features = load_scoring_model(args.model_dir)
+    data = load_bidmc_features(args.features_csv)
+    X = data[features]
+    X = scaler.transform(X) if scaler is not None else X.values
+    X = np.tile(X, (int(np.ceil(args.rows / len(X))), 1))[:args.rows]
+
+    result = benchmark(model, X, args.chunk_size)
+    print(f"Early-exit inference ({result['trees']} trees, chunk size {args.chunk_size}, {result['rows']} rows):")
+    print(f"  Mismatches vs full forest: {result['mismatches']}")
+    print(f"  Trees used per row: mean {result['mean_trees_used']:.1f}, p95 {result['p95_trees_used']:.0f}")
+    print(f"  Full forest: {result['full_ms']:.1f} ms, early exit: {result['early_exit_ms']:.1f} ms "
+          f"({result['full_ms'] / result['early_exit_ms']:.2f}x)")
+
+    trees_used = predict_early_exit(model, X[:len(data)], args.chunk_size)[1]
+    print("\nTrees used per BIDMC row:")
+    print(pd.Series(trees_used).value_counts().sort_index().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Fold the StandardScaler into Tree Thresholds
+
+Tree splits only compare one feature against a threshold, so a split on a
+standardized feature, (x - mean) / scale <= t, is the same split on the raw
+feature, x <= t * scale + mean. This script rewrites every threshold of the
+trained model into raw-feature units and saves a single fused artifact that
+takes unscaled features directly: no scaler pass, no second file to load.
+
+Thresholds are snapped to the exact boundary in the precision the model
+compares in (float32 for sklearn trees, float64 for histogram boosting), so
+predictions are identical for any input the model can represent. The fused
+model also carries feature_names_in_, so the feature order from
+pattern_features.json travels with it.
+
+The script:
+1. Loads breathing_pattern_model.joblib, pattern_scaler.joblib and pattern_features.json
+2. Rewrites the thresholds of every tree
+3. Verifies fused predictions against scaler + model on real and synthetic rows
+4. Saves model_output/breathing_pattern_model_fused.joblib
+
+Usage:
+    python fuse_scaler.py
+"""
+
+import os
+import copy
+import json
+import numpy as np
+import pandas as pd
+import joblib
+
+MODEL_DIR = 'model_output'
+FUSED_MODEL_NAME = 'breathing_pattern_model_fused.joblib'
+
+
+def _scaler_params(scaler, n_features):
+    mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None and scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None and scaler.with_std else np.ones(n_features)
+    return np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+
+
+def _snap_thresholds(thresholds, mean, scale, dtype):
+    """Raw-unit thresholds T with  v <= T  <=>  dtype((v - mean) / scale) <= t  for every v of dtype.
+
+    Starts from t * scale + mean and walks a few ulps to the exact boundary,
+    since the scaler transform and the cast round differently from the
+    inverse mapping.
+    """
+    def scaled(v):
+        return ((v.astype(np.float64) - mean) / scale).astype(dtype)
+
+    t = thresholds.astype(np.float64)
+    candidate = (t * scale + mean).astype(dtype)
+    up, down = dtype(np.inf), dtype(-np.inf)
+
+    # Step down while the candidate itself would be sent right
+    too_high = scaled(candidate) > t
+    while np.any(too_high):
+        candidate[too_high] = np.nextafter(candidate[too_high], down)
+        too_high = scaled(candidate) > t
+
+    # Step up while the next representable value would still go left
+    can_rise = scaled(np.nextafter(candidate, up)) <= t
+    while np.any(can_rise):
+        candidate[can_rise] = np.nextafter(candidate[can_rise], up)
+        can_rise = scaled(np.nextafter(candidate, up)) <= t
+
+    return candidate.astype(np.float64)
+
+
+def _fuse_sklearn_tree(tree, mean, scale):
+    """Rewrite a fitted sklearn Tree (tree_.threshold is a writable view)."""
+    feature = tree.feature
+    internal = feature >= 0
+    if not np.any(internal):
+        return
+    idx = feature[internal]
+    tree.threshold[internal] = _snap_thresholds(
+        tree.threshold[internal], mean[idx], scale[idx], np.float32
+    )
+
+
+def _fuse_hist_predictor(predictor, mean, scale):
+    """Rewrite a HistGradientBoosting TreePredictor, which compares in float64."""
+    nodes = predictor.nodes
+    internal = ~nodes['is_leaf'].astype(bool)
+    if not np.any(internal):
+        return
+    idx = nodes['feature_idx'][internal]
+    nodes['num_threshold'][internal] = _snap_thresholds(
+        nodes['num_threshold'][internal], mean[idx], scale[idx], np.float64
+    )
+
+
+def fuse_scaler_into_model(model, scaler, features=None):
+    """Return a copy of model that takes raw features and needs no scaler.
+
+    Supports decision trees, random/extra forests, gradient boosting and
+    histogram gradient boosting classifiers.
+    """
+    fused = copy.deepcopy(model)
+    mean, scale = _scaler_params(scaler, model.n_features_in_)
+
+    if hasattr(fused, 'tree_'):
+        _fuse_sklearn_tree(fused.tree_, mean, scale)
+    elif hasattr(fused, '_predictors'):
+        for predictors in fused._predictors:
+            for predictor in predictors:
+                _fuse_hist_predictor(predictor, mean, scale)
+    elif hasattr(fused, 'estimators_'):
+        for estimator in np.ravel(fused.estimators_):
+            _fuse_sklearn_tree(estimator.tree_, mean, scale)
+    else:
+        raise ValueError(f"Cannot fold a scaler into {type(model).__name__}: not a tree model")
+
+    if features is not None:
+        fused.feature_names_in_ = np.asarray(features, dtype=object)
+    return fused
+
+
+def verify_fused_model(model, scaler, fused, X):
+    """Compare fused predictions to scaler + model; returns (label mismatches, max proba diff)."""
+    X = np.asarray(X, dtype=np.float64)
+    X_frame = pd.DataFrame(X, columns=fused.feature_names_in_) if hasattr(fused, 'feature_names_in_') else X
+    X_scaled = scaler.transform(X_frame if hasattr(scaler, 'feature_names_in_') else X)
+    expected = model.predict(X_scaled)
+    actual = fused.predict(X_frame)
+    mismatches = int(np.sum(expected != actual))
+
+    max_diff = 0.0
+    if hasattr(model, 'predict_proba'):
+        max_diff = float(np.max(np.abs(model.predict_proba(X_scaled) - fused.predict_proba(X_frame))))
+    return mismatches, max_diff
+
+
+def synthetic_rows(scaler, n_rows=20000, seed=42):
+    """Random raw-feature rows spread around the training distribution."""
+    mean, scale = _scaler_params(scaler, len(scaler.scale_))
+    rng = np.random.default_rng(seed)
+    rows = mean + rng.normal(0, 2, size=(n_rows, len(mean))) * scale
+    # Inputs the model can represent exactly, as float32 is what the trees compare
+    return rows.astype(np.float32).astype(np.float64)
+
+
+def load_scoring_model(model_dir=MODEL_DIR):
+    """Load (model, scaler, features), preferring the fused artifact.
+
+    With the fused model scaler is None and the model takes raw features.
+    """
+    fused_path = f"{model_dir}/{FUSED_MODEL_NAME}"
+    if os.path.exists(fused_path):
+        model = joblib.load(fused_path)
+        return model, None, list(model.feature_names_in_)
+
+    model = joblib.load(f"{model_dir}/breathing_pattern_model.joblib")
+    scaler = joblib.load(f"{model_dir}/pattern_scaler.joblib")
+    with open(f"{model_dir}/pattern_features.json", 'r') as f:
+        features = json.load(f)
+    return model, scaler, features
+
+
+def main():
+    model = joblib.load(f"{MODEL_DIR}/breathing_pattern_model.joblib")
+    scaler = joblib.load(f"{MODEL_DIR}/pattern_scaler.joblib")
+    with open(f"{MODEL_DIR}/pattern_features.json", 'r') as f:
+        features = json.load(f)
+
+    print(f"Fusing scaler into {type(model).__name__} with features: {features}")
+    fused = fuse_scaler_into_model(model, scaler, features)
+
+    checks = [('synthetic', synthetic_rows(scaler))]
+    features_csv = f"{MODEL_DIR}/bidmc_features.csv"
+    if os.path.exists(features_csv):
+        checks.append(('BIDMC', pd.read_csv(features_csv)[features].values))
+
+    all_identical = True
+    for name, X in checks:
+        mismatches, max_diff = verify_fused_model(model, scaler, fused, X)
+        status = "identical" if mismatches == 0 else f"{mismatches} MISMATCHES"
+        print(f"  {name}: {len(X)} rows, predictions {status}, max probability diff {max_diff:.2e}")
+        all_identical = all_identical and mismatches == 0
+
+    if not all_identical:
+        print("Fused model does not reproduce the original predictions; not saving.")
+        return
+
+    fused_path = f"{MODEL_DIR}/{FUSED_MODEL_NAME}"
+    joblib.dump(fused, fused_path)
+    print(f"\nFused model saved to {fused_path}")
+    print("Score raw features with it directly: fused.predict(df[features])")
+
+
+if __name__ == "__main__":
+    main()
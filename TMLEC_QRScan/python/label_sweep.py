@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Threshold Sweep for the Abnormal-Breathing Labeling Rule
+
+load_bidmc_data labels a subject abnormal when its breathing rate is outside
+[rate_low, rate_high] or its amplitude or duration variability is above a
+cutoff (ABNORMAL_RULE). This script evaluates every combination of those
+four thresholds over a grid against the cached feature table, instead of
+reloading the dataset for each guess.
+
+A row is normal when it passes both the rate test and the variability test,
+so with R = rate tests (rate combinations x rows) and V = variability tests
+(variability combinations x rows) the normal count of every combination is
+the single matrix product R @ V.T. Agreement with the current rule comes from
+one more product, so hundreds of thousands of combinations take seconds.
+
+The script:
+1. Loads the cached per-subject (or per-window) feature table
+2. Counts abnormal labels for every threshold combination in the grid
+3. Reports class balance and agreement with the current rule
+4. Optionally cross-validates the default backend on the best-balanced rules
+
+Usage:
+    python label_sweep.py --rate-low 6:14:0.5 --rate-high 18:30:0.5 --cv-top 10
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import cross_val_score
+
+from model_backends import DEFAULT_BACKEND, get_backend
+from respiratory_pattern_classification import PATTERN_FEATURES, ABNORMAL_RULE, load_bidmc_features
+
+RULE_THRESHOLDS = ['rate_low', 'rate_high', 'amplitude_variability', 'duration_variability']
+
+
+def parse_range(text):
+    """'start:stop:step' (stop inclusive) or a comma-separated list of values."""
+    if ':' in text:
+        start, stop, step = (float(v) for v in text.split(':'))
+        return np.round(np.arange(start, stop + step / 2, step), 10)
+    return np.array([float(v) for v in text.split(',')])
+
+
+def label_rows(features, rate_low, rate_high, amplitude_variability, duration_variability):
+    """The load_bidmc_data rule for one threshold combination: 1 = abnormal."""
+    rate = features['breathing_rate'].to_numpy()
+    return ((rate < rate_low) | (rate > rate_high) |
+            (features['amplitude_variability'].to_numpy() > amplitude_variability) |
+            (features['duration_variability'].to_numpy() > duration_variability)).astype(int)
+
+
+def sweep_thresholds(features, grids, baseline=None):
+    """Abnormal counts and agreement with baseline for every combination in grids.
+
+    grids maps each RULE_THRESHOLDS name to a 1-D array of candidate values.
+    Returns one row per combination.
+    """
+    baseline = baseline or ABNORMAL_RULE
+    rate = features['breathing_rate'].to_numpy(dtype=np.float64)
+    amplitude = features['amplitude_variability'].to_numpy(dtype=np.float64)
+    duration = features['duration_variability'].to_numpy(dtype=np.float64)
+    n = len(features)
+
+    low, high = grids['rate_low'], grids['rate_high']
+    amp, dur = grids['amplitude_variability'], grids['duration_variability']
+
+    # Rate test per (rate_low, rate_high, row) and variability test per (amp, dur, row)
+    rate_ok = (rate >= low[:, None, None]) & (rate <= high[None, :, None])
+    var_ok = (amplitude <= amp[:, None, None]) & (duration <= dur[None, :, None])
+    R = rate_ok.reshape(-1, n).astype(np.float32)
+    V = var_ok.reshape(-1, n).astype(np.float32)
+
+    # Row counts are small integers, exact in float32
+    normal_count = R @ V.T
+
+    base_normal = 1 - label_rows(features, **baseline)
+    both_normal = (R * base_normal) @ V.T
+    agreement = (n - (normal_count + base_normal.sum() - 2 * both_normal)) / n
+
+    combos = np.meshgrid(low, high, amp, dur, indexing='ij')
+    abnormal = n - normal_count.ravel()
+    results = pd.DataFrame({name: grid.ravel() for name, grid in zip(RULE_THRESHOLDS, combos)})
+    results['n_abnormal'] = abnormal.astype(int)
+    results['abnormal_fraction'] = abnormal / n
+    results['imbalance'] = np.abs(results['abnormal_fraction'] - 0.5)
+    results['agreement_with_current'] = agreement.ravel()
+    return results
+
+
+def cross_validate_rules(features, rules, backend=DEFAULT_BACKEND, cv=5):
+    """Mean CV F1 of the backend's default estimator trained on each rule's labels."""
+    X = features[PATTERN_FEATURES].values
+    scores = []
+    # Neighbouring thresholds often give the same labels; score each labeling once
+    seen = {}
+    for _, rule in rules.iterrows():
+        y = label_rows(features, *(rule[name] for name in RULE_THRESHOLDS))
+        key = y.tobytes()
+        if key not in seen:
+            if min(np.bincount(y, minlength=2)) < cv:
+                seen[key] = np.nan
+            else:
+                estimator, _ = get_backend(backend)
+                pipeline = make_pipeline(StandardScaler(), estimator)
+                seen[key] = cross_val_score(pipeline, X, y, cv=cv, scoring='f1', n_jobs=-1).mean()
+        scores.append(seen[key])
+    return np.array(scores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep thresholds of the abnormal-breathing labeling rule")
+    parser.add_argument("--features-csv", default="model_output/bidmc_features.csv")
+    parser.add_argument("--rate-low", default="6:14:0.5")
+    parser.add_argument("--rate-high", default="18:30:0.5")
+    parser.add_argument("--amplitude-variability", default="0.2:0.8:0.025")
+    parser.add_argument("--duration-variability", default="0.2:0.8:0.025")
+    parser.add_argument("--cv-top", type=int, default=0,
+                        help="Cross-validate the backend on the N best-balanced rules")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND)
+    parser.add_argument("--output", default="model_output/label_sweep.csv")
+    args = parser.parse_args()
+
+    features = load_bidmc_features(args.features_csv)
+    grids = {
+        'rate_low': parse_range(args.rate_low),
+        'rate_high': parse_range(args.rate_high),
+        'amplitude_variability': parse_range(args.amplitude_variability),
+        'duration_variability': parse_range(args.duration_variability)
+    }
+    n_combos = int(np.prod([len(g) for g in grids.values()]))
+    print(f"Sweeping {n_combos} threshold combinations over {len(features)} rows...")
+
+    results = sweep_thresholds(features, grids)
+    results = results.sort_values(['imbalance', 'agreement_with_current'], ascending=[True, False],
+                                  kind='stable').reset_index(drop=True)
+
+    current = label_rows(features, **ABNORMAL_RULE)
+    print(f"Current rule {ABNORMAL_RULE}: {current.sum()}/{len(current)} "
+          f"({current.mean() * 100:.1f}%) abnormal")
+
+    if args.cv_top:
+        print(f"\nCross-validating {args.backend} on the {args.cv_top} best-balanced rules...")
+        results['cv_f1'] = np.nan
+        results.loc[:args.cv_top - 1, 'cv_f1'] = cross_validate_rules(features, results.head(args.cv_top),
+                                                                      args.backend)
+
+    pd.set_option('display.width', 200)
+    print("\nBest-balanced labeling rules:")
+    print(results.head(max(args.cv_top, 10)).round(4).to_string(index=False))
+
+    results.to_csv(args.output, index=False)
+    print(f"\nFull sweep saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Model Backends for Breathing Pattern Classification
+
+Each backend pairs an untrained scikit-learn classifier with the
+hyperparameter grid searched by train_abnormal_breathing_model. All
+backends are trained on the same StandardScaler output and the same
+feature order (pattern_features.json), so the saved scaler and the
+Android DiseaseClassifier input layout are unaffected by the choice.
+"""
+
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
+from sklearn.inspection import permutation_importance
+
+BACKENDS = {
+    'random_forest': {
+        'description': 'RandomForestClassifier (original model)',
+        'make_estimator': lambda: RandomForestClassifier(random_state=42),
+        'param_grid': {
+            'n_estimators': [50, 100, 200],
+            'max_depth': [None, 10, 20],
+            'min_samples_split': [2, 5, 10]
+        }
+    },
+    'hist_gradient_boosting': {
+        'description': 'HistGradientBoostingClassifier (binned histogram boosting)',
+        'make_estimator': lambda: HistGradientBoostingClassifier(random_state=42),
+        'param_grid': {
+            'max_iter': [50, 100, 200],
+            'learning_rate': [0.05, 0.1, 0.2],
+            'max_leaf_nodes': [7, 15, 31],
+            'min_samples_leaf': [5, 10, 20]
+        }
+    }
+}
+
+DEFAULT_BACKEND = 'random_forest'
+
+
+def median_time(fn, repeats):
+    """Median wall time of repeats calls to fn, in seconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def get_backend(name=DEFAULT_BACKEND):
+    """Return (estimator, param_grid) for a registered backend."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{name}'. Available: {', '.join(BACKENDS)}")
+    backend = BACKENDS[name]
+    return backend['make_estimator'](), backend['param_grid']
+
+
+def register_backend(name, make_estimator, param_grid, description=''):
+    """Add a backend so it can be selected by name in training and benchmarks."""
+    BACKENDS[name] = {
+        'description': description,
+        'make_estimator': make_estimator,
+        'param_grid': param_grid
+    }
+
+
+def feature_importances(model, X, y):
+    """Impurity importances when the model has them, permutation importances otherwise."""
+    if hasattr(model, 'feature_importances_'):
+        return model.feature_importances_
+    result = permutation_importance(model, X, y, n_repeats=10, random_state=42)
+    return result.importances_mean
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Materialized Per-Patient Aggregates in the Results Store
+
+Keeps per-patient longitudinal statistics next to session_results in the
+results database, so trend questions ("how did this patient's breathing
+rate and abnormal probability change over the last month?") and patient
+dashboards read a handful of precomputed rows instead of re-parsing and
+re-scoring every session.
+
+    patient_period_stats  one row per (patient, 'day' | 'week', period start):
+                          session and abnormal counts, mean/min/max breathing
+                          rate and abnormal probability, and the regression
+                          sums that trend slopes over any window are built from
+    patient_summary       one row per patient: all-time counts, means, min/max,
+                          trend slopes per day and the latest session
+
+results_store.upsert_results calls update_aggregates in the same transaction
+as the session upsert, with the (patient, recording time) of every row it
+inserted or replaced. Only the day and week buckets those rows fall in are
+recomputed, each from its own few sessions through the (patient_id,
+recorded_at) index, and the touched patients' summaries are rolled up from
+their day buckets. The cost of a new session does not grow with the size of
+the store, and a re-scored session replaces its old contribution exactly.
+
+Times are in days since TIME_ORIGIN, so slopes are per day.
+
+The script:
+1. Prints the patient summary table (the dashboard read)
+2. Prints one patient's daily or weekly stats, rolling means and window trend
+3. Rebuilds all aggregates from session_results
+
+Usage:
+    python patient_aggregates.py
+    python patient_aggregates.py --patient 12 --days 30 --rolling 7
+    python patient_aggregates.py --rebuild
+"""
+
+import argparse
+import datetime
+import pandas as pd
+
+PERIODS = ['day', 'week']
+TIME_ORIGIN = '2020-01-01'
+
+# Days since TIME_ORIGIN, as an SQL expression over session_results
+_T = f"(julianday(recorded_at) - julianday('{TIME_ORIGIN}'))"
+
+AGGREGATE_TABLES = f"""
+CREATE TABLE IF NOT EXISTS patient_period_stats (
+    patient_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    period_start TEXT NOT NULL,
+    n_sessions INTEGER,
+    n_abnormal INTEGER,
+    mean_rate REAL,
+    min_rate REAL,
+    max_rate REAL,
+    mean_probability REAL,
+    min_probability REAL,
+    max_probability REAL,
+    sum_t REAL,
+    sum_tt REAL,
+    sum_rate REAL,
+    sum_t_rate REAL,
+    sum_probability REAL,
+    sum_t_probability REAL,
+    PRIMARY KEY (patient_id, period, period_start)
+);
+CREATE TABLE IF NOT EXISTS patient_summary (
+    patient_id TEXT PRIMARY KEY,
+    n_sessions INTEGER,
+    n_abnormal INTEGER,
+    n_days INTEGER,
+    first_recorded_at TEXT,
+    last_recorded_at TEXT,
+    mean_rate REAL,
+    min_rate REAL,
+    max_rate REAL,
+    mean_probability REAL,
+    min_probability REAL,
+    max_probability REAL,
+    rate_slope_per_day REAL,
+    probability_slope_per_day REAL,
+    last_file_path TEXT,
+    last_predicted_abnormal INTEGER,
+    last_abnormal_probability REAL
+);
+"""
+
+
+def create_aggregate_tables(conn):
+    conn.executescript(AGGREGATE_TABLES)
+
+
+def period_bounds(recorded_at, period):
+    """[start, end) dates of the day or Monday-based week containing an ISO timestamp."""
+    day = datetime.date.fromisoformat(recorded_at[:10])
+    if period == 'week':
+        start = day - datetime.timedelta(days=day.weekday())
+        return start.isoformat(), (start + datetime.timedelta(days=7)).isoformat()
+    return day.isoformat(), (day + datetime.timedelta(days=1)).isoformat()
+
+
+def _slope(n, sum_t, sum_tt, sum_y, sum_ty):
+    """Least-squares slope from regression sums; None with fewer than two distinct times."""
+    if n is None or n < 2:
+        return None
+    denominator = n * sum_tt - sum_t * sum_t
+    if abs(denominator) < 1e-9 * max(1.0, n * sum_tt):
+        return None
+    return (n * sum_ty - sum_t * sum_y) / denominator
+
+
+def _refresh_bucket(conn, patient_id, period, start, end):
+    conn.execute("DELETE FROM patient_period_stats WHERE patient_id = ? AND period = ? AND period_start = ?",
+                 (patient_id, period, start))
+    conn.execute(f"""
+        INSERT INTO patient_period_stats
+        SELECT patient_id, ?, ?, COUNT(*), SUM(predicted_abnormal = 1),
+               AVG(breathing_rate), MIN(breathing_rate), MAX(breathing_rate),
+               AVG(abnormal_probability), MIN(abnormal_probability), MAX(abnormal_probability),
+               SUM({_T}), SUM({_T} * {_T}),
+               SUM(breathing_rate), SUM({_T} * breathing_rate),
+               SUM(abnormal_probability), SUM({_T} * abnormal_probability)
+        FROM session_results
+        WHERE patient_id = ? AND recorded_at >= ? AND recorded_at < ?
+        GROUP BY patient_id
+    """, (period, start, patient_id, start, end))
+
+
+def _refresh_summary(conn, patient_id):
+    conn.execute("DELETE FROM patient_summary WHERE patient_id = ?", (patient_id,))
+    totals = conn.execute("""
+        SELECT COUNT(*), SUM(n_sessions), SUM(n_abnormal), MIN(min_rate), MAX(max_rate),
+               MIN(min_probability), MAX(max_probability), SUM(sum_t), SUM(sum_tt),
+               SUM(sum_rate), SUM(sum_t_rate), SUM(sum_probability), SUM(sum_t_probability)
+        FROM patient_period_stats WHERE patient_id = ? AND period = 'day'
+    """, (patient_id,)).fetchone()
+    n_days, n, n_abnormal, min_rate, max_rate, min_prob, max_prob = totals[:7]
+    sum_t, sum_tt, sum_rate, sum_t_rate, sum_prob, sum_t_prob = totals[7:]
+    if not n:
+        return
+
+    first = conn.execute("SELECT MIN(recorded_at) FROM session_results WHERE patient_id = ?",
+                         (patient_id,)).fetchone()[0]
+    last = conn.execute("SELECT recorded_at, file_path, predicted_abnormal, abnormal_probability "
+                        "FROM session_results WHERE patient_id = ? ORDER BY recorded_at DESC LIMIT 1",
+                        (patient_id,)).fetchone()
+    conn.execute("INSERT INTO patient_summary VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+        patient_id, n, n_abnormal, n_days, first, last[0],
+        sum_rate / n if sum_rate is not None else None, min_rate, max_rate,
+        sum_prob / n if sum_prob is not None else None, min_prob, max_prob,
+        _slope(n, sum_t, sum_tt, sum_rate, sum_t_rate),
+        _slope(n, sum_t, sum_tt, sum_prob, sum_t_prob),
+        last[1], last[2], last[3]
+    ))
+
+
+def update_aggregates(conn, touched):
+    """Refresh the buckets and summaries covering touched (patient_id, recorded_at) pairs.
+
+    Pass both the new rows and the rows they replaced, so a session that
+    moved is removed from its old buckets. Runs inside the caller's transaction.
+    """
+    buckets = set()
+    patients = set()
+    for patient_id, recorded_at in touched:
+        if patient_id is None or recorded_at is None:
+            continue
+        patients.add(patient_id)
+        for period in PERIODS:
+            buckets.add((patient_id, period) + period_bounds(recorded_at, period))
+
+    for bucket in sorted(buckets):
+        _refresh_bucket(conn, *bucket)
+    for patient_id in sorted(patients):
+        _refresh_summary(conn, patient_id)
+
+
+def rebuild_aggregates(conn):
+    """Recompute every aggregate from session_results."""
+    touched = conn.execute("SELECT DISTINCT patient_id, date(recorded_at) FROM session_results").fetchall()
+    with conn:
+        conn.execute("DELETE FROM patient_period_stats")
+        conn.execute("DELETE FROM patient_summary")
+        update_aggregates(conn, touched)
+    return len(touched)
+
+
+def patient_summaries(conn, patient_ids=None):
+    """The patient_summary table (or the given patients' rows), one row per patient."""
+    if patient_ids is None:
+        results = pd.read_sql_query("SELECT * FROM patient_summary ORDER BY patient_id", conn)
+    else:
+        ids = [str(p) for p in patient_ids]
+        results = pd.read_sql_query(
+            f"SELECT * FROM patient_summary WHERE patient_id IN ({', '.join('?' * len(ids))})", conn, params=ids
+        )
+    return results.astype({'patient_id': str})
+
+
+def period_stats(conn, patient_id, period='day', since=None):
+    """A patient's day or week buckets, oldest first, optionally from the date since."""
+    return pd.read_sql_query(
+        "SELECT * FROM patient_period_stats WHERE patient_id = ? AND period = ? AND period_start >= ? "
+        "ORDER BY period_start",
+        conn, params=(str(patient_id), period, since or '')
+    ).astype({'patient_id': str})
+
+
+def window_trend(conn, patient_id, days=30, until=None):
+    """Counts, means and slopes per day over the last days days, summed from day buckets."""
+    until = until or datetime.date.today().isoformat()
+    since = (datetime.date.fromisoformat(until) - datetime.timedelta(days=days - 1)).isoformat()
+    row = conn.execute("""
+        SELECT SUM(n_sessions), SUM(n_abnormal), SUM(sum_t), SUM(sum_tt), SUM(sum_rate), SUM(sum_t_rate),
+               SUM(sum_probability), SUM(sum_t_probability)
+        FROM patient_period_stats
+        WHERE patient_id = ? AND period = 'day' AND period_start >= ? AND period_start <= ?
+    """, (str(patient_id), since, until)).fetchone()
+    n, n_abnormal, sum_t, sum_tt, sum_rate, sum_t_rate, sum_prob, sum_t_prob = row
+    return {
+        'since': since,
+        'until': until,
+        'n_sessions': n or 0,
+        'n_abnormal': n_abnormal or 0,
+        'mean_rate': sum_rate / n if n and sum_rate is not None else None,
+        'mean_probability': sum_prob / n if n and sum_prob is not None else None,
+        'rate_slope_per_day': _slope(n, sum_t, sum_tt, sum_rate, sum_t_rate),
+        'probability_slope_per_day': _slope(n, sum_t, sum_tt, sum_prob, sum_t_prob)
+    }
+
+
+def rolling_means(conn, patient_id, window_days=7, since=None):
+    """Session-weighted rolling mean breathing rate and abnormal probability per calendar day."""
+    daily = period_stats(conn, patient_id, 'day', since)
+    if daily.empty:
+        return daily
+    daily = daily.set_index(pd.to_datetime(daily['period_start']))
+    daily = daily[['n_sessions', 'n_abnormal', 'sum_rate', 'sum_probability']].asfreq('D', fill_value=0)
+    window = daily.rolling(f"{window_days}D").sum()
+    return pd.DataFrame({
+        'n_sessions': window['n_sessions'],
+        'n_abnormal': window['n_abnormal'],
+        'rolling_rate': window['sum_rate'] / window['n_sessions'].where(window['n_sessions'] > 0),
+        'rolling_probability': window['sum_probability'] / window['n_sessions'].where(window['n_sessions'] > 0)
+    })
+
+
+def main():
+    from results_store import DEFAULT_DB_PATH, connect
+
+    parser = argparse.ArgumentParser(description="Per-patient aggregates from the results store")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--patient", help="Show this patient's buckets, rolling means and trend")
+    parser.add_argument("--period", choices=PERIODS, default='day')
+    parser.add_argument("--days", type=int, default=30, help="Trend window in days")
+    parser.add_argument("--until", help="Last day of the trend window (default: today)")
+    parser.add_argument("--rolling", type=int, default=7, help="Rolling mean window in days")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all aggregates from session_results")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    pd.set_option('display.width', 200)
+
+    if args.rebuild:
+        count = rebuild_aggregates(conn)
+        print(f"Rebuilt aggregates from {count} patient-days")
+
+    if args.patient:
+        stats = period_stats(conn, args.patient, args.period)
+        print(f"Patient {args.patient}, {args.period} stats:")
+        print(stats[['period_start', 'n_sessions', 'n_abnormal', 'mean_rate', 'min_rate', 'max_rate',
+                     'mean_probability']].round(3).to_string(index=False))
+
+        print(f"\n{args.rolling}-day rolling means:")
+        print(rolling_means(conn, args.patient, args.rolling).round(3).to_string())
+
+        trend = window_trend(conn, args.patient, args.days, args.until)
+        print(f"\nLast {args.days} days ({trend['since']} to {trend['until']}):")
+        for key, value in trend.items():
+            if key not in ('since', 'until'):
+                print(f"  {key}: {value}")
+    else:
+        summaries = patient_summaries(conn)
+        print(f"{len(summaries)} patients")
+        print(summaries[['patient_id', 'n_sessions', 'n_abnormal', 'last_recorded_at', 'mean_rate',
+                         'rate_slope_per_day', 'mean_probability', 'probability_slope_per_day',
+                         'last_abnormal_probability']].round(4).to_string(index=False))
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Downsampling for Plotting Long Respiratory Sessions
+
+An hour of tracking at 30 fps is over 100k rows per session, far more points
+than a figure has pixels. These helpers reduce a (timestamp, amplitude)
+series to a few thousand points that draw the same picture, and collapse
+per-row breathing phase labels into runs:
+
+- minmax_downsample: the minimum and maximum of each of n equal-count
+  buckets, fully vectorized; every peak and trough survives
+- lttb: Largest-Triangle-Three-Buckets, which keeps the point of each bucket
+  that forms the largest triangle with its neighbours, so shape is preserved
+  with one point per bucket. A min/max pass first shrinks long inputs, so
+  the per-bucket step only ever sees a few points per bucket
+- phase_runs: start, end and label of each run of identical phases
+
+The script:
+1. Reads one app export
+2. Downsamples its amplitude trace and collapses its phases into runs
+3. Plots the full session and reports timings
+
+Usage:
+    python plot_downsample.py respiratory_data/respiratory_data_12_20250101_101010.csv --points 2000
+"""
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+DEFAULT_POINTS = 2000
+
+PHASE_COLORS = {'Inhaling': 'tab:blue', 'Exhaling': 'tab:orange', 'Pause': 'tab:gray'}
+
+
+def _bucket_edges(n_rows, n_buckets):
+    return np.linspace(0, n_rows, n_buckets + 1).astype(np.int64)
+
+
+def minmax_downsample(x, y, n_buckets):
+    """Indices of the min and max of y in each of n_buckets equal-count buckets, in x order."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+
+    edges = _bucket_edges(n, n_buckets)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    idx = []
+    for reduce in (np.fmin, np.fmax):
+        # First row of each bucket that equals the bucket's extreme (NaNs are skipped)
+        extreme = reduce.reduceat(y, edges[:-1])
+        hits = np.flatnonzero(y == extreme[bucket])
+        _, first = np.unique(bucket[hits], return_index=True)
+        idx.append(hits[first])
+    return np.unique(np.concatenate(idx))
+
+
+def lttb(x, y, n_out):
+    """Indices of the n_out points Largest-Triangle-Three-Buckets keeps, first and last included."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Pre-reduce with min/max so each LTTB bucket holds a handful of candidates
+    candidates = minmax_downsample(x, y, 4 * n_out) if n > 8 * n_out else np.arange(n)
+    cx, cy = x[candidates], y[candidates]
+    m = len(cx)
+
+    # Bucket b of the interior points is [edges[b], edges[b + 1]), as in the reference algorithm
+    every = (m - 2) / (n_out - 2)
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    # Mean of every bucket, for the "next bucket" corner of each triangle
+    sums_x = np.add.reduceat(cx[1:m - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(cy[1:m - 1], edges[:-1] - 1)
+    counts = np.maximum(np.diff(edges), 1)
+    mean_x = np.append(sums_x / counts, cx[-1])
+    mean_y = np.append(sums_y / counts, cy[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    ax, ay = cx[0], cy[0]
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        bx, by = cx[lo:hi], cy[lo:hi]
+        area = np.abs((ax - mean_x[b + 1]) * (by - ay) - (ax - bx) * (mean_y[b + 1] - ay))
+        best = lo + int(np.argmax(area))
+        selected[b + 1] = best
+        ax, ay = cx[best], cy[best]
+    selected[-1] = m - 1
+    return candidates[selected]
+
+
+def downsample(x, y, n_points=DEFAULT_POINTS, method='lttb'):
+    """Downsampled (x, y) arrays with about n_points points."""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if method == 'minmax':
+        idx = minmax_downsample(x, y, max(1, n_points // 2))
+    else:
+        idx = lttb(x, y, n_points)
+    return x[idx], y[idx]
+
+
+def phase_runs(timestamps, phases, min_duration=0):
+    """DataFrame of start, end and phase for each run of identical phase labels.
+
+    A run ends where the next one starts, so the runs tile the session; the
+    last run ends one median sample interval after the last sample. Runs
+    shorter than min_duration (e.g. one pixel's worth of time) are absorbed
+    by the run before them, so flickering labels do not produce thousands
+    of invisible bars.
+    """
+    t = np.asarray(timestamps, dtype=np.float64)
+    labels = np.asarray(phases)
+    if len(t) == 0:
+        return pd.DataFrame(columns=['start', 'end', 'phase'])
+    change = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+    starts = np.concatenate([[0], change])
+    # The last sample covers one sample interval, like every other sample
+    t_end = t[-1] + (np.median(np.diff(t)) if len(t) > 1 else 0.0)
+    ends = np.append(t[change], t_end)
+
+    if min_duration > 0 and len(starts) > 1:
+        keep = (ends - t[starts]) >= min_duration
+        keep[0] = True
+        starts = starts[keep]
+        # Absorbed runs can leave neighbours with the same label; merge them
+        same = np.concatenate([[False], labels[starts[1:]] == labels[starts[:-1]]])
+        starts = starts[~same]
+        ends = np.append(t[starts[1:]], t_end)
+    return pd.DataFrame({'start': t[starts], 'end': ends, 'phase': labels[starts]})
+
+
+def plot_phase_runs(ax, runs, y, height=0.8, colors=None):
+    """Draw runs as horizontal bars at row y, one broken_barh call per phase."""
+    colors = colors or PHASE_COLORS
+    for phase, group in runs.groupby('phase'):
+        spans = list(zip(group['start'], group['end'] - group['start']))
+        ax.broken_barh(spans, (y - height / 2, height), color=colors.get(phase, 'tab:green'), linewidth=0,
+                      label=phase)
+
+
+def main():
+    from app_export import read_app_export
+
+    parser = argparse.ArgumentParser(description="Plot a full app session through the downsampler")
+    parser.add_argument("export_csv")
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS)
+    parser.add_argument("--method", choices=['lttb', 'minmax'], default='lttb')
+    parser.add_argument("--output", default="session_downsampled.png")
+    args = parser.parse_args()
+
+    _, frames = read_app_export(args.export_csv)
+    start = time.perf_counter()
+    x, y = downsample(frames['timestamp'], frames['amplitude'], args.points, args.method)
+    span = frames['timestamp'].iloc[-1] - frames['timestamp'].iloc[0]
+    runs = phase_runs(frames['timestamp'], frames['breathing_phase'].str.capitalize(), span / args.points)
+    reduce_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    fig, (top, bottom) = plt.subplots(2, 1, figsize=(15, 6), sharex=True)
+    top.plot(x, y, linewidth=0.8)
+    top.set_ylabel('Amplitude')
+    plot_phase_runs(bottom, runs, 0)
+    bottom.set_yticks([])
+    bottom.set_xlabel('Timestamp')
+    bottom.legend(loc='upper right')
+    fig.tight_layout()
+    fig.savefig(args.output)
+    plot_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{len(frames)} rows -> {len(x)} points, {len(runs)} phase runs")
+    print(f"Downsampling: {reduce_ms:.1f} ms, plotting: {plot_ms:.1f} ms")
+    print(f"Plot saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Nearest-Neighbour Index over Reference Cases for Similar-Case Retrieval
+
+When a session is flagged abnormal, the useful follow-up is "which reference
+recordings does it look like?". This module keeps a KD-tree over the scaled
+feature vectors (PATTERN_FEATURES through pattern_scaler.joblib) of every
+BIDMC subject or window and of past scored sessions, saved next to the model
+as model_output/reference_index.joblib, and returns the k nearest cases of
+any batch of sessions with their distances.
+
+Adding a case that is already indexed updates its label (and its point,
+if its features changed), so re-scored sessions do not keep their first
+label. The index records the model version and scaler it was built with;
+load_reference_index discards an index built for another model, so a
+retrain rebuilds it rather than mixing scalings.
+
+New cases go into a small insertion buffer that is searched by brute force
+alongside the tree; once the buffer outgrows a fraction of the tree, the
+tree is rebuilt over everything. Queries therefore stay at KD-tree cost
+while sessions are added one scoring run at a time.
+
+The script:
+1. Builds the index from the cached BIDMC feature table
+2. Optionally adds scored sessions from the results store
+3. Prints the nearest reference cases of the given sessions (or benchmarks queries)
+
+Usage:
+    python reference_index.py --rebuild
+    python reference_index.py --add-results breathing_results.db --query respiratory_data_12_20250101_101010.csv
+    python reference_index.py --benchmark 300000
+"""
+
+import os
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.neighbors import KDTree
+from sklearn.preprocessing import StandardScaler
+
+from respiratory_pattern_classification import PATTERN_FEATURES, load_bidmc_features
+from results_store import model_version
+
+INDEX_NAME = 'reference_index.joblib'
+CASE_COLUMNS = ['case_id', 'source', 'patient_id', 'label']
+
+
+class ReferenceIndex:
+    """KD-tree over scaled reference feature vectors plus a brute-force insertion buffer."""
+
+    def __init__(self, scaler, features=None, leaf_size=40, rebuild_fraction=0.05, min_buffer=1024, version=None):
+        self.scaler = scaler
+        self.version = version
+        self.features = list(features or PATTERN_FEATURES)
+        self.leaf_size = leaf_size
+        self.rebuild_fraction = rebuild_fraction
+        self.min_buffer = min_buffer
+        self.points = np.empty((0, len(self.features)))
+        self.cases = pd.DataFrame(columns=CASE_COLUMNS)
+        self.tree = None
+        self.n_tree = 0
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.points)
+
+    def _scale(self, X):
+        if not isinstance(X, np.ndarray):
+            X = pd.DataFrame(X)[self.features]
+            # Pass names only to a scaler that was fit with them
+            if not hasattr(self.scaler, 'feature_names_in_'):
+                X = X.to_numpy()
+        if self.scaler is None:
+            return np.asarray(X, dtype=np.float64)
+        return np.asarray(self.scaler.transform(X), dtype=np.float64)
+
+    def add(self, X, cases):
+        """Insert cases (one row of CASE_COLUMNS per row of X); for ids already indexed, update them.
+
+        Returns the number of cases added.
+        """
+        cases = pd.DataFrame(cases).reindex(columns=CASE_COLUMNS).reset_index(drop=True)
+        cases['case_id'] = cases['case_id'].astype(str)
+        points = self._scale(X)
+        last = ~cases['case_id'].duplicated(keep='last').to_numpy()
+        known = cases['case_id'].isin(self._rows).to_numpy()
+
+        update = known & last
+        if update.any():
+            rows = cases.loc[update, 'case_id'].map(self._rows).to_numpy()
+            for column in CASE_COLUMNS[1:]:
+                self.cases.loc[rows, column] = cases.loc[update, column].to_numpy()
+            if not np.allclose(self.points[rows], points[update]):
+                # Copy first: the tree may share memory with the old points
+                self.points = self.points.copy()
+                self.points[rows] = points[update]
+                self.rebuild()
+
+        new = ~known & last
+        if not new.any():
+            return 0
+        start = len(self.points)
+        self.points = np.vstack([self.points, points[new]])
+        self.cases = pd.concat([self.cases, cases[new]], ignore_index=True)
+        self._rows.update(zip(cases.loc[new, 'case_id'], range(start, len(self.points))))
+
+        buffered = len(self.points) - self.n_tree
+        if self.tree is None or buffered > max(self.min_buffer, self.rebuild_fraction * self.n_tree):
+            self.rebuild()
+        return int(new.sum())
+
+    def rebuild(self):
+        """Rebuild the tree over all points, emptying the insertion buffer."""
+        self.tree = KDTree(self.points, leaf_size=self.leaf_size) if len(self.points) else None
+        self.n_tree = len(self.points)
+
+    def query(self, X, k=5):
+        """(distances, indices) of the k nearest indexed cases of each row of X, nearest first."""
+        Q = self._scale(X)
+        k = min(k, len(self.points))
+        if k == 0:
+            return np.empty((len(Q), 0)), np.empty((len(Q), 0), dtype=np.int64)
+
+        parts_d, parts_i = [], []
+        if self.tree is not None:
+            d, i = self.tree.query(Q, k=min(k, self.n_tree))
+            parts_d.append(d)
+            parts_i.append(i)
+
+        buffer = self.points[self.n_tree:]
+        if len(buffer):
+            # Squared distances to the buffer in one matrix product
+            d2 = (np.einsum('ij,ij->i', Q, Q)[:, None] - 2 * Q @ buffer.T
+                  + np.einsum('ij,ij->i', buffer, buffer)[None, :])
+            kb = min(k, len(buffer))
+            i = np.argpartition(d2, kb - 1, axis=1)[:, :kb]
+            parts_d.append(np.sqrt(np.maximum(np.take_along_axis(d2, i, axis=1), 0)))
+            parts_i.append(i + self.n_tree)
+
+        distances = np.hstack(parts_d)
+        indices = np.hstack(parts_i)
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def similar_cases(self, X, k=5, query_ids=None):
+        """Long table of the k nearest cases of each query row, with rank and distance.
+
+        Rows of X whose query id is itself indexed do not return themselves.
+        """
+        n = len(X)
+        distances, indices = self.query(X, k + 1 if query_ids is not None else k)
+        query_ids = [None] * n if query_ids is None else [str(q) for q in query_ids]
+
+        rows = []
+        for q in range(n):
+            rank = 0
+            for d, i in zip(distances[q], indices[q]):
+                case = self.cases.iloc[i]
+                if case['case_id'] == query_ids[q] or rank == k:
+                    continue
+                rank += 1
+                rows.append({'query': query_ids[q] if query_ids[q] is not None else q, 'rank': rank,
+                             'distance': float(d), **case.to_dict()})
+        return pd.DataFrame(rows)
+
+    def save(self, path):
+        """Save as plain state (not the class), so the file loads from any entry point."""
+        joblib.dump({
+            'version': self.version, 'scaler': self.scaler, 'features': self.features, 'leaf_size': self.leaf_size,
+            'rebuild_fraction': self.rebuild_fraction, 'min_buffer': self.min_buffer,
+            'points': self.points, 'cases': self.cases, 'tree': self.tree, 'n_tree': self.n_tree
+        }, path)
+
+
+def index_version(model_dir='model_output'):
+    """Model version plus a hash of the scaler the index scales with."""
+    version = model_version(model_dir)
+    scaler_path = os.path.join(model_dir, 'pattern_scaler.joblib')
+    if os.path.exists(scaler_path):
+        with open(scaler_path, 'rb') as f:
+            version += '-' + hashlib.sha256(f.read()).hexdigest()[:12]
+    return version
+
+
+def load_reference_index(model_dir='model_output'):
+    """The saved index, or None if it has not been built or was built for another model."""
+    path = os.path.join(model_dir, INDEX_NAME)
+    if not os.path.exists(path):
+        return None
+    state = joblib.load(path)
+    if state.get('version') != index_version(model_dir):
+        print("Reference index was built for another model version; it will be rebuilt")
+        return None
+    index = ReferenceIndex(state['scaler'], state['features'], state['leaf_size'],
+                           state['rebuild_fraction'], state['min_buffer'], state['version'])
+    index.points = state['points']
+    index.cases = state['cases']
+    index.tree = state['tree']
+    index.n_tree = state['n_tree']
+    index._rows = dict(zip(index.cases['case_id'], range(len(index.cases))))
+    return index
+
+
+def _scaler_for(model_dir, reference):
+    """pattern_scaler.joblib if it exists, else a StandardScaler fit on the reference rows."""
+    path = os.path.join(model_dir, 'pattern_scaler.joblib')
+    if os.path.exists(path):
+        return joblib.load(path)
+    return StandardScaler().fit(reference[PATTERN_FEATURES].values)
+
+
+def bidmc_cases(bidmc_data):
+    """CASE_COLUMNS rows for the BIDMC feature table (subjects or windows)."""
+    case_id = 'bidmc_' + bidmc_data['subject_id'].astype(str)
+    if 'window' in bidmc_data:
+        case_id = case_id + '_w' + bidmc_data['window'].astype(str)
+    return pd.DataFrame({
+        'case_id': case_id,
+        'source': 'bidmc',
+        'patient_id': bidmc_data['subject_id'].astype(str),
+        'label': bidmc_data['abnormal'] if 'abnormal' in bidmc_data else np.nan
+    })
+
+
+def session_cases(sessions):
+    """CASE_COLUMNS rows for scored app sessions (e.g. analyze_breathing_patterns output)."""
+    return pd.DataFrame({
+        'case_id': sessions['file_path'].astype(str),
+        'source': 'session',
+        'patient_id': sessions['patient_id'].astype(str),
+        'label': sessions['predicted_abnormal'] if 'predicted_abnormal' in sessions else np.nan
+    })
+
+
+def build_reference_index(model_dir='model_output', bidmc_data=None):
+    """A fresh index over the BIDMC feature table, using the model's scaler."""
+    bidmc_data = load_bidmc_features(f"{model_dir}/bidmc_features.csv") if bidmc_data is None else bidmc_data
+    index = ReferenceIndex(_scaler_for(model_dir, bidmc_data), version=index_version(model_dir))
+    index.add(bidmc_data[PATTERN_FEATURES], bidmc_cases(bidmc_data))
+    return index
+
+
+def benchmark(index, n_cases, n_queries=1000, k=5, seed=0):
+    """Query time per case on an index padded with synthetic cases around the real ones."""
+    rng = np.random.default_rng(seed)
+    base = index.points
+    synthetic = base[rng.integers(0, len(base), n_cases)] + rng.normal(0, 0.3, (n_cases, base.shape[1]))
+    bench = ReferenceIndex(None, index.features)
+    bench.add(synthetic, pd.DataFrame({'case_id': np.arange(n_cases), 'source': 'synthetic'}))
+    # Leave a partly full insertion buffer, as between rebuilds
+    extra = synthetic[:bench.min_buffer] + 0.01
+    bench.add(extra, pd.DataFrame({'case_id': [f"x{i}" for i in range(len(extra))], 'source': 'synthetic'}))
+
+    queries = synthetic[rng.integers(0, n_cases, n_queries)] + rng.normal(0, 0.1, (n_queries, base.shape[1]))
+    start = time.perf_counter()
+    for q in queries[:200]:
+        bench.query(q[None, :], k)
+    single_ms = (time.perf_counter() - start) / 200 * 1000
+    start = time.perf_counter()
+    bench.query(queries, k)
+    batch_ms = (time.perf_counter() - start) / n_queries * 1000
+
+    print(f"{len(bench)} indexed cases ({len(bench) - bench.n_tree} in the insertion buffer), k={k}:")
+    print(f"  single query: {single_ms:.3f} ms")
+    print(f"  batched ({n_queries} queries): {batch_ms:.4f} ms per query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the similar-case reference index")
+    parser.add_argument("--model-dir", default="model_output")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from the BIDMC feature table")
+    parser.add_argument("--add-results", help="Add scored sessions from this results store")
+    parser.add_argument("--query", nargs="+", help="Session file names (from the results store) to look up")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--benchmark", type=int, help="Time queries on an index of this many synthetic cases")
+    args = parser.parse_args()
+
+    index = None if args.rebuild else load_reference_index(args.model_dir)
+    if index is None:
+        print("Building reference index from the BIDMC feature table...")
+        index = build_reference_index(args.model_dir)
+
+    results = None
+    if args.add_results or args.query:
+        from results_store import connect, read_results
+        conn = connect(args.add_results or 'breathing_results.db')
+        results = read_results(conn)
+        conn.close()
+
+    if args.add_results:
+        added = index.add(results[PATTERN_FEATURES], session_cases(results))
+        print(f"Added {added} scored sessions")
+
+    path = os.path.join(args.model_dir, INDEX_NAME)
+    index.save(path)
+    counts = index.cases['source'].value_counts().to_dict()
+    print(f"Reference index: {len(index)} cases {counts}, saved to {path}")
+
+    if args.query:
+        sessions = results[results['file_path'].isin(args.query)]
+        similar = index.similar_cases(sessions[PATTERN_FEATURES], args.k, query_ids=sessions['file_path'])
+        print(similar[['query', 'rank', 'distance', 'case_id', 'source', 'label']].round(3).to_string(index=False))
+
+    if args.benchmark:
+        benchmark(index, args.benchmark, k=args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Real-Time Replay Harness for End-to-End Scoring Latency
+
+Streams app exports through the Python scoring path as if they were live
+devices, to find out how many patients one scoring node can follow:
+
+1. Each stream replays one export's frames at their Relative Time (ms)
+   offsets, at real-time speed or accelerated by --speed; exports are
+   looped so every stream stays busy for the whole trial
+2. On every tick the scorer takes all samples that have arrived, updates
+   each stream's running session features, and rescores all updated streams
+   with a single predict call on the breathing pattern model. A live stream
+   has no export header, so these are approximations computed from the
+   frames alone: breathing rate from inhale onsets and amplitude statistics
+   from the samples, where summarize_session takes both from the header.
+   The scores show the cost of scoring, not parity with the offline path
+3. Latency is measured per sample, from its scheduled arrival to the moment
+   the score that includes it is available, and reported as p50/p95/p99
+4. With --find-capacity the number of concurrent streams is doubled, then
+   bisected, until p99 latency exceeds --budget-ms; the largest stream count
+   that stays within budget is the capacity of one core
+
+The scorer runs in this one process, pinned to a single CPU where the OS
+allows it, and the model is limited to one thread, so the capacity is per
+core.
+
+Usage:
+    python replay_latency.py respiratory_data/ --streams 50
+    python replay_latency.py respiratory_data/ --find-capacity --speed 1 --duration 20 --budget-ms 100
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from glob import glob
+
+from app_export import read_app_export
+from fuse_scaler import load_scoring_model
+from respiratory_pattern_classification import score_sessions
+
+PHASE_CODES = {'pause': 0, 'inhaling': 1, 'exhaling': 2}
+
+
+class StreamFeatures:
+    """Running session features for many streams, updated one tick's samples at a time.
+
+    Live approximations of the features summarize_session reads from the
+    export header and frames: amplitude mean/min/max and std/mean from the
+    samples, mean |velocity|, duration variability of multi-row phase runs,
+    and a breathing rate from the number of inhale onsets over the elapsed
+    time. They are not the header values, so scores can differ from the
+    offline path.
+    """
+
+    def __init__(self, ages, genders):
+        n = len(ages)
+        self.age = np.asarray(ages, dtype=np.float64)
+        self.gender = np.asarray(genders, dtype=np.float64)
+        self.count = np.zeros(n)
+        self.amp_sum = np.zeros(n)
+        self.amp_sq = np.zeros(n)
+        self.amp_max = np.full(n, -np.inf)
+        self.amp_min = np.full(n, np.inf)
+        self.vel_abs_sum = np.zeros(n)
+        self.first_t = np.full(n, np.nan)
+        self.last_t = np.full(n, np.nan)
+        self.inhale_onsets = np.zeros(n)
+        self.phase = np.full(n, -1, dtype=np.int64)
+        self.run_start = np.zeros(n)
+        self.run_rows = np.zeros(n, dtype=np.int64)
+        self.dur_n = np.zeros(n)
+        self.dur_sum = np.zeros(n)
+        self.dur_sq = np.zeros(n)
+
+    def update(self, s, t, amplitude, velocity, phase):
+        """Add a batch of samples (arrays, each stream's samples in time order) in grouped array operations."""
+        s = np.asarray(s)
+        if len(s) == 0:
+            return
+        # Group by stream, keeping each stream's samples in arrival order
+        order = np.argsort(s, kind='stable')
+        s, t, amplitude, velocity, phase = s[order], t[order], amplitude[order], velocity[order], phase[order]
+        n = len(s)
+        idx = np.arange(n)
+        first = np.ones(n, dtype=bool)
+        first[1:] = s[1:] != s[:-1]
+        last = np.ones(n, dtype=bool)
+        last[:-1] = first[1:]
+
+        # Running sums and extremes
+        new_stream = first & (self.count[s] == 0)
+        self.first_t[s[new_stream]] = t[new_stream]
+        np.add.at(self.count, s, 1)
+        np.add.at(self.amp_sum, s, amplitude)
+        np.add.at(self.amp_sq, s, amplitude * amplitude)
+        np.maximum.at(self.amp_max, s, amplitude)
+        np.minimum.at(self.amp_min, s, amplitude)
+        np.add.at(self.vel_abs_sum, s, np.abs(velocity))
+
+        # Phase runs: a run starts wherever the phase differs from the stream's previous sample
+        prev_phase = np.where(first, self.phase[s], np.roll(phase, 1))
+        change = phase != prev_phase
+        # Start of the segment (run start, or the carried-over run at the group start) of each sample
+        seg_start = np.maximum.accumulate(np.where(change | first, idx, 0))
+        carried = ~change[seg_start]
+
+        # Close the run that ends before each change; single-row runs are ignored as in summarize_session
+        closing = idx[change]
+        at_group_start = first[closing]
+        j = seg_start[np.maximum(closing - 1, 0)]
+        sc = s[closing]
+        rows = np.where(at_group_start, self.run_rows[sc],
+                        closing - j + np.where(carried[j], self.run_rows[sc], 0))
+        run_start = np.where(at_group_start | carried[j], self.run_start[sc], t[j])
+        run_end = np.where(at_group_start, self.last_t[sc], t[np.maximum(closing - 1, 0)])
+        closed = rows > 1
+        duration = (run_end - run_start)[closed]
+        np.add.at(self.dur_n, sc[closed], 1)
+        np.add.at(self.dur_sum, sc[closed], duration)
+        np.add.at(self.dur_sq, sc[closed], duration * duration)
+
+        onset = change & (phase == PHASE_CODES['inhaling']) & (prev_phase >= 0)
+        np.add.at(self.inhale_onsets, s[onset], 1)
+
+        # State after each stream's last sample
+        tail = idx[last]
+        st = s[tail]
+        j = seg_start[tail]
+        self.run_rows[st] = np.where(carried[j], self.run_rows[st], 0) + tail - j + 1
+        self.run_start[st] = np.where(carried[j], self.run_start[st], t[j])
+        self.phase[st] = phase[tail]
+        self.last_t[st] = t[tail]
+
+    def features(self, streams):
+        """Feature rows (PATTERN_FEATURES names) for the given stream indices."""
+        count = np.maximum(self.count[streams], 1)
+        avg_amplitude = self.amp_sum[streams] / count
+        amp_std = np.sqrt(np.maximum(self.amp_sq[streams] / count - avg_amplitude ** 2, 0))
+        dur_n = np.maximum(self.dur_n[streams], 1)
+        dur_mean = self.dur_sum[streams] / dur_n
+        dur_std = np.sqrt(np.maximum(self.dur_sq[streams] / dur_n - dur_mean ** 2, 0))
+        elapsed_min = (self.last_t[streams] - self.first_t[streams]) / 60000.0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return pd.DataFrame({
+                'age': self.age[streams],
+                'gender': self.gender[streams],
+                'breathing_rate': np.where(elapsed_min > 0, self.inhale_onsets[streams] / elapsed_min, 0.0),
+                'avg_amplitude': avg_amplitude,
+                'max_amplitude': self.amp_max[streams],
+                'min_amplitude': self.amp_min[streams],
+                'avg_velocity': self.vel_abs_sum[streams] / count,
+                'amplitude_variability': np.where(avg_amplitude > 0, amp_std / avg_amplitude, 0.0),
+                'duration_variability': np.where(dur_mean > 0, dur_std / dur_mean, 0.0)
+            })
+
+
+def load_sessions(data_dir, max_files=None):
+    """(metadata, arrays) per export: timestamps in ms from 0, amplitude, velocity, phase codes."""
+    files = sorted(glob(f"{data_dir}/respiratory_data_*.csv"))[:max_files]
+    sessions = []
+    for file_path in files:
+        try:
+            metadata, frames = read_app_export(file_path)
+        except Exception as e:
+            print(f"Error loading {file_path}: {str(e)}")
+            continue
+        frames = frames.sort_values('timestamp', kind='stable')
+        t = frames['timestamp'].to_numpy(dtype=np.float64)
+        if len(t) < 2 or t[-1] == t[0]:
+            # Nothing to replay over time (and a zero loop period in build_schedule)
+            continue
+        sessions.append((metadata, {
+            't': t - t[0],
+            'amplitude': frames['amplitude'].to_numpy(dtype=np.float64),
+            'velocity': frames['velocity'].to_numpy(dtype=np.float64),
+            'phase': frames['breathing_phase'].map(PHASE_CODES).fillna(0).to_numpy(dtype=np.int64)
+        }))
+    if not sessions:
+        raise ValueError(f"No exports could be loaded from {data_dir}")
+    return sessions
+
+
+def build_schedule(sessions, n_streams, duration_s, speed, rng):
+    """Merged arrival schedule of all streams for one trial, sorted by arrival time (s).
+
+    Stream k replays session k % len(sessions), looped, starting at a random
+    offset within its first second so streams do not arrive in lockstep.
+    """
+    parts = []
+    for k in range(n_streams):
+        _, arrays = sessions[k % len(sessions)]
+        period = arrays['t'][-1] + np.median(np.diff(arrays['t']))
+        offset = rng.uniform(0, 1.0)
+        loops = int(np.ceil(duration_s * speed * 1000 / period)) + 1
+        t_ms = (arrays['t'][None, :] + period * np.arange(loops)[:, None]).ravel()
+        arrival = offset + t_ms / (1000.0 * speed)
+        keep = arrival < duration_s
+        rows = np.tile(np.arange(len(arrays['t'])), loops)[keep]
+        parts.append(pd.DataFrame({
+            'arrival': arrival[keep],
+            'stream': k,
+            't': t_ms[keep],
+            'amplitude': arrays['amplitude'][rows],
+            'velocity': arrays['velocity'][rows],
+            'phase': arrays['phase'][rows]
+        }))
+    schedule = pd.concat(parts, ignore_index=True).sort_values('arrival', kind='stable')
+    return schedule.reset_index(drop=True)
+
+
+def run_trial(sessions, model, scaler, features, n_streams, duration_s=10.0, speed=1.0, seed=0):
+    """Replay n_streams streams for duration_s seconds; returns latency stats in ms."""
+    rng = np.random.default_rng(seed)
+    schedule = build_schedule(sessions, n_streams, duration_s, speed, rng)
+    arrival = schedule['arrival'].to_numpy()
+    stream = schedule['stream'].to_numpy()
+    t = schedule['t'].to_numpy()
+    amplitude = schedule['amplitude'].to_numpy()
+    velocity = schedule['velocity'].to_numpy()
+    phase = schedule['phase'].to_numpy()
+
+    metadata = [sessions[k % len(sessions)][0] for k in range(n_streams)]
+    state = StreamFeatures(
+        [m.get('age') or 0 for m in metadata],
+        [1 if m.get('gender') == 'Male' else 0 for m in metadata]
+    )
+    scores = np.full(n_streams, np.nan)
+    latencies = np.empty(len(arrival))
+    ticks = 0
+
+    start = time.perf_counter()
+    done = 0
+    while done < len(arrival):
+        now = time.perf_counter() - start
+        if arrival[done] > now:
+            time.sleep(arrival[done] - now)
+            now = time.perf_counter() - start
+
+        # Everything that has arrived by now is handled in this tick
+        end = int(np.searchsorted(arrival, now, side='right'))
+        state.update(stream[done:end], t[done:end], amplitude[done:end], velocity[done:end], phase[done:end])
+        updated = np.unique(stream[done:end])
+        _, probability = score_sessions(model, scaler, features, state.features(updated)[features])
+        scores[updated] = probability
+
+        finished = time.perf_counter() - start
+        latencies[done:end] = finished - arrival[done:end]
+        done = end
+        ticks += 1
+
+    elapsed = time.perf_counter() - start
+    latencies_ms = latencies * 1000
+    return {
+        'streams': n_streams,
+        'samples': len(arrival),
+        'samples_per_s': len(arrival) / elapsed,
+        'ticks': ticks,
+        'mean_batch': len(arrival) / max(ticks, 1),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'max_ms': float(latencies_ms.max()),
+        # A scorer that keeps up finishes right after the last arrival
+        'overrun_s': elapsed - duration_s
+    }
+
+
+def print_trial(result):
+    print(f"  {result['streams']:>5} streams: p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+          f"p99 {result['p99_ms']:7.2f} ms  ({result['samples_per_s']:.0f} samples/s, "
+          f"{result['mean_batch']:.1f} samples/tick)")
+
+
+def find_capacity(sessions, model, scaler, features, budget_ms, duration_s, speed, max_streams=100000):
+    """Largest stream count whose p99 latency stays within budget_ms."""
+    trials = []
+
+    def ok(n):
+        result = run_trial(sessions, model, scaler, features, n, duration_s, speed)
+        trials.append(result)
+        print_trial(result)
+        return result['p99_ms'] <= budget_ms
+
+    good, bad = 0, None
+    n = 1
+    while n <= max_streams:
+        if not ok(n):
+            bad = n
+            break
+        good = n
+        n *= 2
+    if bad is None:
+        return good, trials
+
+    # Bisect between the last count that kept up and the first that did not
+    while bad - good > max(1, good // 20):
+        mid = (good + bad) // 2
+        if ok(mid):
+            good = mid
+        else:
+            bad = mid
+    return good, trials
+
+
+def pin_to_one_core():
+    """Restrict this process to a single CPU where the OS supports it; returns the CPU or None."""
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+    cpu = min(os.sched_getaffinity(0))
+    os.sched_setaffinity(0, {cpu})
+    return cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay app exports in real time and measure scoring latency")
+    parser.add_argument("data_dir", nargs="?", default="respiratory_data")
+    parser.add_argument("--model-dir", default="model_output")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 10, 100],
+                        help="Concurrent stream counts to run")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed (1 = real time)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per trial")
+    parser.add_argument("--max-files", type=int, help="Load at most this many exports")
+    parser.add_argument("--find-capacity", action="store_true",
+                        help="Search for the largest stream count within --budget-ms at p99")
+    parser.add_argument("--budget-ms", type=float, default=250.0)
+    parser.add_argument("--output", help="Write trial results to this CSV")
+    args = parser.parse_args()
+
+    cpu = pin_to_one_core()
+    print(f"Scoring on {'CPU ' + str(cpu) if cpu is not None else 'an unpinned process'}")
+
+    model, scaler, features = load_scoring_model(args.model_dir)
+    if hasattr(model, 'n_jobs'):
+        model.n_jobs = 1
+    sessions = load_sessions(args.data_dir, args.max_files)
+    frame_rate = np.mean([len(a['t']) / (a['t'][-1] / 1000.0) for _, a in sessions])
+    print(f"Loaded {len(sessions)} sessions (~{frame_rate:.1f} samples/s each), replay speed {args.speed}x")
+
+    if args.find_capacity:
+        print(f"\nSearching for capacity at p99 <= {args.budget_ms:.0f} ms:")
+        capacity, trials = find_capacity(sessions, model, scaler, features, args.budget_ms,
+                                         args.duration, args.speed)
+        print(f"\nMaximum concurrent streams per core: {capacity} at {args.speed}x speed "
+              f"(~{capacity * args.speed:.0f} real-time streams)")
+    else:
+        print("\nLatency from sample arrival to updated score:")
+        trials = []
+        for n in args.streams:
+            trials.append(run_trial(sessions, model, scaler, features, n, args.duration, args.speed))
+            print_trial(trials[-1])
+
+    if args.output:
+        pd.DataFrame(trials).to_csv(args.output, index=False)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,13 +19,25 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import confusion_matrix, classification_report, accuracy_score
 import joblib
 import json
 from glob import glob
 
+from model_backends import DEFAULT_BACKEND, get_backend, feature_importances
+from cv_memo import memoized_grid_search
+from bootstrap_eval import bootstrap_metrics, print_intervals
+from results_store import connect, upsert_results, model_version
+from session_index import select_files
+
+# Feature order saved to pattern_features.json and used as the TFLite model input
+PATTERN_FEATURES = ['age', 'gender', 'breathing_rate', 'avg_amplitude', 'max_amplitude',
+                    'min_amplitude', 'avg_velocity', 'amplitude_variability', 'duration_variability']
+
+# Thresholds of the abnormal-breathing labeling rule in load_bidmc_data
+ABNORMAL_RULE = {'rate_low': 10, 'rate_high': 24, 'amplitude_variability': 0.4, 'duration_variability': 0.4}
+
 def load_bidmc_data(base_path="bidmc-ppg-and-respiration-dataset-1.0.0/bidmc_csv"):
     """Load respiratory data from BIDMC dataset and extract pattern features."""
     all_subjects = []
@@ -100,12 +112,12 @@ def load_bidmc_data(base_path="bidmc-ppg-and-respiration-dataset-1.0.0/bidmc_csv
                 # 1. Normal adult breathing rate is 12-20 breaths per minute
                 # 2. High variability in amplitude or duration indicates abnormal patterns
                 # 3. Location 'micu' (medical ICU) indicates potentially abnormal patients
-                # Adjust criteria to ensure more balanced classes
+                # Adjust criteria to ensure more balanced classes (see label_sweep.py)
                 is_abnormal = (
-                    (breathing_rate < 10) or  # Slightly more strict lower bound
-                    (breathing_rate > 24) or  # Slightly more relaxed upper bound
-                    (amplitude_variability > 0.4) or  # More strict threshold for abnormal variability
-                    (duration_variability > 0.4)  # More strict threshold for abnormal variability
+                    (breathing_rate < ABNORMAL_RULE['rate_low']) or  # Slightly more strict lower bound
+                    (breathing_rate > ABNORMAL_RULE['rate_high']) or  # Slightly more relaxed upper bound
+                    (amplitude_variability > ABNORMAL_RULE['amplitude_variability']) or  # More strict threshold for abnormal variability
+                    (duration_variability > ABNORMAL_RULE['duration_variability'])  # More strict threshold for abnormal variability
                     # Removed location-based classification to get more normal examples
                 )
                 
@@ -137,11 +149,24 @@ def load_bidmc_data(base_path="bidmc-ppg-and-respiration-dataset-1.0.0/bidmc_csv
         
     return pd.DataFrame(all_subjects)
 
-def train_abnormal_breathing_model(bidmc_data, output_dir='model_output'):
-    """Train a model to classify normal vs abnormal breathing patterns."""
+def load_bidmc_features(cache_path='model_output/bidmc_features.csv', base_path="bidmc-ppg-and-respiration-dataset-1.0.0/bidmc_csv"):
+    """Return the per-subject BIDMC feature table, building and caching it on first use."""
+    if os.path.exists(cache_path):
+        return pd.read_csv(cache_path)
+    bidmc_data = load_bidmc_data(base_path)
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    bidmc_data.to_csv(cache_path, index=False)
+    return bidmc_data
+
+def train_abnormal_breathing_model(bidmc_data, output_dir='model_output', backend=DEFAULT_BACKEND, memo_path=None):
+    """Train a model to classify normal vs abnormal breathing patterns.
+
+    backend selects the classifier and its search grid from model_backends.BACKENDS.
+    With memo_path, per-fold CV scores are cached there (see cv_memo.py) and
+    only grid points not searched before on the same data are fitted.
+    """
     # Prepare features and target
-    features = ['age', 'gender', 'breathing_rate', 'avg_amplitude', 'max_amplitude', 
-                'min_amplitude', 'avg_velocity', 'amplitude_variability', 'duration_variability']
+    features = list(PATTERN_FEATURES)
     
     X = bidmc_data[features]
     y = bidmc_data['abnormal']
@@ -154,35 +179,38 @@ def train_abnormal_breathing_model(bidmc_data, output_dir='model_output'):
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
-    # Train a RandomForest classifier with hyperparameter tuning
-    param_grid = {
-        'n_estimators': [50, 100, 200],
-        'max_depth': [None, 10, 20],
-        'min_samples_split': [2, 5, 10]
-    }
+    # Train the selected backend with hyperparameter tuning
+    estimator, param_grid = get_backend(backend)
     
-    grid_search = GridSearchCV(
-        RandomForestClassifier(random_state=42),
-        param_grid,
-        cv=5,
-        scoring='f1',
-        n_jobs=-1
-    )
-    
-    grid_search.fit(X_train_scaled, y_train)
+    if memo_path:
+        grid_search = memoized_grid_search(estimator, param_grid, X_train_scaled, y_train, memo_path,
+                                           cv=5, scoring='f1', n_jobs=-1)
+        print(f"CV memo: {grid_search.n_fitted} fold fits run, {grid_search.n_memoized} reused")
+    else:
+        grid_search = GridSearchCV(
+            estimator,
+            param_grid,
+            cv=5,
+            scoring='f1',
+            n_jobs=-1
+        )
+        grid_search.fit(X_train_scaled, y_train)
     best_model = grid_search.best_estimator_
     
     # Evaluate the model
     train_accuracy = best_model.score(X_train_scaled, y_train)
     test_accuracy = best_model.score(X_test_scaled, y_test)
+    print(f"Backend: {backend}")
     print(f"Best parameters: {grid_search.best_params_}")
     print(f"Training accuracy: {train_accuracy:.4f}")
     print(f"Testing accuracy: {test_accuracy:.4f}")
+    print_intervals(bootstrap_metrics(y_test, best_model.predict(X_test_scaled)),
+                    title=f"Test-set bootstrap intervals ({len(y_test)} rows)")
     
     # Feature importance
     feature_importance = pd.DataFrame({
         'feature': features,
-        'importance': best_model.feature_importances_
+        'importance': feature_importances(best_model, X_test_scaled, y_test)
     }).sort_values('importance', ascending=False)
     
     print("\nFeature Importance:")
@@ -193,16 +221,142 @@ def train_abnormal_breathing_model(bidmc_data, output_dir='model_output'):
     joblib.dump(best_model, f"{output_dir}/breathing_pattern_model.joblib")
     joblib.dump(scaler, f"{output_dir}/pattern_scaler.joblib")
     
+    # A fused model from fuse_scaler.py would now be stale
+    fused_path = f"{output_dir}/breathing_pattern_model_fused.joblib"
+    if os.path.exists(fused_path):
+        os.remove(fused_path)
+    
     # Save feature names
     with open(f"{output_dir}/pattern_features.json", 'w') as f:
         json.dump(features, f)
     
     return best_model, scaler, features
 
-def load_qr_respiratory_data(data_dir='respiratory_data'):
-    """Load respiratory data collected from the QR code app."""
+def summarize_session(metadata, df, file_path):
+    """Build the per-session feature row from header metadata and the frame table."""
+    avg_amplitude = metadata.get('avg_amplitude') or 0
+    
+    # Calculate additional metrics
+    amplitudes = df['amplitude'].values
+    velocities = df['velocity'].abs().values
+    
+    amplitude_variability = np.std(amplitudes) / avg_amplitude if avg_amplitude > 0 else 0
+    
+    # Group by breathing phase to calculate duration variability
+    phase_groups = df.groupby((df['breathing_phase'] != df['breathing_phase'].shift()).cumsum())
+    phase_durations = []
+    
+    for _, group in phase_groups:
+        if len(group) > 1:
+            start_time = group['timestamp'].iloc[0]
+            end_time = group['timestamp'].iloc[-1]
+            phase_durations.append(end_time - start_time)
+    
+    duration_variability = np.std(phase_durations) / np.mean(phase_durations) if phase_durations and np.mean(phase_durations) > 0 else 0
+    
+    return {
+        'patient_id': metadata.get('patient_id') or '0',
+        'age': metadata.get('age') or 0,
+        'gender': 1 if metadata.get('gender') == 'Male' else 0,
+        'health_status': metadata.get('health_status') or 'Unknown',
+        'breathing_rate': metadata.get('breathing_rate') or 0,
+        'avg_amplitude': avg_amplitude,
+        'max_amplitude': metadata.get('max_amplitude') or 0,
+        'min_amplitude': metadata.get('min_amplitude') or 0,
+        'avg_velocity': np.mean(velocities),
+        'amplitude_variability': amplitude_variability,
+        'duration_variability': duration_variability,
+        'file_path': os.path.basename(file_path)
+    }
+
+def load_qr_respiratory_data_from_dataset(dataset_dir='session_dataset', patient_ids=None, where=None):
+    """Load per-session summaries from the ingested Parquet session dataset.
+
+    Only the header metadata and the four frame columns the summary needs are
+    read, and patient_ids prunes partitions before any data is touched. where
+    (see session_index.select_sessions) is resolved against the sessions
+    table, and frames are read only for the sessions it selects.
+    """
+    from session_dataset import build_filter, read_frames, read_sessions
+    from session_index import select_sessions
+
+    row_filter = build_filter(patient_ids=patient_ids)
+    sessions = read_sessions(dataset_dir, filter=row_filter)
+    if where is not None:
+        sessions = select_sessions(sessions, where)
+        row_filter = build_filter(patient_ids=patient_ids, file_paths=sessions['file_path'])
+    if sessions.empty:
+        raise ValueError("No data could be loaded from the session dataset")
+
+    frames = read_frames(
+        dataset_dir,
+        columns=['file_path', 'timestamp', 'amplitude', 'velocity', 'breathing_phase'],
+        filter=row_filter
+    )
+    frames = frames.sort_values(['file_path', 'timestamp'], kind='stable')
+    by_file = frames.groupby('file_path', sort=False)
+
+    amplitude_std = by_file['amplitude'].agg(lambda a: np.std(a.values))
+    avg_velocity = frames['velocity'].abs().groupby(frames['file_path']).mean()
+
+    # Phase runs: a new run starts whenever the phase or the file changes
+    run_id = ((frames['breathing_phase'] != frames['breathing_phase'].shift()) |
+              (frames['file_path'] != frames['file_path'].shift())).cumsum()
+    runs = frames.groupby(run_id).agg(
+        file_path=('file_path', 'first'),
+        rows=('timestamp', 'size'),
+        start=('timestamp', 'first'),
+        end=('timestamp', 'last')
+    )
+    runs = runs[runs['rows'] > 1]
+    runs['duration'] = runs['end'] - runs['start']
+    duration_stats = runs.groupby('file_path')['duration'].agg(
+        mean='mean', std=lambda d: np.std(d.values)
+    )
+
+    sessions = sessions.set_index('file_path')
+    avg_amplitude = sessions['avg_amplitude'].fillna(0)
+    duration_mean = duration_stats['mean'].reindex(sessions.index)
+    duration_std = duration_stats['std'].reindex(sessions.index)
+
+    summary = pd.DataFrame({
+        'patient_id': sessions['patient_id'].fillna('0').astype(str),
+        'age': sessions['age'].fillna(0).astype(int),
+        'gender': (sessions['gender'] == 'Male').astype(int),
+        'health_status': sessions['health_status'].fillna('Unknown'),
+        'breathing_rate': sessions['breathing_rate'].fillna(0),
+        'avg_amplitude': avg_amplitude,
+        'max_amplitude': sessions['max_amplitude'].fillna(0),
+        'min_amplitude': sessions['min_amplitude'].fillna(0),
+        'avg_velocity': avg_velocity.reindex(sessions.index),
+        'amplitude_variability': np.where(
+            avg_amplitude > 0, amplitude_std.reindex(sessions.index) / avg_amplitude.where(avg_amplitude > 0, 1), 0
+        ),
+        'duration_variability': np.where(
+            duration_mean > 0, duration_std / duration_mean.where(duration_mean > 0, 1), 0
+        ),
+    })
+    summary['file_path'] = summary.index
+    print(f"Loaded {len(summary)} sessions from {dataset_dir}")
+    return summary.reset_index(drop=True)
+
+def load_qr_respiratory_data(data_dir='respiratory_data', dataset_dir=None, patient_ids=None, where=None):
+    """Load respiratory data collected from the QR code app.
+
+    If dataset_dir points at a session dataset built by session_dataset.py,
+    summaries are computed from its Parquet tables instead of the CSVs.
+    With patient_ids or where (a query string or mask function over the
+    header fields, see session_index.py), sessions are picked from the
+    header-only session index and only the matching exports are read.
+    """
+    if dataset_dir is not None:
+        return load_qr_respiratory_data_from_dataset(dataset_dir, patient_ids, where)
+
     all_data = []
-    files = glob(f"{data_dir}/respiratory_data_*.csv")
+    if patient_ids is not None or where is not None:
+        files = select_files(data_dir, where, patient_ids)
+    else:
+        files = glob(f"{data_dir}/respiratory_data_*.csv")
     
     for file_path in files:
         try:
@@ -254,39 +408,18 @@ def load_qr_respiratory_data(data_dir='respiratory_data'):
             # Load the actual data
             df = pd.read_csv(file_path, skiprows=header_index)
             
-            # Calculate additional metrics
-            amplitudes = df['amplitude'].values
-            velocities = df['velocity'].abs().values
-            
-            amplitude_variability = np.std(amplitudes) / avg_amplitude if avg_amplitude > 0 else 0
-            
-            # Group by breathing phase to calculate duration variability
-            phase_groups = df.groupby((df['breathing_phase'] != df['breathing_phase'].shift()).cumsum())
-            phase_durations = []
-            
-            for _, group in phase_groups:
-                if len(group) > 1:
-                    start_time = group['timestamp'].iloc[0]
-                    end_time = group['timestamp'].iloc[-1]
-                    phase_durations.append(end_time - start_time)
-            
-            duration_variability = np.std(phase_durations) / np.mean(phase_durations) if phase_durations and np.mean(phase_durations) > 0 else 0
-            
-            # Create summary data
-            summary_data = {
-                'patient_id': patient_id if patient_id else '0',
-                'age': age if age else 0,
-                'gender': 1 if gender == 'Male' else 0,
-                'health_status': health_status if health_status else 'Unknown',
-                'breathing_rate': breathing_rate if breathing_rate else 0,
-                'avg_amplitude': avg_amplitude if avg_amplitude else 0,
-                'max_amplitude': max_amplitude if max_amplitude else 0,
-                'min_amplitude': min_amplitude if min_amplitude else 0,
-                'avg_velocity': np.mean(velocities),
-                'amplitude_variability': amplitude_variability,
-                'duration_variability': duration_variability,
-                'file_path': os.path.basename(file_path)
+            # Calculate additional metrics and create summary data
+            metadata = {
+                'patient_id': patient_id,
+                'age': age,
+                'gender': gender,
+                'health_status': health_status,
+                'breathing_rate': breathing_rate,
+                'avg_amplitude': avg_amplitude,
+                'max_amplitude': max_amplitude,
+                'min_amplitude': min_amplitude
             }
+            summary_data = summarize_session(metadata, df, file_path)
             
             all_data.append(summary_data)
             print(f"Processed {file_path}: Breathing rate {breathing_rate:.2f}")
@@ -299,29 +432,34 @@ def load_qr_respiratory_data(data_dir='respiratory_data'):
     else:
         raise ValueError("No data could be loaded from the respiratory data files")
 
-def analyze_breathing_patterns(model, scaler, features, qr_data):
-    """Analyze breathing patterns in the QR code data using the trained model."""
+def score_sessions(model, scaler, features, qr_data):
+    """Return (predicted_abnormal, abnormal_probability) arrays for session rows."""
     # Prepare features
     X = qr_data[features]
     
-    # Scale the features
-    X_scaled = scaler.transform(X)
-    
-    # Predict abnormal breathing
-    qr_data['predicted_abnormal'] = model.predict(X_scaled)
+    # Scale the features (a fused model takes raw features and has no scaler)
+    X_scaled = scaler.transform(X) if scaler is not None else X
     
     # Try to get probabilities, but handle case where model only has one class
     try:
         probs = model.predict_proba(X_scaled)
-        # Check if we have two classes
+        # Check if we have two classes; both backends predict the class with the highest probability,
+        # so one predict_proba pass gives the prediction too
         if probs.shape[1] > 1:
-            qr_data['abnormal_probability'] = probs[:, 1]
-        else:
-            # If only one class, use a fixed probability based on prediction
-            qr_data['abnormal_probability'] = qr_data['predicted_abnormal'].apply(lambda x: 0.9 if x == 1 else 0.1)
+            return model.classes_[np.argmax(probs, axis=1)], probs[:, 1]
     except (IndexError, AttributeError):
         # Handle case where predict_proba fails
-        qr_data['abnormal_probability'] = qr_data['predicted_abnormal'].apply(lambda x: 0.9 if x == 1 else 0.1)
+        pass
+    
+    # If only one class, use a fixed probability based on prediction
+    predicted = model.predict(X_scaled)
+    return predicted, np.where(predicted == 1, 0.9, 0.1)
+
+def analyze_breathing_patterns(model, scaler, features, qr_data):
+    """Analyze breathing patterns in the QR code data using the trained model."""
+    qr_data['predicted_abnormal'], qr_data['abnormal_probability'] = score_sessions(
+        model, scaler, features, qr_data
+    )
     
     # Print results
     print("\nBreathing Pattern Analysis Results:")
@@ -429,8 +567,14 @@ def main():
     model_path = "model_output/breathing_pattern_model.joblib"
     scaler_path = "model_output/pattern_scaler.joblib"
     features_path = "model_output/pattern_features.json"
-    
-    if os.path.exists(model_path) and os.path.exists(scaler_path) and os.path.exists(features_path):
+    fused_path = "model_output/breathing_pattern_model_fused.joblib"
+    
+    if os.path.exists(fused_path):
+        print("Loading fused breathing pattern model (scaler folded into thresholds)...")
+        model = joblib.load(fused_path)
+        scaler = None
+        features = list(model.feature_names_in_)
+    elif os.path.exists(model_path) and os.path.exists(scaler_path) and os.path.exists(features_path):
         print("Loading existing breathing pattern model...")
         model = joblib.load(model_path)
         scaler = joblib.load(scaler_path)
@@ -438,21 +582,42 @@ def main():
             features = json.load(f)
     else:
         print("Training new breathing pattern model using BIDMC dataset...")
-        bidmc_data = load_bidmc_data()
-        model, scaler, features = train_abnormal_breathing_model(bidmc_data)
+        # Cached to model_output/bidmc_features.csv, which the reference index is built from
+        bidmc_data = load_bidmc_features()
+        model, scaler, features = train_abnormal_breathing_model(bidmc_data, memo_path="model_output/cv_memo.json")
     
-    # Load the QR code respiratory data
+    # Load the QR code respiratory data, preferring the ingested session dataset
     print("\nLoading QR code respiratory data...")
-    qr_data = load_qr_respiratory_data()
+    dataset_dir = "session_dataset" if os.path.isdir("session_dataset/sessions") else None
+    qr_data = load_qr_respiratory_data(dataset_dir=dataset_dir)
     
     # Analyze breathing patterns
     print("\nAnalyzing breathing patterns...")
     results = analyze_breathing_patterns(model, scaler, features, qr_data)
     
-    # Save the detailed results
-    results.to_csv("breathing_pattern_results.csv", index=False)
+    # Upsert the detailed results into the results store, one row per session
+    results['scored_at'] = pd.Timestamp.now().isoformat()
+    conn = connect("breathing_results.db")
+    upsert_results(conn, results, model_version("model_output"))
+    conn.close()
+
+    # Nearest reference cases of the flagged sessions, then index this run's sessions
+    if not os.path.exists("model_output/bidmc_features.csv"):
+        print("\nSkipping similar-case retrieval: model_output/bidmc_features.csv not found "
+              "(built on training, or with reference_index.py --rebuild)")
+    elif len(results):
+        from reference_index import INDEX_NAME, load_reference_index, build_reference_index, session_cases
+        index = load_reference_index("model_output") or build_reference_index("model_output")
+        flagged = results[results['predicted_abnormal'] == 1]
+        if len(flagged):
+            similar = index.similar_cases(flagged[PATTERN_FEATURES], k=3, query_ids=flagged['file_path'])
+            print("\nMost similar reference cases of flagged sessions:")
+            print(similar[['query', 'rank', 'distance', 'case_id', 'label']].round(3).to_string(index=False))
+        index.add(results[PATTERN_FEATURES], session_cases(results))
+        index.save(os.path.join("model_output", INDEX_NAME))
+
     print("\nDone! Results saved to:")
-    print("- breathing_pattern_results.csv (detailed metrics)")
+    print("- breathing_results.db (detailed metrics, query with results_store.py)")
     print("- breathing_pattern_analysis.png (breathing rate vs amplitude)")
     print("- breathing_variability_analysis.png (variability analysis)")
 
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Indexed Results Store for Scored Sessions
+
+Keeps breathing pattern results in a local SQLite database instead of
+rewriting breathing_pattern_results.csv on every run. There is one row per
+session (export file): scoring a file again replaces its row in place, and
+every row records which model produced it.
+
+    session_results
+        file_path (primary key), patient_id, age, gender, health_status,
+        breathing_rate, avg_amplitude, max_amplitude, min_amplitude,
+        avg_velocity, amplitude_variability, duration_variability,
+        predicted_abnormal, abnormal_probability, scored_at, model_version,
+        source_mtime, recorded_at
+
+Indexes on (patient_id, recorded_at) and scored_at make "latest recording
+of a patient" and "everything scored since ..." index lookups, whatever the
+size of the table. A patient's sessions are ordered by recorded_at, not
+scored_at: a bulk re-score stamps one scored_at on a whole batch. model_version is a short content hash of the model artifacts,
+so rows scored by a retrained model are told apart without bookkeeping.
+recorded_at is the session's recording time from the export filename, and
+the per-patient aggregates in patient_aggregates.py are kept up to date by
+every upsert.
+
+The script:
+1. Queries a patient's latest result or history
+2. Imports an existing results CSV (bulk, watch or breathing_pattern_results.csv)
+3. Exports the table, or a patient's rows, to CSV
+
+Usage:
+    python results_store.py --patient 12
+    python results_store.py --import-csv breathing_pattern_results.csv --model-version legacy
+    python results_store.py --export-csv all_results.csv
+"""
+
+import os
+import hashlib
+import datetime
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+
+from app_export import parse_filename
+from patient_aggregates import create_aggregate_tables, update_aggregates, rebuild_aggregates
+
+DEFAULT_DB_PATH = 'breathing_results.db'
+
+# Column name -> SQLite type, in table order
+STORE_SCHEMA = {
+    'file_path': 'TEXT PRIMARY KEY',
+    'patient_id': 'TEXT NOT NULL',
+    'age': 'REAL',
+    'gender': 'INTEGER',
+    'health_status': 'TEXT',
+    'breathing_rate': 'REAL',
+    'avg_amplitude': 'REAL',
+    'max_amplitude': 'REAL',
+    'min_amplitude': 'REAL',
+    'avg_velocity': 'REAL',
+    'amplitude_variability': 'REAL',
+    'duration_variability': 'REAL',
+    'predicted_abnormal': 'INTEGER',
+    'abnormal_probability': 'REAL',
+    'scored_at': 'TEXT NOT NULL',
+    'model_version': 'TEXT',
+    'source_mtime': 'REAL',
+    'recorded_at': 'TEXT'
+}
+STORE_COLUMNS = list(STORE_SCHEMA)
+
+# Artifacts that define a model version, in the order load_scoring_model prefers them
+MODEL_ARTIFACTS = [
+    ['breathing_pattern_model_fused.joblib'],
+    ['breathing_pattern_model.joblib', 'pattern_scaler.joblib', 'pattern_features.json']
+]
+
+
+def model_version(model_dir='model_output'):
+    """Short content hash of the artifacts load_scoring_model would load, or 'unknown'."""
+    for names in MODEL_ARTIFACTS:
+        paths = [os.path.join(model_dir, name) for name in names]
+        if all(os.path.exists(p) for p in paths):
+            digest = hashlib.sha256()
+            for path in paths:
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(chunk)
+            return digest.hexdigest()[:12]
+    return 'unknown'
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+    """Open (and create if needed) the results database."""
+    conn = sqlite3.connect(db_path)
+    # WAL lets readers query while the watcher or a bulk run is writing
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    columns = ", ".join(f"{name} {sql_type}" for name, sql_type in STORE_SCHEMA.items())
+    conn.execute(f"CREATE TABLE IF NOT EXISTS session_results ({columns})")
+    # Superseded by idx_results_recorded: sessions are ordered by recording time
+    conn.execute("DROP INDEX IF EXISTS idx_results_patient")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_results_scored_at ON session_results (scored_at)")
+    create_aggregate_tables(conn)
+
+    # Stores created before recorded_at existed: add it, fill it and build the aggregates once
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(session_results)")}
+    if 'recorded_at' not in existing:
+        conn.execute("ALTER TABLE session_results ADD COLUMN recorded_at TEXT")
+        rows = conn.execute("SELECT file_path, scored_at FROM session_results").fetchall()
+        conn.executemany("UPDATE session_results SET recorded_at = ? WHERE file_path = ?",
+                         [(recorded_at(f, s), f) for f, s in rows])
+        conn.commit()
+        rebuild_aggregates(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_results_recorded ON session_results (patient_id, recorded_at)")
+    conn.commit()
+    return conn
+
+
+def recorded_at(file_path, scored_at=None):
+    """ISO recording time from the export filename, falling back to the scoring time."""
+    naming = parse_filename(file_path)
+    if naming:
+        stamp = naming['recording_date'] + naming['recording_time']
+        # An impossible time of day still leaves a usable recording date
+        for text, fmt in ((stamp, '%Y%m%d%H%M%S'), (stamp[:8], '%Y%m%d')):
+            try:
+                return datetime.datetime.strptime(text, fmt).isoformat()
+            except ValueError:
+                pass
+    return scored_at
+
+
+def _to_sql(value):
+    """numpy scalars and NaN to plain Python values SQLite accepts."""
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def upsert_results(conn, results, version=None):
+    """Insert or replace one row per session; returns the number of rows written.
+
+    results is a DataFrame with at least file_path, patient_id and scored_at;
+    missing store columns are stored as NULL. version fills model_version
+    where the frame does not carry one.
+    """
+    if results is None or len(results) == 0:
+        return 0
+    results = results.reset_index(drop=True)
+    if version is not None and 'model_version' not in results:
+        results = results.assign(model_version=version)
+    if 'scored_at' not in results:
+        results = results.assign(scored_at=pd.Timestamp.now().isoformat())
+    results = results.assign(patient_id=results['patient_id'].astype(str))
+    if 'recorded_at' not in results:
+        results = results.assign(recorded_at=[recorded_at(f, s) for f, s in
+                                              zip(results['file_path'], results['scored_at'])])
+
+    columns = [c for c in STORE_COLUMNS if c in results.columns]
+    updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != 'file_path')
+    sql = (f"INSERT INTO session_results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+           f"ON CONFLICT(file_path) DO UPDATE SET {updates}")
+    rows = [tuple(_to_sql(v) for v in row) for row in results[columns].itertuples(index=False, name=None)]
+
+    with conn:
+        # Replaced rows may leave buckets of another day or patient, so refresh those too
+        files = list(results['file_path'])
+        touched = set(zip(results['patient_id'], results['recorded_at']))
+        for start in range(0, len(files), 500):
+            chunk = files[start:start + 500]
+            touched.update(conn.execute(
+                f"SELECT patient_id, recorded_at FROM session_results "
+                f"WHERE file_path IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        conn.executemany(sql, rows)
+        update_aggregates(conn, touched)
+    return len(rows)
+
+
+def _query(conn, sql, params=()):
+    results = pd.read_sql_query(sql, conn, params=params)
+    return results.astype({'patient_id': str})
+
+
+def latest_result(conn, patient_id):
+    """The most recently recorded session of a patient as a dict, or None."""
+    # A plain cursor: building a DataFrame would cost more than the indexed lookup
+    cursor = conn.execute("SELECT * FROM session_results WHERE patient_id = ? "
+                          "ORDER BY recorded_at DESC, scored_at DESC LIMIT 1", (str(patient_id),))
+    row = cursor.fetchone()
+    return dict(zip([d[0] for d in cursor.description], row)) if row else None
+
+
+def patient_history(conn, patient_id):
+    """All scored sessions of a patient, most recently recorded first."""
+    return _query(conn, "SELECT * FROM session_results WHERE patient_id = ? "
+                  "ORDER BY recorded_at DESC, scored_at DESC", (str(patient_id),))
+
+
+def read_results(conn, since=None):
+    """The whole table, or the rows scored at or after the ISO timestamp since."""
+    if since is None:
+        return _query(conn, "SELECT * FROM session_results ORDER BY scored_at")
+    return _query(conn, "SELECT * FROM session_results WHERE scored_at >= ? ORDER BY scored_at", (since,))
+
+
+def import_csv(conn, csv_path, version=None):
+    """Upsert the rows of an existing results CSV; returns the number of rows."""
+    results = pd.read_csv(csv_path, dtype={'patient_id': str}, float_precision='round_trip')
+    if 'scored_at' not in results:
+        results['scored_at'] = pd.Timestamp(os.path.getmtime(csv_path), unit='s').isoformat()
+    return upsert_results(conn, results, version)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query and maintain the scored-session results store")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--patient", help="Show the latest result and history of this patient")
+    parser.add_argument("--since", help="With --export-csv, only rows scored at or after this ISO time")
+    parser.add_argument("--import-csv", help="Upsert the rows of a results CSV")
+    parser.add_argument("--model-version", help="model_version for imported rows that lack one")
+    parser.add_argument("--export-csv", help="Write the table (or the patient's rows) to this CSV")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+
+    if args.import_csv:
+        count = import_csv(conn, args.import_csv, args.model_version or 'unknown')
+        print(f"Imported {count} rows from {args.import_csv}")
+
+    if args.patient:
+        latest = latest_result(conn, args.patient)
+        if latest is None:
+            print(f"No results for patient {args.patient}")
+        else:
+            status = "ABNORMAL" if latest['predicted_abnormal'] == 1 else "NORMAL"
+            print(f"Patient {args.patient}: {status} ({latest['abnormal_probability'] * 100:.1f}%) "
+                  f"from {latest['file_path']}, scored {latest['scored_at']} by model {latest['model_version']}")
+            history = patient_history(conn, args.patient)
+            print(f"\n{len(history)} scored session(s):")
+            print(history[['file_path', 'recorded_at', 'scored_at', 'predicted_abnormal', 'abnormal_probability',
+                           'model_version']].to_string(index=False))
+
+    if args.export_csv:
+        results = patient_history(conn, args.patient) if args.patient else read_results(conn, args.since)
+        results.to_csv(args.export_csv, index=False)
+        print(f"Exported {len(results)} rows to {args.export_csv}")
+
+    if not (args.import_csv or args.patient or args.export_csv):
+        count = conn.execute("SELECT COUNT(*) FROM session_results").fetchone()[0]
+        patients = conn.execute("SELECT COUNT(DISTINCT patient_id) FROM session_results").fetchone()[0]
+        print(f"{args.db}: {count} scored sessions from {patients} patients")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
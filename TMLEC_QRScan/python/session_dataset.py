@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Partitioned Columnar Dataset for Ingested App Sessions
+
+Converts respiratory_data_<id>_<date>.csv exports into a Parquet dataset so
+analyses can read only the columns and sessions they need:
+
+    session_dataset/
+        frames/patient_id=<id>/recording_date=<yyyymmdd>/<file>.parquet
+        sessions/patient_id=<id>/recording_date=<yyyymmdd>/<file>.parquet
+
+frames holds the per-frame table (timestamp, qr_id, x, y, movement,
+breathing_phase, amplitude, velocity, file_path); sessions holds one row per
+export with the header metadata. Ingest is incremental: a file is only
+rewritten when the source CSV is newer than its Parquet part.
+
+Requires pyarrow.
+
+Usage:
+    python session_dataset.py respiratory_data/ session_dataset/
+"""
+
+import os
+import argparse
+import pandas as pd
+from glob import glob
+
+from app_export import read_app_export, read_export_header, parse_filename
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+DEFAULT_DATASET_DIR = 'session_dataset'
+PARTITIONING = ['patient_id', 'recording_date']
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the session dataset: pip install pyarrow")
+
+
+def _partition_dir(dataset_dir, table, patient_id, recording_date):
+    return os.path.join(dataset_dir, table, f"patient_id={patient_id}", f"recording_date={recording_date}")
+
+
+def _part_path(dataset_dir, table, metadata):
+    name = os.path.splitext(metadata['file_path'])[0] + '.parquet'
+    return os.path.join(
+        _partition_dir(dataset_dir, table, metadata['patient_id'], metadata.get('recording_date', 'unknown')),
+        name
+    )
+
+
+def ingest_file(file_path, dataset_dir=DEFAULT_DATASET_DIR, force=False):
+    """Ingest one export; returns False if its Parquet parts are already current."""
+    _require_pyarrow()
+
+    # Work out the partition from the header alone to decide whether to skip
+    header, _ = read_export_header(file_path)
+    naming = parse_filename(file_path)
+    probe = {
+        'patient_id': header.get('patient_id') or naming.get('file_patient_id', '0'),
+        'recording_date': naming.get('recording_date', 'unknown'),
+        'file_path': os.path.basename(file_path)
+    }
+    frames_part = _part_path(dataset_dir, 'frames', probe)
+    if not force and os.path.exists(frames_part) and os.path.getmtime(frames_part) >= os.path.getmtime(file_path):
+        return False
+
+    metadata, frames = read_app_export(file_path)
+    metadata['patient_id'] = str(metadata['patient_id'])
+    metadata.setdefault('recording_date', 'unknown')
+    metadata['source_mtime'] = os.path.getmtime(file_path)
+    frames['file_path'] = metadata['file_path']
+
+    session = pd.DataFrame([{k: v for k, v in metadata.items() if k not in PARTITIONING}])
+    for table, df in (('frames', frames), ('sessions', session)):
+        path = _part_path(dataset_dir, table, metadata)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Dot-prefixed temp files are ignored by dataset discovery until renamed
+        tmp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+        os.replace(tmp_path, path)
+    return True
+
+
+def ingest_directory(data_dir='respiratory_data', dataset_dir=DEFAULT_DATASET_DIR, force=False):
+    """Ingest every export in data_dir that is new or changed since the last run."""
+    files = sorted(glob(f"{data_dir}/respiratory_data_*.csv"))
+    written = 0
+    for file_path in files:
+        try:
+            if ingest_file(file_path, dataset_dir, force):
+                written += 1
+        except Exception as e:
+            print(f"Error ingesting {file_path}: {str(e)}")
+    print(f"Ingested {written} of {len(files)} session files into {dataset_dir}")
+    return written
+
+
+def _dataset(dataset_dir, table):
+    _require_pyarrow()
+    path = os.path.join(dataset_dir, table)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No '{table}' table in {dataset_dir}; run the ingest step first")
+    partitioning = ds.partitioning(
+        pa.schema([('patient_id', pa.string()), ('recording_date', pa.string())]),
+        flavor='hive'
+    )
+    return ds.dataset(path, format='parquet', partitioning=partitioning)
+
+
+def build_filter(patient_ids=None, date_from=None, date_to=None, extra=None, file_paths=None):
+    """Combine common predicates into a pyarrow expression.
+
+    Patient and date predicates prune whole partition directories; extra is
+    any further pyarrow.dataset expression (e.g. ds.field('amplitude') > 5),
+    pushed down to Parquet row-group statistics. file_paths limits rows to
+    those export file names.
+    """
+    _require_pyarrow()
+    expression = None
+
+    def _and(a, b):
+        return b if a is None else a & b
+
+    if patient_ids is not None:
+        expression = _and(expression, ds.field('patient_id').isin([str(p) for p in patient_ids]))
+    if date_from is not None:
+        expression = _and(expression, ds.field('recording_date') >= str(date_from))
+    if date_to is not None:
+        expression = _and(expression, ds.field('recording_date') <= str(date_to))
+    if file_paths is not None:
+        expression = _and(expression, ds.field('file_path').isin(list(file_paths)))
+    if extra is not None:
+        expression = _and(expression, extra)
+    return expression
+
+
+def read_frames(dataset_dir=DEFAULT_DATASET_DIR, columns=None, filter=None):
+    """Read per-frame rows, loading only the requested columns and partitions."""
+    return _dataset(dataset_dir, 'frames').to_table(columns=columns, filter=filter).to_pandas()
+
+
+def read_sessions(dataset_dir=DEFAULT_DATASET_DIR, columns=None, filter=None):
+    """Read the one-row-per-export session metadata table."""
+    return _dataset(dataset_dir, 'sessions').to_table(columns=columns, filter=filter).to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest app exports into a partitioned Parquet dataset")
+    parser.add_argument("data_dir", nargs="?", default="respiratory_data")
+    parser.add_argument("dataset_dir", nargs="?", default=DEFAULT_DATASET_DIR)
+    parser.add_argument("--force", action="store_true", help="Rewrite parts even if they are current")
+    args = parser.parse_args()
+
+    ingest_directory(args.data_dir, args.dataset_dir, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Header-Only Metadata Index over the Session Archive
+
+Selecting sessions by patient, age, health status, duration or breathing
+rate should not mean loading every export. This module reads only the
+"# Patient Information" and "# Breathing Analysis Summary" lines of each
+respiratory_data_*.csv (read_export_header stops at the column header row)
+and keeps them in a small table next to the exports:
+
+    <data_dir>/.session_index.csv
+        file_path, source_mtime, source_size,
+        patient_id, age, gender, health_status, notes, total_duration,
+        breathing_rate, avg_amplitude, max_amplitude, min_amplitude,
+        total_breaths, recording_date, recording_time
+
+The index is refreshed incrementally: a scandir pass compares each file's
+mtime and size with its index row, only new or changed files have their
+header re-read, and deleted files are dropped. Loaders take a where
+predicate (a DataFrame.query string or a function of the index returning
+a boolean mask) that is resolved here, so only matching files are opened
+past their header. If the index cannot be written (a read-only or shared
+archive), the refreshed index is still used, in memory.
+
+The script:
+1. Refreshes the index of a data directory
+2. Prints the sessions matching an optional --where query
+
+Usage:
+    python session_index.py respiratory_data/
+    python session_index.py respiratory_data/ --where "health_status == 'Asthma' and breathing_rate > 20"
+"""
+
+import os
+import argparse
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from app_export import HEADER_FIELDS, read_export_header, parse_filename
+
+INDEX_NAME = '.session_index.csv'
+
+METADATA_COLUMNS = [key for key, _ in HEADER_FIELDS.values()]
+INDEX_COLUMNS = (['file_path', 'source_mtime', 'source_size'] + METADATA_COLUMNS +
+                 ['recording_date', 'recording_time'])
+
+
+def default_index_path(data_dir):
+    return os.path.join(data_dir, INDEX_NAME)
+
+
+def index_file(path, stat=None):
+    """Index row for one export, from its header lines only."""
+    stat = stat or os.stat(path)
+    metadata, _ = read_export_header(path)
+    naming = parse_filename(path)
+    row = {
+        'file_path': os.path.basename(path),
+        'source_mtime': stat.st_mtime,
+        'source_size': stat.st_size
+    }
+    row.update({key: metadata.get(key) for key in METADATA_COLUMNS})
+    if row['patient_id'] is None:
+        row['patient_id'] = naming.get('file_patient_id')
+    row['recording_date'] = naming.get('recording_date')
+    row['recording_time'] = naming.get('recording_time')
+    return row
+
+
+def load_index(index_path):
+    """The saved index, or an empty one."""
+    if not os.path.exists(index_path):
+        return pd.DataFrame(columns=INDEX_COLUMNS)
+    return pd.read_csv(index_path, float_precision='round_trip', keep_default_na=False, na_values=[''],
+                       dtype={'patient_id': str, 'recording_date': str, 'recording_time': str,
+                              'gender': str, 'health_status': str, 'notes': str})
+
+
+def save_index(index, index_path):
+    """Write the index to a temp file and swap it in; returns False if it cannot be written."""
+    tmp_path = os.path.join(os.path.dirname(os.path.abspath(index_path)),
+                            '.' + os.path.basename(index_path) + '.tmp')
+    try:
+        index[INDEX_COLUMNS].to_csv(tmp_path, index=False)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"Session index not saved ({str(e)}); using it in memory")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+def refresh_index(data_dir='respiratory_data', index_path=None, workers=None):
+    """Bring the index of data_dir up to date and return it, one row per export."""
+    index_path = index_path or default_index_path(data_dir)
+    index = load_index(index_path)
+    known = {row.file_path: (row.source_mtime, row.source_size)
+             for row in index[['file_path', 'source_mtime', 'source_size']].itertuples(index=False)}
+
+    present, stale = set(), []
+    with os.scandir(data_dir) as entries:
+        for entry in entries:
+            if not (entry.name.startswith('respiratory_data_') and entry.name.endswith('.csv') and entry.is_file()):
+                continue
+            present.add(entry.name)
+            stat = entry.stat()
+            if known.get(entry.name) != (stat.st_mtime, stat.st_size):
+                stale.append((entry.path, stat))
+
+    removed = set(known) - present
+    if not stale and not removed:
+        return index
+
+    def _index(item):
+        try:
+            return index_file(*item)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error indexing {item[0]}: {str(e)}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rows = [row for row in pool.map(_index, stale) if row is not None]
+
+    changed = {os.path.basename(path) for path, _ in stale}
+    index = index[~index['file_path'].isin(changed | removed)]
+    if rows:
+        index = pd.concat([index, pd.DataFrame(rows, columns=INDEX_COLUMNS)], ignore_index=True)
+    index = index.sort_values('file_path', kind='stable').reset_index(drop=True)[INDEX_COLUMNS]
+    save_index(index, index_path)
+    print(f"Session index: {len(rows)} file(s) (re)indexed, {len(removed)} removed, {len(index)} total")
+    return index
+
+
+def select_sessions(index, where=None, patient_ids=None):
+    """Index rows matching patient_ids and where.
+
+    where is a DataFrame.query string over the index columns, or a function
+    taking the index and returning a boolean mask.
+    """
+    if patient_ids is not None:
+        index = index[index['patient_id'].isin([str(p) for p in patient_ids])]
+    if where is None:
+        return index
+    if callable(where):
+        return index[where(index)]
+    return index.query(where)
+
+
+def select_files(data_dir='respiratory_data', where=None, patient_ids=None, index_path=None):
+    """Paths of the exports in data_dir matching the predicates, in file name order."""
+    index = refresh_index(data_dir, index_path)
+    return [os.path.join(data_dir, name) for name in select_sessions(index, where, patient_ids)['file_path']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the header-only session index")
+    parser.add_argument("data_dir", nargs="?", default="respiratory_data")
+    parser.add_argument("--index", help=f"Index file (default: <data_dir>/{INDEX_NAME})")
+    parser.add_argument("--where", help="DataFrame.query expression over the index columns")
+    parser.add_argument("--patients", nargs="+", help="Only these patient IDs")
+    args = parser.parse_args()
+
+    index = refresh_index(args.data_dir, args.index)
+    selected = select_sessions(index, args.where, args.patients)
+    print(f"{len(selected)} of {len(index)} sessions selected")
+
+    pd.set_option('display.width', 200)
+    columns = ['file_path', 'patient_id', 'age', 'gender', 'health_status', 'total_duration', 'breathing_rate']
+    print(selected[columns].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Vectorized Host-Side Replay of QR Tracking and Breathing Phase Detection
+
+Recomputes velocity, amplitude and inhale/exhale/pause phases from the raw
+X, Y, Relative Time (ms) and QR ID columns of app exports, following
+MainActivity.analyzeBreathingMovement:
+
+- velocity: mean of the last 4 frame-to-frame Y velocities (pairs closer than
+  50 ms are skipped), then exponential smoothing with alpha = 0.7
+- amplitude: 0.6 x the Y range of the last 10 positions, capped at 50
+- phase: hysteresis state machine with a 400 ms minimum phase duration and a
+  1000 ms hold before entering pause
+- frames with fewer than 5 positions in the last 3 s report velocity 0 and
+  pause without touching the tracker state
+
+Every per-frame quantity is computed with NumPy over the whole session. The
+phase machine only iterates over phase changes, jumping between them with
+precomputed next-occurrence indices, so cost is a few array passes per file.
+
+Usage:
+    python session_replay.py respiratory_data/ --output-dir replayed_data --workers 8
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from glob import glob
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from scipy.signal import lfilter
+
+from app_export import read_app_export
+
+HISTORY_WINDOW_MS = 3000
+MIN_HISTORY_POINTS = 5
+VELOCITY_POINTS = 5
+MIN_TIME_DELTA_S = 0.05
+SMOOTHING_ALPHA = 0.7
+AMPLITUDE_POINTS = 10
+AMPLITUDE_SCALE = 0.6
+MAX_AMPLITUDE = 50.0
+MIN_PHASE_DURATION_MS = 400
+PAUSE_HOLD_MS = 1000
+
+
+@dataclass
+class CalibrationThresholds:
+    """Velocity thresholds for phase detection (defaults match the app).
+
+    A phase is entered when velocity crosses inhale/exhale_threshold and is
+    kept while velocity stays beyond the pause band on the same side.
+    """
+    inhale_threshold: float = 4.0
+    exhale_threshold: float = -4.0
+    pause_threshold_low: float = -2.0
+    pause_threshold_high: float = 2.0
+
+
+def _next_true(mask):
+    """For each i, the smallest j >= i with mask[j], or len(mask) if none."""
+    n = len(mask)
+    idx = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(idx[::-1])[::-1]
+
+
+def _window_starts(t):
+    """Index of the first frame inside the 3 s history window of each frame."""
+    return np.searchsorted(t, t - HISTORY_WINDOW_MS, side='left')
+
+
+def compute_velocity(t, y, valid):
+    """Smoothed Y velocity per frame; 0 where the tracker is still initializing."""
+    n = len(t)
+    dt = np.diff(t) / 1000.0
+    pair_velocity = np.zeros(n)
+    pair_ok = np.zeros(n, dtype=bool)
+    pair_ok[1:] = dt > MIN_TIME_DELTA_S
+    pair_velocity[1:] = np.where(pair_ok[1:], np.diff(y) / np.where(pair_ok[1:], dt, 1.0), 0.0)
+
+    # Each frame averages the pairs inside its last VELOCITY_POINTS positions
+    pairs = VELOCITY_POINTS - 1
+    cum_v = np.concatenate([[0.0], np.cumsum(pair_velocity)])
+    cum_n = np.concatenate([[0], np.cumsum(pair_ok)])
+    lo = np.maximum(np.arange(n) - pairs + 1, 0)
+    hi = np.arange(n) + 1
+    counts = cum_n[hi] - cum_n[lo]
+    avg_velocity = np.where(counts > 0, (cum_v[hi] - cum_v[lo]) / np.maximum(counts, 1), 0.0)
+
+    # Exponential smoothing only advances on frames that passed the history check
+    smoothed = np.zeros(n)
+    smoothed[valid] = lfilter([1 - SMOOTHING_ALPHA], [1, -SMOOTHING_ALPHA], avg_velocity[valid])
+    return smoothed
+
+
+def compute_amplitude(y, window_starts, valid):
+    """0.6 x Y range over the last 10 positions still inside the history window."""
+    n = len(y)
+    offsets = np.arange(AMPLITUDE_POINTS)[::-1]
+    idx = np.arange(n)[:, None] - offsets[None, :]
+    in_window = idx >= window_starts[:, None]
+    window = np.where(in_window, y[np.clip(idx, 0, None)], np.nan)
+    with np.errstate(all='ignore'):
+        span = np.nanmax(window, axis=1) - np.nanmin(window, axis=1)
+    amplitude = np.minimum(span * AMPLITUDE_SCALE, MAX_AMPLITUDE)
+    return np.where(valid, amplitude, 0.0)
+
+
+def detect_phases(t, velocity, thresholds=None):
+    """Run the app's hysteresis phase machine over one tracked point.
+
+    Returns an array of 'inhaling' / 'exhaling' / 'pause' labels. The loop
+    runs once per phase change; all scanning is done by lookup into
+    next-occurrence arrays built with NumPy.
+    """
+    thresholds = thresholds or CalibrationThresholds()
+    n = len(t)
+    phases = np.full(n, 'pause', dtype=object)
+    if n == 0:
+        return phases
+
+    next_up = _next_true(velocity >= thresholds.inhale_threshold)
+    next_down = _next_true(velocity <= thresholds.exhale_threshold)
+    next_still = _next_true(
+        (velocity >= thresholds.pause_threshold_low) & (velocity <= thresholds.pause_threshold_high)
+    )
+
+    def first_after(ms, start):
+        # First frame strictly later than ms, but not before start
+        j = max(start, int(np.searchsorted(t, ms, side='right')))
+        return min(j, n)
+
+    def lookup(nxt, j):
+        return nxt[j] if j < n else n
+
+    state, changed_at, i = 'pause', -np.inf, 0
+    change_idx, change_state = [], []
+
+    while i < n:
+        can_change = first_after(changed_at + MIN_PHASE_DURATION_MS, i)
+        if state == 'pause':
+            candidates = [
+                (lookup(next_up, can_change), 'inhaling'),
+                (lookup(next_down, can_change), 'exhaling')
+            ]
+        else:
+            opposite = next_down if state == 'inhaling' else next_up
+            can_pause = first_after(changed_at + PAUSE_HOLD_MS, i)
+            candidates = [
+                (lookup(opposite, can_change), 'exhaling' if state == 'inhaling' else 'inhaling'),
+                (lookup(next_still, can_pause), 'pause')
+            ]
+
+        k, new_state = min(candidates, key=lambda c: c[0])
+        if k >= n:
+            break
+        change_idx.append(k)
+        change_state.append(new_state)
+        state, changed_at, i = new_state, t[k], k + 1
+
+    if change_idx:
+        segment = np.searchsorted(change_idx, np.arange(n), side='right') - 1
+        labels = np.array(['pause'] + change_state, dtype=object)
+        phases = labels[segment + 1]
+    return phases
+
+
+def replay_track(t, y, thresholds=None):
+    """Recompute velocity, amplitude and phase for one QR track sorted by time."""
+    starts = _window_starts(t)
+    valid = (np.arange(len(t)) - starts + 1) >= MIN_HISTORY_POINTS
+
+    velocity = compute_velocity(t, y, valid)
+    amplitude = compute_amplitude(y, starts, valid)
+
+    phases = np.full(len(t), 'pause', dtype=object)
+    phases[valid] = detect_phases(t[valid], velocity[valid], thresholds)
+    return velocity, amplitude, phases
+
+
+def replay_session(frames, thresholds=None):
+    """Add replayed_velocity / replayed_amplitude / replayed_phase to a session.
+
+    Tracks are separated by QR ID, as the app keeps one history per code.
+    """
+    frames = frames.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    velocity = np.zeros(len(frames))
+    amplitude = np.zeros(len(frames))
+    phases = np.full(len(frames), 'pause', dtype=object)
+
+    groups = frames.groupby('qr_id', sort=False).indices if 'qr_id' in frames else {None: np.arange(len(frames))}
+    for rows in groups.values():
+        t = frames['timestamp'].to_numpy(dtype=np.float64)[rows]
+        y = frames['y'].to_numpy(dtype=np.float64)[rows]
+        velocity[rows], amplitude[rows], phases[rows] = replay_track(t, y, thresholds)
+
+    frames['replayed_velocity'] = velocity
+    frames['replayed_amplitude'] = amplitude
+    frames['replayed_phase'] = phases
+    return frames
+
+
+def replay_file(file_path, thresholds=None, output_dir=None):
+    """Replay one export; optionally write the relabeled frames to output_dir.
+
+    Returns a one-row summary of agreement with the on-device labels.
+    """
+    metadata, frames = read_app_export(file_path)
+    replayed = replay_session(frames, thresholds)
+
+    if output_dir:
+        replayed.to_csv(os.path.join(output_dir, os.path.basename(file_path)), index=False)
+
+    summary = {
+        'file_path': metadata['file_path'],
+        'patient_id': metadata.get('patient_id'),
+        'frames': len(replayed),
+        'inhaling_fraction': float(np.mean(replayed['replayed_phase'] == 'inhaling')) if len(replayed) else 0.0,
+        'exhaling_fraction': float(np.mean(replayed['replayed_phase'] == 'exhaling')) if len(replayed) else 0.0,
+    }
+    if 'breathing_phase' in replayed and len(replayed):
+        summary['phase_agreement'] = float(np.mean(replayed['breathing_phase'] == replayed['replayed_phase']))
+    return summary
+
+
+def _replay_file_safe(args):
+    file_path, thresholds, output_dir = args
+    try:
+        return replay_file(file_path, thresholds, output_dir)
+    except Exception as e:
+        return {'file_path': os.path.basename(file_path), 'error': str(e)}
+
+
+def replay_directory(data_dir='respiratory_data', output_dir=None, thresholds=None, workers=None):
+    """Replay every export in data_dir across a process pool."""
+    files = sorted(glob(f"{data_dir}/respiratory_data_*.csv"))
+    if not files:
+        raise ValueError(f"No respiratory data files found in {data_dir}")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    jobs = [(f, thresholds, output_dir) for f in files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        summaries = list(pool.map(_replay_file_safe, jobs, chunksize=max(1, len(jobs) // 64)))
+    return pd.DataFrame(summaries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay QR tracking and phase detection over app exports")
+    parser.add_argument("data_dir", nargs="?", default="respiratory_data")
+    parser.add_argument("--output-dir", help="Write relabeled sessions here")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: all cores)")
+    parser.add_argument("--inhale-threshold", type=float, default=4.0)
+    parser.add_argument("--exhale-threshold", type=float, default=-4.0)
+    parser.add_argument("--pause-low", type=float, default=-2.0)
+    parser.add_argument("--pause-high", type=float, default=2.0)
+    parser.add_argument("--summary", default="replay_summary.csv")
+    args = parser.parse_args()
+
+    thresholds = CalibrationThresholds(
+        inhale_threshold=args.inhale_threshold,
+        exhale_threshold=args.exhale_threshold,
+        pause_threshold_low=args.pause_low,
+        pause_threshold_high=args.pause_high
+    )
+
+    summary = replay_directory(args.data_dir, args.output_dir, thresholds, args.workers)
+    summary.to_csv(args.summary, index=False)
+
+    failed = summary['error'].notna().sum() if 'error' in summary else 0
+    print(f"Replayed {len(summary) - failed} sessions ({failed} failed)")
+    if 'phase_agreement' in summary:
+        print(f"Mean agreement with on-device phases: {summary['phase_agreement'].mean():.3f}")
+    print(f"Summary saved to {args.summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Uniform-Rate Resampling of App Sessions
+
+App exports are sampled at whatever rate the camera delivers frames, so
+Relative Time (ms) is irregular and frames drop. This script puts each
+session onto a fixed time grid so features can be computed with batch FFTs
+and matrix operations over many sessions at once:
+
+- x, y, amplitude and velocity are linearly interpolated (np.interp)
+- breathing phase labels are carried over from the nearest frame in time
+- grid points inside a gap between frames longer than max_gap_ms are flagged
+- sessions are stacked into fixed-shape, NaN-padded arrays with a mask
+
+Phases are stored as integer codes (PHASE_CODES, -1 for padding). Values at
+flagged gap points are still interpolated, but mask is False there: masked
+statistics ignore them and the FFT in dominant_breathing_rate sees them as
+zeros (after centring), like the padding.
+
+Usage:
+    python session_resample.py respiratory_data/ --rate 10 --output resampled_sessions.npz
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+
+from app_export import read_app_export
+
+RESAMPLE_COLUMNS = ['x', 'y', 'amplitude', 'velocity']
+PHASE_CODES = {'pause': 0, 'inhaling': 1, 'exhaling': 2}
+DEFAULT_RATE_HZ = 10.0
+DEFAULT_MAX_GAP_MS = 500.0
+
+
+def primary_track(frames):
+    """The QR ID with the most frames, used when a session tracked several codes."""
+    if 'qr_id' not in frames or frames['qr_id'].nunique() <= 1:
+        return frames
+    return frames[frames['qr_id'] == frames['qr_id'].value_counts().idxmax()]
+
+
+def resample_session(frames, rate_hz=DEFAULT_RATE_HZ, max_gap_ms=DEFAULT_MAX_GAP_MS):
+    """Resample one session's frames onto a uniform grid starting at its first frame.
+
+    Returns a dict with 't' (ms), one array per RESAMPLE_COLUMNS entry present,
+    'phase' (int codes) and 'gap' (True inside frame gaps longer than max_gap_ms).
+    """
+    frames = primary_track(frames)
+    t = frames['timestamp'].to_numpy(dtype=np.float64)
+    order = np.argsort(t, kind='stable')
+    t = t[order]
+    # np.interp needs strictly increasing sample times; keep the first frame per timestamp
+    t, first = np.unique(t, return_index=True)
+    keep = order[first]
+
+    step_ms = 1000.0 / rate_hz
+    n_points = int(np.floor((t[-1] - t[0]) / step_ms)) + 1 if len(t) else 0
+    grid = (t[0] if len(t) else 0.0) + np.arange(n_points) * step_ms
+
+    result = {'t': grid, 'phase': np.full(n_points, -1), 'gap': np.zeros(n_points, dtype=bool)}
+    for column in RESAMPLE_COLUMNS:
+        if column in frames:
+            values = frames[column].to_numpy(dtype=np.float64)[keep]
+            result[column] = np.interp(grid, t, values) if len(t) else grid.copy()
+    if len(t) < 2:
+        return result
+
+    # Frames on either side of each grid point
+    after = np.clip(np.searchsorted(t, grid, side='right'), 1, len(t) - 1)
+    before = after - 1
+
+    # Nearest frame in time for the phase label (ties go to the earlier frame)
+    if 'breathing_phase' in frames:
+        labels = frames['breathing_phase'].to_numpy()[keep]
+        # Positions in PHASE_CODES order are the codes; unknown labels get -1
+        codes = pd.Index(sorted(PHASE_CODES, key=PHASE_CODES.get)).get_indexer(labels)
+        nearest = np.where(grid - t[before] <= t[after] - grid, before, after)
+        result['phase'] = codes[nearest]
+
+    # A grid point is in a gap if the frames around it are further apart than max_gap_ms
+    result['gap'] = (t[after] - t[before] > max_gap_ms) & (grid != t[before])
+    return result
+
+
+def stack_sessions(resampled, length=None):
+    """Stack resampled sessions into (n_sessions, length) arrays.
+
+    Float arrays are NaN-padded, phase is padded with -1, and mask is True
+    only at real, non-gap grid points. Longer sessions are truncated to length.
+    """
+    length = length or max((len(r['t']) for r in resampled), default=0)
+    n = len(resampled)
+    columns = [c for c in ['t'] + RESAMPLE_COLUMNS if all(c in r for r in resampled)]
+
+    stacked = {c: np.full((n, length), np.nan) for c in columns}
+    stacked['phase'] = np.full((n, length), -1, dtype=np.int8)
+    stacked['mask'] = np.zeros((n, length), dtype=bool)
+    stacked['lengths'] = np.zeros(n, dtype=np.int64)
+
+    for i, r in enumerate(resampled):
+        m = min(len(r['t']), length)
+        for c in columns:
+            stacked[c][i, :m] = r[c][:m]
+        stacked['phase'][i, :m] = r['phase'][:m]
+        stacked['mask'][i, :m] = ~r['gap'][:m]
+        stacked['lengths'][i] = m
+    return stacked
+
+
+def dominant_breathing_rate(stacked, rate_hz=DEFAULT_RATE_HZ, column='y', min_bpm=4.0, max_bpm=60.0):
+    """Breaths per minute from the strongest spectral peak, one batched FFT for all sessions.
+
+    Masked (gap and padding) points are zero-filled after centring. Sessions
+    with fewer than two valid points or no in-band power get NaN.
+    """
+    values = stacked[column]
+    if values.shape[1] < 2:
+        return np.full(len(values), np.nan)
+    valid = stacked['mask'] & ~np.isnan(values)
+    n_valid = valid.sum(axis=1)
+    counts = np.maximum(n_valid, 1)[:, None]
+    means = np.where(valid, values, 0).sum(axis=1, keepdims=True) / counts
+    centred = np.where(valid, values - means, 0.0)
+
+    spectrum = np.abs(np.fft.rfft(centred, axis=1))
+    freqs_bpm = np.fft.rfftfreq(values.shape[1], d=1.0 / rate_hz) * 60.0
+    band = (freqs_bpm >= min_bpm) & (freqs_bpm <= max_bpm)
+    if not np.any(band):
+        return np.full(len(values), np.nan)
+    in_band = spectrum[:, band]
+    rates = freqs_bpm[band][np.argmax(in_band, axis=1)]
+    # An all-zero spectrum would otherwise report the lowest band frequency
+    return np.where((n_valid >= 2) & (in_band.max(axis=1) > 0), rates, np.nan)
+
+
+def _resample_file(args):
+    file_path, rate_hz, max_gap_ms = args
+    try:
+        _, frames = read_app_export(file_path)
+        return file_path, resample_session(frames, rate_hz, max_gap_ms), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+def resample_files(files, rate_hz=DEFAULT_RATE_HZ, max_gap_ms=DEFAULT_MAX_GAP_MS, length=None, workers=None):
+    """Read, resample and stack many exports; returns (stacked arrays, file names)."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_resample_file, [(f, rate_hz, max_gap_ms) for f in files]))
+
+    resampled, names = [], []
+    for file_path, result, error in results:
+        if result is None:
+            print(f"Error resampling {file_path}: {error}")
+            continue
+        resampled.append(result)
+        names.append(os.path.basename(file_path))
+    return stack_sessions(resampled, length), names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resample app sessions onto a uniform time grid")
+    parser.add_argument("data_dir", nargs="?", default="respiratory_data")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_HZ, help="Grid rate in Hz")
+    parser.add_argument("--max-gap-ms", type=float, default=DEFAULT_MAX_GAP_MS)
+    parser.add_argument("--length", type=int, help="Fixed grid length (default: longest session)")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output", default="resampled_sessions.npz")
+    args = parser.parse_args()
+
+    files = sorted(glob(f"{args.data_dir}/respiratory_data_*.csv"))
+    stacked, names = resample_files(files, args.rate, args.max_gap_ms, args.length, args.workers)
+
+    n_sessions, length = stacked['mask'].shape
+    real = stacked['lengths'].sum()
+    gaps = real - stacked['mask'].sum()
+    print(f"Resampled {n_sessions} sessions onto a {args.rate:g} Hz grid: array shape ({n_sessions}, {length})")
+    print(f"Flagged {gaps} of {real} grid points ({gaps / max(real, 1):.1%}) as gaps over {args.max_gap_ms:g} ms")
+
+    rates = dominant_breathing_rate(stacked, args.rate)
+    for name, bpm in list(zip(names, rates))[:10]:
+        print(f"  {name}: dominant breathing rate {bpm:.1f} breaths/min")
+
+    np.savez_compressed(args.output, files=np.array(names), **stacked)
+    print(f"\nStacked arrays saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,10 @@ import joblib
 import json
 from glob import glob
 
+from bootstrap_eval import bootstrap_metrics, print_intervals
+from plot_downsample import DEFAULT_POINTS, downsample, phase_runs, plot_phase_runs
+from session_index import select_files
+
 def load_model_and_scaler(model_dir='model_output'):
     """Load the trained model, scaler, and feature names."""
     model = joblib.load(f"{model_dir}/breathing_model.joblib")
@@ -32,10 +36,54 @@ def load_model_and_scaler(model_dir='model_output'):
         
     return model, scaler, feature_names
 
-def load_respiratory_data(data_dir='respiratory_data'):
-    """Load all respiratory data files from the app."""
+def load_respiratory_data_from_dataset(dataset_dir='session_dataset', patient_ids=None, columns=None, where=None):
+    """Load frames from the ingested Parquet session dataset.
+
+    columns limits which frame columns are read; the session metadata columns
+    added by load_respiratory_data are always joined on. where is resolved
+    against the sessions table before any frames are read.
+    """
+    from session_dataset import build_filter, read_frames, read_sessions
+    from session_index import select_sessions
+
+    row_filter = build_filter(patient_ids=patient_ids)
+    if columns is not None:
+        columns = list(dict.fromkeys(['file_path'] + list(columns)))
+    sessions = read_sessions(
+        dataset_dir,
+        columns=['file_path', 'patient_id', 'age', 'gender', 'health_status', 'total_duration',
+                 'breathing_rate', 'avg_amplitude', 'max_amplitude', 'min_amplitude', 'total_breaths'],
+        filter=row_filter
+    )
+    if where is not None:
+        sessions = select_sessions(sessions, where)
+        row_filter = build_filter(patient_ids=patient_ids, file_paths=sessions['file_path'])
+    frames = read_frames(dataset_dir, columns=columns, filter=row_filter)
+    if frames.empty:
+        raise ValueError("No data could be loaded from the session dataset")
+
+    defaults = {'patient_id': '0', 'age': 0, 'gender': 'Unknown', 'health_status': 'Unknown'}
+    sessions = sessions.fillna({k: defaults.get(k, 0) for k in sessions.columns if k != 'file_path'})
+    df = frames.merge(sessions, on='file_path', how='left')
+    print(f"Loaded {len(df)} rows from {dataset_dir}")
+    return df
+
+def load_respiratory_data(data_dir='respiratory_data', dataset_dir=None, patient_ids=None, columns=None, where=None):
+    """Load all respiratory data files from the app.
+
+    If dataset_dir points at a session dataset built by session_dataset.py,
+    frames are read from its Parquet tables instead of the CSVs. patient_ids
+    and where (see session_index.py) select exports from the header-only
+    session index before any data rows are read.
+    """
+    if dataset_dir is not None:
+        return load_respiratory_data_from_dataset(dataset_dir, patient_ids, columns, where)
+
     all_data = []
-    files = glob(f"{data_dir}/respiratory_data_*.csv")
+    if patient_ids is not None or where is not None:
+        files = select_files(data_dir, where, patient_ids)
+    else:
+        files = glob(f"{data_dir}/respiratory_data_*.csv")
     
     for file_path in files:
         try:
@@ -163,6 +211,9 @@ def evaluate_model(model, scaler, X, y_true):
     print("\nClassification Report:")
     print(report)
     
+    # Bootstrap confidence intervals over the cached predictions
+    print_intervals(bootstrap_metrics(y_true, y_pred))
+    
     # Plot confusion matrix
     plt.figure(figsize=(10, 8))
     sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', 
@@ -186,33 +237,37 @@ def plot_breathing_phase_comparison(df, y_pred):
         'exhaling': 'Exhaling',
         'pause': 'Pause'
     })
-    df['predicted_phase_label'] = df['predicted_phase'].apply(
-        lambda x: 'Inhaling' if x == 1 else 'Exhaling'
-    )
+    df['predicted_phase_label'] = np.where(df['predicted_phase'] == 1, 'Inhaling', 'Exhaling')
     
-    # Select a subset of data for the first patient
-    first_patient_id = df['patient_id'].iloc[0]
-    sample_data = df[df['patient_id'] == first_patient_id].iloc[:300]
+    # Plot the whole first session of the first patient (timestamps restart in every export)
+    session = df[df['patient_id'] == df['patient_id'].iloc[0]]
+    if 'file_path' in session:
+        session = session[session['file_path'] == session['file_path'].iloc[0]]
+    
+    # Downsample the trace and collapse phases into runs so full-length sessions plot quickly
+    t, amplitude = downsample(session['timestamp'], session['amplitude'])
+    resolution = (session['timestamp'].max() - session['timestamp'].min()) / DEFAULT_POINTS
+    actual_runs = phase_runs(session['timestamp'], session['actual_phase_label'], resolution)
+    predicted_runs = phase_runs(session['timestamp'], session['predicted_phase_label'], resolution)
     
     # Plot
-    plt.figure(figsize=(15, 8))
-    
-    plt.subplot(2, 1, 1)
-    sns.lineplot(x='timestamp', y='amplitude', data=sample_data)
-    plt.title('Breathing Amplitude Over Time')
-    plt.xlabel('Timestamp')
-    plt.ylabel('Amplitude')
-    
-    plt.subplot(2, 1, 2)
-    sns.scatterplot(x='timestamp', y='actual_phase_label', data=sample_data, 
-                   label='Actual', alpha=0.7, s=50, marker='o')
-    sns.scatterplot(x='timestamp', y='predicted_phase_label', data=sample_data, 
-                   label='Predicted', alpha=0.7, s=50, marker='x')
-    plt.title('Actual vs Predicted Breathing Phases')
-    plt.xlabel('Timestamp')
-    plt.ylabel('Breathing Phase')
-    plt.legend()
-    plt.tight_layout()
+    fig, (top, bottom) = plt.subplots(2, 1, figsize=(15, 8), sharex=True)
+    
+    top.plot(t, amplitude, linewidth=0.8)
+    top.set_title('Breathing Amplitude Over Time')
+    top.set_ylabel('Amplitude')
+    
+    plot_phase_runs(bottom, actual_runs, 1)
+    plot_phase_runs(bottom, predicted_runs, 0)
+    bottom.set_yticks([0, 1])
+    bottom.set_yticklabels(['Predicted', 'Actual'])
+    bottom.set_title('Actual vs Predicted Breathing Phases')
+    bottom.set_xlabel('Timestamp')
+    # Each phase is drawn once per row; keep one legend entry per phase
+    handles, labels = bottom.get_legend_handles_labels()
+    unique = dict(zip(labels, handles))
+    bottom.legend(unique.values(), unique.keys(), loc='upper right')
+    fig.tight_layout()
     
     plt.savefig('breathing_phase_comparison.png')
 
@@ -224,7 +279,8 @@ def main():
     
     # Load app respiratory data
     print("Loading respiratory data from app...")
-    app_data = load_respiratory_data()
+    dataset_dir = "session_dataset" if os.path.isdir("session_dataset/frames") else None
+    app_data = load_respiratory_data(dataset_dir=dataset_dir)
     
     # Prepare features
     print("Preparing features for model...")
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, f1_score, recall_score
+
+from bootstrap_eval import bootstrap_metrics
+
+
+def test_point_estimates_match_sklearn_and_intervals_cover_them():
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(0, 2, 400)
+    y_pred = np.where(rng.random(400) < 0.8, y_true, 1 - y_true)
+
+    intervals = bootstrap_metrics(y_true, y_pred, n_resamples=1000).set_index('metric')
+    assert intervals.loc['accuracy', 'estimate'] == pytest.approx(accuracy_score(y_true, y_pred))
+    assert intervals.loc['f1', 'estimate'] == pytest.approx(f1_score(y_true, y_pred))
+    assert intervals.loc['recall[0]', 'estimate'] == pytest.approx(recall_score(y_true, y_pred, pos_label=0))
+    assert (intervals['lower'] <= intervals['estimate']).all()
+    assert (intervals['estimate'] <= intervals['upper']).all()
+
+
+def test_multinomial_spread_matches_row_resampling():
+    rng = np.random.default_rng(1)
+    y_true = rng.integers(0, 3, 300)
+    y_pred = np.where(rng.random(300) < 0.7, y_true, rng.integers(0, 3, 300))
+    resampled = [np.mean(y_true[i] == y_pred[i]) for i in rng.integers(0, 300, (4000, 300))]
+
+    std = bootstrap_metrics(y_true, y_pred, n_resamples=4000).set_index('metric').loc['accuracy', 'std']
+    assert std == pytest.approx(np.std(resampled), rel=0.1)
+
+
+def test_empty_input_raises():
+    with pytest.raises(ValueError):
+        bootstrap_metrics([], [])
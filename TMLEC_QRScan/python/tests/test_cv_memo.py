@@ -0,0 +1,40 @@
+import json
+import warnings
+
+import numpy as np
+from sklearn.datasets import make_classification
+from sklearn.model_selection import GridSearchCV
+from sklearn.tree import DecisionTreeClassifier
+
+from cv_memo import memoized_grid_search
+
+
+def test_memoized_search_matches_grid_search_and_reuses_scores(tmp_path):
+    X, y = make_classification(n_samples=120, n_features=6, random_state=0)
+    grid = {'max_depth': [1, 2, 4], 'min_samples_leaf': [1, 5]}
+    estimator = DecisionTreeClassifier(random_state=0)
+    memo_path = str(tmp_path / 'memo.json')
+
+    first = memoized_grid_search(estimator, grid, X, y, memo_path, n_jobs=1)
+    reference = GridSearchCV(estimator, grid, cv=5, scoring='f1').fit(X, y)
+    assert first.best_params_ == reference.best_params_
+    assert np.isclose(first.best_score_, reference.best_score_)
+    assert first.n_fitted == 30
+
+    second = memoized_grid_search(estimator, grid, X, y, memo_path, n_jobs=1)
+    assert second.n_fitted == 0
+    assert second.best_params_ == first.best_params_
+
+
+def test_failed_fits_are_not_memoized(tmp_path):
+    X, y = make_classification(n_samples=60, n_features=4, random_state=0)
+    memo_path = str(tmp_path / 'memo.json')
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        result = memoized_grid_search(DecisionTreeClassifier(), {'max_depth': [2, -1]}, X, y, memo_path, n_jobs=1)
+        again = memoized_grid_search(DecisionTreeClassifier(), {'max_depth': [2, -1]}, X, y, memo_path, n_jobs=1)
+
+    assert result.best_params_ == {'max_depth': 2}
+    with open(memo_path) as f:
+        assert len(json.load(f)) == 5
+    assert again.n_fitted == 5
@@ -0,0 +1,14 @@
+import numpy as np
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+from early_exit_forest import predict_early_exit
+
+
+def test_early_exit_matches_predict_with_fewer_trees():
+    X, y = make_classification(n_samples=2000, n_features=9, n_informative=5, random_state=0)
+    model = RandomForestClassifier(n_estimators=64, max_depth=8, random_state=0).fit(X[:1000], y[:1000])
+
+    predictions, trees_used = predict_early_exit(model, X[1000:], chunk_size=8)
+    np.testing.assert_array_equal(predictions, model.predict(X[1000:]))
+    assert trees_used.mean() < model.n_estimators
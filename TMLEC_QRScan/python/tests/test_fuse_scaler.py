@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from fuse_scaler import fuse_scaler_into_model, synthetic_rows, verify_fused_model
+
+
+def _training_data(seed=0):
+    rng = np.random.default_rng(seed)
+    # Features on very different scales, like age vs amplitude variability
+    X = rng.normal(size=(300, 4)) * [15.0, 0.5, 4.0, 0.05] + [50.0, 0.5, 16.0, 0.2]
+    y = (X[:, 2] + 20 * X[:, 3] + rng.normal(0, 1, 300) > 20).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize('make_model', [
+    lambda: RandomForestClassifier(n_estimators=30, random_state=0),
+    lambda: HistGradientBoostingClassifier(max_iter=30, random_state=0),
+])
+def test_fused_model_matches_scaled_input(make_model):
+    X, y = _training_data()
+    scaler = StandardScaler().fit(X)
+    model = make_model().fit(scaler.transform(X), y)
+
+    fused = fuse_scaler_into_model(model, scaler)
+    mismatches, max_diff = verify_fused_model(model, scaler, fused, synthetic_rows(scaler, 5000))
+    assert mismatches == 0
+    assert max_diff < 1e-9
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from patient_aggregates import period_stats, patient_summaries, rebuild_aggregates, window_trend
+from results_store import connect, upsert_results
+
+
+def _sessions(rng, patient_id, days, scored_at):
+    return pd.DataFrame({
+        'file_path': [f"respiratory_data_{patient_id}_202501{d:02d}_{h:02d}0000.csv" for d, h in days],
+        'patient_id': str(patient_id),
+        'breathing_rate': rng.uniform(10, 30, len(days)),
+        'abnormal_probability': rng.uniform(0, 1, len(days)),
+        'predicted_abnormal': rng.integers(0, 2, len(days)),
+        'scored_at': scored_at
+    })
+
+
+def _tables(conn):
+    stats = pd.read_sql_query("SELECT * FROM patient_period_stats ORDER BY patient_id, period, period_start", conn)
+    summary = pd.read_sql_query("SELECT * FROM patient_summary ORDER BY patient_id", conn)
+    return stats, summary
+
+
+def test_incremental_aggregates_match_full_rebuild():
+    rng = np.random.default_rng(0)
+    conn = connect(':memory:')
+    upsert_results(conn, _sessions(rng, 1, [(d, 9) for d in range(1, 15)], '2025-02-01T00:00:00'), 'v1')
+    upsert_results(conn, _sessions(rng, 2, [(d, 10) for d in range(3, 20, 2)], '2025-02-01T00:00:00'), 'v1')
+    # Re-score some sessions and add a second session on an existing day
+    upsert_results(conn, _sessions(rng, 1, [(4, 9), (4, 15), (12, 9)], '2025-02-02T00:00:00'), 'v2')
+
+    incremental = _tables(conn)
+    rebuild_aggregates(conn)
+    rebuilt = _tables(conn)
+    for before, after in zip(incremental, rebuilt):
+        pd.testing.assert_frame_equal(before, after, check_exact=False, rtol=1e-9)
+
+    assert patient_summaries(conn, [1])['n_sessions'].iloc[0] == 15
+    assert period_stats(conn, 1, 'day')['n_sessions'].sum() == 15
+
+
+def test_window_trend_slope_matches_polyfit():
+    rng = np.random.default_rng(1)
+    conn = connect(':memory:')
+    sessions = _sessions(rng, 5, [(d, 8) for d in range(1, 29)], '2025-02-01T00:00:00')
+    upsert_results(conn, sessions, 'v1')
+
+    trend = window_trend(conn, 5, days=28, until='2025-01-28')
+    days = pd.to_datetime(sessions['file_path'].str[19:34], format='%Y%m%d_%H%M%S')
+    t = (days - pd.Timestamp('2020-01-01')).dt.total_seconds() / 86400
+    assert trend['n_sessions'] == 28
+    assert np.isclose(trend['rate_slope_per_day'], np.polyfit(t, sessions['breathing_rate'], 1)[0])
@@ -0,0 +1,48 @@
+import numpy as np
+
+from plot_downsample import lttb, minmax_downsample, phase_runs
+
+
+def _reference_lttb(x, y, n_out):
+    """Straightforward Largest-Triangle-Three-Buckets (Steinarsson, 2013)."""
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    selected = [0]
+    a = 0
+    for i in range(n_out - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        next_lo = hi
+        next_hi = min(int((i + 2) * every) + 1, n)
+        if next_lo >= n - 1 or next_hi <= next_lo:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected.append(a)
+    selected.append(n - 1)
+    return np.array(selected)
+
+
+def test_lttb_matches_reference_algorithm():
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.uniform(20, 40, 5000))
+    y = np.sin(x / 500) + rng.normal(0, 0.2, len(x))
+    # Small enough ratio that the min/max pre-reduction is not used
+    np.testing.assert_array_equal(lttb(x, y, 1000), _reference_lttb(x, y, 1000))
+
+
+def test_minmax_keeps_global_extremes():
+    rng = np.random.default_rng(1)
+    y = rng.normal(size=100000)
+    idx = minmax_downsample(np.arange(len(y)), y, 500)
+    assert np.argmax(y) in idx and np.argmin(y) in idx
+
+
+def test_short_final_phase_keeps_its_duration():
+    t = np.arange(0, 10000, 100.0)
+    phases = np.array(['Inhaling'] * 99 + ['Exhaling'])
+    runs = phase_runs(t, phases, min_duration=50)
+    assert list(runs['phase']) == ['Inhaling', 'Exhaling']
+    assert runs['end'].iloc[-1] - runs['start'].iloc[-1] == 100.0
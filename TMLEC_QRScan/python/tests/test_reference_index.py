@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+
+from reference_index import ReferenceIndex
+
+FEATURES = ['f0', 'f1', 'f2']
+
+
+def _cases(start, n, label='normal'):
+    return pd.DataFrame({'case_id': [f"c{i}" for i in range(start, start + n)], 'source': 'test',
+                         'patient_id': 'p', 'label': label})
+
+
+def test_tree_plus_buffer_matches_nearest_neighbors():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, len(FEATURES)))
+    index = ReferenceIndex(None, FEATURES, min_buffer=200)
+    index.add(X[:500], _cases(0, 500))
+    index.add(X[500:], _cases(500, 100))
+    assert index.n_tree == 500 and len(index) == 600
+
+    Q = rng.normal(size=(50, len(FEATURES)))
+    distances, indices = index.query(Q, k=7)
+    expected_d, expected_i = NearestNeighbors(n_neighbors=7).fit(X).kneighbors(Q)
+    np.testing.assert_allclose(distances, expected_d, atol=1e-9)
+    np.testing.assert_array_equal(indices, expected_i)
+
+
+def test_readding_case_updates_it_in_place():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(20, len(FEATURES)))
+    index = ReferenceIndex(None, FEATURES, min_buffer=100)
+    index.add(X, _cases(0, 20))
+
+    assert index.add(X[:3], _cases(0, 3, label='abnormal')) == 0
+    assert len(index) == 20
+    assert list(index.cases['label'][:4]) == ['abnormal'] * 3 + ['normal']
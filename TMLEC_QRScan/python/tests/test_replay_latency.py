@@ -0,0 +1,56 @@
+import numpy as np
+
+from replay_latency import PHASE_CODES, StreamFeatures
+
+
+def _reference_update(state, s, t, amplitude, velocity, phase):
+    """One-sample-at-a-time version of StreamFeatures.update."""
+    state.count[s] += 1
+    state.amp_sum[s] += amplitude
+    state.amp_sq[s] += amplitude * amplitude
+    state.amp_max[s] = max(state.amp_max[s], amplitude)
+    state.amp_min[s] = min(state.amp_min[s], amplitude)
+    state.vel_abs_sum[s] += abs(velocity)
+    if state.count[s] == 1:
+        state.first_t[s] = t
+    if phase != state.phase[s]:
+        if state.run_rows[s] > 1:
+            duration = state.last_t[s] - state.run_start[s]
+            state.dur_n[s] += 1
+            state.dur_sum[s] += duration
+            state.dur_sq[s] += duration * duration
+        if phase == PHASE_CODES['inhaling'] and state.phase[s] >= 0:
+            state.inhale_onsets[s] += 1
+        state.phase[s] = phase
+        state.run_start[s] = t
+        state.run_rows[s] = 0
+    state.run_rows[s] += 1
+    state.last_t[s] = t
+
+
+def test_batched_update_matches_per_sample_update():
+    rng = np.random.default_rng(0)
+    n_streams, n_samples = 7, 3000
+    stream = rng.integers(0, n_streams, n_samples)
+    t = np.zeros(n_samples)
+    for k in range(n_streams):
+        rows = stream == k
+        t[rows] = np.cumsum(rng.uniform(10, 50, rows.sum()))
+    amplitude = rng.normal(5, 2, n_samples)
+    velocity = rng.normal(0, 10, n_samples)
+    # Runs of a few samples, with some single-row runs
+    phase = np.repeat(rng.integers(0, 3, n_samples // 3 + 1), 3)[:n_samples]
+    phase[rng.random(n_samples) < 0.1] = PHASE_CODES['inhaling']
+
+    batched = StreamFeatures(np.full(n_streams, 40), np.zeros(n_streams))
+    reference = StreamFeatures(np.full(n_streams, 40), np.zeros(n_streams))
+    edges = np.sort(rng.choice(np.arange(1, n_samples), 40, replace=False))
+    for lo, hi in zip(np.r_[0, edges], np.r_[edges, n_samples]):
+        batched.update(stream[lo:hi], t[lo:hi], amplitude[lo:hi], velocity[lo:hi], phase[lo:hi])
+        for i in range(lo, hi):
+            _reference_update(reference, stream[i], t[i], amplitude[i], velocity[i], phase[i])
+
+    streams = np.arange(n_streams)
+    np.testing.assert_allclose(batched.features(streams).to_numpy(), reference.features(streams).to_numpy())
+    for name in ['run_rows', 'run_start', 'phase', 'dur_n', 'inhale_onsets', 'first_t', 'last_t']:
+        np.testing.assert_array_equal(getattr(batched, name), getattr(reference, name))
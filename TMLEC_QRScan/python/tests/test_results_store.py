@@ -0,0 +1,39 @@
+import pandas as pd
+
+from results_store import connect, upsert_results, latest_result, patient_history
+
+
+def _session(file_path, probability, scored_at):
+    return {'file_path': file_path, 'patient_id': '7', 'breathing_rate': 15.0,
+            'predicted_abnormal': int(probability >= 0.5), 'abnormal_probability': probability,
+            'scored_at': scored_at}
+
+
+def test_upsert_replaces_row_in_place():
+    conn = connect(':memory:')
+    upsert_results(conn, pd.DataFrame([_session('respiratory_data_7_20250101_090000.csv', 0.2,
+                                                '2025-01-02T00:00:00')]), 'v1')
+    upsert_results(conn, pd.DataFrame([_session('respiratory_data_7_20250101_090000.csv', 0.9,
+                                                '2025-01-03T00:00:00')]), 'v2')
+
+    history = patient_history(conn, 7)
+    assert len(history) == 1
+    assert history.loc[0, 'abnormal_probability'] == 0.9
+    assert history.loc[0, 'model_version'] == 'v2'
+
+
+def test_latest_result_is_newest_recording_within_one_batch():
+    conn = connect(':memory:')
+    # A bulk re-score stamps the same scored_at on every session of the batch
+    batch = pd.DataFrame([
+        _session('respiratory_data_7_20250101_090000.csv', 0.1, '2025-06-01T00:00:00'),
+        _session('respiratory_data_7_20250301_090000.csv', 0.8, '2025-06-01T00:00:00'),
+        _session('respiratory_data_7_20250201_090000.csv', 0.3, '2025-06-01T00:00:00'),
+    ])
+    upsert_results(conn, batch, 'v1')
+
+    assert latest_result(conn, 7)['file_path'] == 'respiratory_data_7_20250301_090000.csv'
+    assert list(patient_history(conn, 7)['file_path']) == [
+        'respiratory_data_7_20250301_090000.csv', 'respiratory_data_7_20250201_090000.csv',
+        'respiratory_data_7_20250101_090000.csv'
+    ]
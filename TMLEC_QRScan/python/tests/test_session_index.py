@@ -0,0 +1,47 @@
+import os
+
+from session_index import INDEX_COLUMNS, refresh_index, select_files
+
+EXPORT = """# Patient Information
+ID,{patient}
+Age,43
+Gender,Male
+Health Status,{status}
+Notes,none
+
+# Breathing Analysis Summary
+Total Duration (seconds),60.0
+Breathing Rate (breaths/minute),{rate}
+Average Amplitude,7.6
+Maximum Amplitude,14.3
+Minimum Amplitude,0.1
+Total Breaths,20
+
+Relative Time (ms),QR ID,X,Y,Movement Direction,Breathing Phase,Amplitude,Velocity
+0,qr1,200.0,300.1,stable,inhaling,0.1,74.9
+40,qr1,199.4,302.5,stable,inhaling,2.5,41.5
+"""
+
+
+def _write_exports(data_dir):
+    for patient, status, rate in [(1, 'Healthy', 14.0), (2, 'Asthma', 26.0), (3, 'Asthma', 12.0)]:
+        path = data_dir / f"respiratory_data_{patient}_20250101_10000{patient}.csv"
+        path.write_text(EXPORT.format(patient=patient, status=status, rate=rate))
+
+
+def test_where_selects_from_headers(tmp_path):
+    _write_exports(tmp_path)
+    files = select_files(str(tmp_path), where="health_status == 'Asthma' and breathing_rate > 20")
+    assert [os.path.basename(f) for f in files] == ['respiratory_data_2_20250101_100002.csv']
+
+    index = refresh_index(str(tmp_path))
+    assert list(index.columns) == INDEX_COLUMNS
+    assert len(index) == 3
+
+
+def test_unwritable_index_is_used_in_memory(tmp_path):
+    _write_exports(tmp_path)
+    index_path = str(tmp_path / 'missing_dir' / 'index.csv')
+    index = refresh_index(str(tmp_path), index_path)
+    assert len(index) == 3
+    assert not os.path.exists(index_path)
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from session_resample import PHASE_CODES, resample_session, stack_sessions, dominant_breathing_rate
+
+
+def test_phase_codes_come_from_nearest_frame():
+    frames = pd.DataFrame({'timestamp': [0.0, 100.0, 250.0, 400.0], 'y': [0.0, 1.0, 2.0, 3.0],
+                           'breathing_phase': ['inhaling', 'exhaling', 'unknown', 'pause']})
+    result = resample_session(frames, rate_hz=10)
+    assert list(result['phase']) == [PHASE_CODES['inhaling'], PHASE_CODES['exhaling'], -1, -1,
+                                     PHASE_CODES['pause']]
+
+
+def test_dominant_rate_is_nan_for_empty_and_masked_sessions():
+    rate_hz = 10
+    t = np.arange(600) / rate_hz
+    sine = np.sin(2 * np.pi * (15 / 60) * t)
+    values = np.vstack([sine, sine])
+    mask = np.ones_like(values, dtype=bool)
+    mask[1] = False
+
+    rates = dominant_breathing_rate({'y': values, 'mask': mask}, rate_hz=rate_hz)
+    assert rates[0] == 15.0
+    assert np.isnan(rates[1])
+
+    empty = stack_sessions([resample_session(pd.DataFrame({'timestamp': [], 'y': []}), rate_hz)])
+    assert np.isnan(dominant_breathing_rate(empty, rate_hz)).all()
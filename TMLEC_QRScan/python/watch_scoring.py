@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Watch-Folder Incremental Ingest and Scoring of App Exports
+
+Polls the data directory for respiratory_data_*.csv exports and scores only
+files that are new or modified since they were last scored, so the cost of a
+new session does not depend on how many old sessions are in the archive:
+
+1. Loads the existing results table and the model once at startup
+2. Each poll stats the directory and picks out files whose mtime changed
+3. Waits until a file has stopped changing, then parses and scores it
+4. Appends the new rows to the results CSV, which is an append-only log
+5. Optionally ingests the file into the Parquet session dataset as well
+6. Optionally upserts the scored rows into the SQLite results store
+
+A re-exported session gets a new row and the last row of a file wins. Once
+superseded rows make up half the log, it is compacted into a snapshot with
+one row per session and swapped in atomically, so the write cost of a poll
+stays proportional to the new sessions (amortized). The results table keeps
+the source mtime of every row, so a restarted watcher only picks up files
+that arrived while it was down.
+
+Usage:
+    python watch_scoring.py respiratory_data/ --results watch_results.csv --interval 5
+    python watch_scoring.py respiratory_data/ --dataset-dir session_dataset
+    python watch_scoring.py respiratory_data/ --db breathing_results.db
+"""
+
+import os
+import time
+import argparse
+import pandas as pd
+
+from fuse_scaler import load_scoring_model
+from respiratory_pattern_classification import score_sessions
+from bulk_score import RESULT_COLUMNS, parse_session
+from session_dataset import ingest_file
+from results_store import connect, upsert_results, model_version
+
+WATCH_COLUMNS = RESULT_COLUMNS + ['source_mtime']
+
+# Compact the results log once it holds more than this many rows and
+# at least twice as many rows as sessions
+COMPACT_MIN_ROWS = 1000
+
+
+def load_results(results_path):
+    """Load the results log as (table indexed by file name, number of logged rows).
+
+    The last row of each file wins; a row cut short by an interrupted append is dropped.
+    """
+    if os.path.exists(results_path) and os.path.getsize(results_path) > 0:
+        log = pd.read_csv(results_path, dtype={'patient_id': str}, float_precision='round_trip')
+        logged = len(log)
+        results = log.dropna(subset=['source_mtime']).drop_duplicates('file_path', keep='last')
+        with open(results_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                logged += 1  # torn last line: force a compaction before appending
+    else:
+        results = pd.DataFrame(columns=WATCH_COLUMNS)
+        logged = 0
+    return results.set_index('file_path', drop=False), logged
+
+
+def save_results(results, results_path):
+    """Write a compacted snapshot of the results table to a temp file and swap it in."""
+    tmp_path = os.path.join(os.path.dirname(os.path.abspath(results_path)),
+                            '.' + os.path.basename(results_path) + '.tmp')
+    results[WATCH_COLUMNS].to_csv(tmp_path, index=False)
+    os.replace(tmp_path, results_path)
+
+
+def append_results(batch, results_path):
+    """Append scored rows to the results log."""
+    write_header = not os.path.exists(results_path) or os.path.getsize(results_path) == 0
+    with open(results_path, 'a', newline='') as f:
+        batch[WATCH_COLUMNS].to_csv(f, header=write_header, index=False)
+
+
+def scan_directory(data_dir):
+    """Return {file name: (path, mtime)} for every export in data_dir."""
+    found = {}
+    with os.scandir(data_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('respiratory_data_') and entry.name.endswith('.csv') and entry.is_file():
+                found[entry.name] = (entry.path, entry.stat().st_mtime)
+    return found
+
+
+def changed_files(found, known_mtimes, settle_s, now=None):
+    """Files that are new or modified and have not been written to for settle_s."""
+    now = time.time() if now is None else now
+    return sorted(
+        (name, path, mtime) for name, (path, mtime) in found.items()
+        if known_mtimes.get(name) != mtime and now - mtime >= settle_s
+    )
+
+
+def score_files(files, model, scaler, features, dataset_dir=None):
+    """Parse and score a handful of files; returns a results frame for those rows only."""
+    rows = []
+    for name, path, mtime in files:
+        row, error = parse_session(path)
+        if row is None:
+            print(f"Error loading {path}: {error}")
+            continue
+        row['source_mtime'] = mtime
+        rows.append(row)
+
+        if dataset_dir is not None:
+            try:
+                ingest_file(path, dataset_dir)
+            except Exception as e:
+                print(f"Error ingesting {path}: {str(e)}")
+
+    if not rows:
+        return None
+    batch = pd.DataFrame(rows)
+    batch['predicted_abnormal'], batch['abnormal_probability'] = score_sessions(model, scaler, features, batch)
+    batch['scored_at'] = pd.Timestamp.now().isoformat()
+    return batch[WATCH_COLUMNS].set_index('file_path', drop=False)
+
+
+def watch(data_dir='respiratory_data', results_path='watch_results.csv', model_dir='model_output',
+          interval_s=5.0, settle_s=2.0, dataset_dir=None, once=False, db_path=None):
+    """Poll data_dir and keep results_path (and the db_path store, if given) up to date until interrupted."""
+    model, scaler, features = load_scoring_model(model_dir)
+    conn = connect(db_path) if db_path else None
+    version = model_version(model_dir)
+    results, logged = load_results(results_path)
+    if logged > len(results):
+        save_results(results, results_path)
+    known_mtimes = dict(zip(results['file_path'], results['source_mtime']))
+    scored = set(results['file_path'])
+    logged = len(results)
+    print(f"Watching {data_dir} ({len(scored)} sessions already scored)")
+
+    while True:
+        files = changed_files(scan_directory(data_dir), known_mtimes, settle_s)
+        if files:
+            start = time.perf_counter()
+            batch = score_files(files, model, scaler, features, dataset_dir)
+            if batch is not None:
+                # Append only; superseded rows of re-exported sessions are dropped at compaction
+                append_results(batch, results_path)
+                scored.update(batch['file_path'])
+                logged += len(batch)
+                if logged > max(COMPACT_MIN_ROWS, 2 * len(scored)):
+                    results, _ = load_results(results_path)
+                    save_results(results, results_path)
+                    logged = len(results)
+                if conn is not None:
+                    upsert_results(conn, batch, version)
+                for _, row in batch.iterrows():
+                    status = "Abnormal" if row['predicted_abnormal'] == 1 else "Normal"
+                    print(f"Scored {row['file_path']}: {status} ({row['abnormal_probability'] * 100:.1f}%)")
+            # Failed files are marked too, so they are retried only once they change again
+            known_mtimes.update({name: mtime for name, _, mtime in files})
+            print(f"Processed {len(files)} file(s) in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        if once:
+            return load_results(results_path)[0]
+        time.sleep(interval_s)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score new app exports as they arrive")
+    parser.add_argument("data_dir", nargs="?", default="respiratory_data")
+    parser.add_argument("--results", default="watch_results.csv")
+    parser.add_argument("--model-dir", default="model_output")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="Seconds a file must be unchanged before it is scored")
+    parser.add_argument("--dataset-dir", help="Also ingest new files into this Parquet session dataset")
+    parser.add_argument("--once", action="store_true", help="Process pending files once and exit")
+    parser.add_argument("--db", help="Also upsert results into this SQLite results store")
+    args = parser.parse_args()
+
+    try:
+        watch(args.data_dir, args.results, args.model_dir, args.interval, args.settle,
+              args.dataset_dir, args.once, args.db)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+
+if __name__ == "__main__":
+    main()